@@ -4,13 +4,16 @@
 from __future__ import absolute_import
 
 from .archive import ArchiveDiffer, GitArchiveDiffer, S3ArchiveDiffer
-from .export import create_backup_csv, create_export_csv
+from .export import create_backup_csv, create_export_csv, get_backup_file
+from .export_plan import ExportPlan, commit_export_plans, discard_export_plans, get_export_plan_dir
 from .geomap import GeoMapper
 from .logger import get_structured_logger
 from .nancodes import Nans
+from .patch import run_patch
 from .signal import add_prefix
 from .slack_notifier import SlackNotifier
 from .smooth import Smoother
+from .socrata import fetch_socrata
 from .utils import read_params
 from .weekday import Weekday
 
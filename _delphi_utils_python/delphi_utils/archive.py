@@ -26,7 +26,7 @@ Author: Eu Jing Chua
 Created: 2020-08-06
 """
 
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 import filecmp
 from glob import glob
 from os import remove, replace
@@ -217,45 +217,73 @@ class ArchiveDiffer:
         """
         assert self._cache_updated
 
-        # Glob to only pick out CSV files, ignore hidden files
-        previous_files = set(basename(f)
-                             for f in glob(join(self.cache_dir, "*.csv")))
-        exported_files = set(basename(f)
-                             for f in glob(join(self.export_dir, "*.csv")))
+        with self.cache_context():
+            # Glob to only pick out CSV files, ignore hidden files
+            previous_files = set(basename(f)
+                                 for f in glob(join(self.cache_dir, "*.csv")))
+            exported_files = set(basename(f)
+                                 for f in glob(join(self.export_dir, "*.csv")))
 
-        deleted_files = sorted(join(self.cache_dir, f)
-                               for f in previous_files - exported_files)
-        common_filenames = sorted(exported_files & previous_files)
-        new_files = sorted(join(self.export_dir, f)
-                           for f in exported_files - previous_files)
+            deleted_files = sorted(join(self.cache_dir, f)
+                                   for f in previous_files - exported_files)
+            common_filenames = sorted(exported_files & previous_files)
+            new_files = sorted(join(self.export_dir, f)
+                               for f in exported_files - previous_files)
 
-        common_diffs: Dict[str, Optional[str]] = {}
-        for filename in common_filenames:
-            before_file = join(self.cache_dir, filename)
-            after_file = join(self.export_dir, filename)
+            common_diffs: Dict[str, Optional[str]] = {}
+            for filename in common_filenames:
+                common_diffs[join(self.export_dir, filename)] = self.diff_export_file(filename)
 
-            common_diffs[after_file] = None
+        return deleted_files, common_diffs, new_files
 
-            # Check for simple file similarity before doing CSV diffs
-            if filecmp.cmp(before_file, after_file, shallow=False):
-                continue
+    def cache_context(self):
+        """
+        Context manager within which cache_dir holds the archived versions to diff against.
 
-            deleted_df, changed_df, added_df = diff_export_csv(
-                before_file, after_file)
-            new_issues_df = pd.concat([deleted_df, changed_df, added_df], axis=0)
+        Backends that need to prepare cache_dir for reading (e.g. by checking out a branch)
+        override this.
+        """
+        return nullcontext()
 
-            if len(deleted_df) > 0:
-                print(
-                    f"Diff has deleted indices in {after_file} that have been coded as nans.")
+    def diff_export_file(self, filename: str) -> Optional[str]:
+        """
+        Find diffs within a CSV file present in both cache_dir and export_dir.
 
-            # Write the diffs to diff_file, if applicable
-            if len(new_issues_df) > 0:
-                diff_file = join(self.export_dir, filename + ".diff")
+        Should be called after update_cache() succeeds, within cache_context().
 
-                new_issues_df.to_csv(diff_file, na_rep="NA")
-                common_diffs[after_file] = diff_file
+        Parameters
+        ----------
+        filename: str
+            Name of the CSV file, relative to cache_dir and export_dir
 
-        return deleted_files, common_diffs, new_files
+        Returns
+        -------
+        diff_file: Optional[str]
+            Same semantics as the values of common_diffs in diff_exports().
+        """
+        before_file = join(self.cache_dir, filename)
+        after_file = join(self.export_dir, filename)
+
+        # Check for simple file similarity before doing CSV diffs
+        if filecmp.cmp(before_file, after_file, shallow=False):
+            return None
+
+        deleted_df, changed_df, added_df = diff_export_csv(
+            before_file, after_file)
+        new_issues_df = pd.concat([deleted_df, changed_df, added_df], axis=0)
+
+        if len(deleted_df) > 0:
+            print(
+                f"Diff has deleted indices in {after_file} that have been coded as nans.")
+
+        # Write the diffs to diff_file, if applicable
+        if len(new_issues_df) > 0:
+            diff_file = join(self.export_dir, filename + ".diff")
+
+            new_issues_df.to_csv(diff_file, na_rep="NA")
+            return diff_file
+
+        return None
 
     def archive_exports(self, exported_files: Files) -> Tuple[Files, Files]:
         """
@@ -307,13 +335,26 @@ class ArchiveDiffer:
             else:
                 replace(diff_file, exported_file)
 
-    def run(self, logger=None):
-        """Run the differ and archive the changed and new files."""
+    def run(self, logger=None, diffs: Optional[Tuple[FileDiffMap, Files]] = None):
+        """Run the differ and archive the changed and new files.
+
+        Parameters
+        ----------
+        logger: Optional[logging.Logger]
+            Logger for the archiving progress.
+        diffs: Optional[Tuple[FileDiffMap, Files]]
+            Precomputed (common_diffs, new_files), with the same semantics as in diff_exports().
+            If provided, update_cache() must already have been called, and the cache is not
+            updated or diffed again.
+        """
         start_time = time.time()
-        self.update_cache()
+        if diffs is None:
+            self.update_cache()
 
-        # Diff exports, and make incremental versions
-        _, common_diffs, new_files = self.diff_exports()
+            # Diff exports, and make incremental versions
+            _, common_diffs, new_files = self.diff_exports()
+        else:
+            common_diffs, new_files = diffs
 
         # Archive changed and new files only
         to_archive = [f for f, diff in common_diffs.items()
@@ -554,14 +595,9 @@ class GitArchiveDiffer(ArchiveDiffer):
 
         self._cache_updated = True
 
-    def diff_exports(self) -> Tuple[Files, FileDiffMap, Files]:
-        """
-        Find diffs across and within CSV files, from cache_dir to export_dir.
-
-        Same as base class diff_exports, but in context of specified branch.
-        """
-        with self.archiving_branch():
-            return super().diff_exports()
+    def cache_context(self):
+        """Check out the archiving branch, so cache_dir holds the archived versions."""
+        return self.archiving_branch()
 
     def archive_exports(self, exported_files: Files) -> Tuple[Files, Files]:
         """
@@ -1,15 +1,36 @@
 """Export data in the format expected by the Delphi API."""
 # -*- coding: utf-8 -*-
 import logging
+from contextlib import contextmanager
 from datetime import datetime
 from os.path import getsize, join
-from typing import Optional
+from queue import Queue
+from typing import Collection, List, Optional
 
 import numpy as np
 import pandas as pd
 from epiweeks import Week
 
 from .nancodes import Nans
+from .profiling import profile_stage
+
+# Queues that are sent the path of every file written by `create_export_csv`.
+_export_queues: List[Queue] = []
+
+
+@contextmanager
+def exported_files_queue():
+    """Provide a queue that receives the path of each file `create_export_csv` writes.
+
+    Only files written from the current process while the context is open are put on the
+    queue.
+    """
+    export_queue = Queue()
+    _export_queues.append(export_queue)
+    try:
+        yield export_queue
+    finally:
+        _export_queues.remove(export_queue)
 
 
 def filter_contradicting_missing_codes(df, sensor, metric, date, logger=None):
@@ -45,7 +66,8 @@ def create_export_csv(
     write_empty_days: Optional[bool] = False,
     logger: Optional[logging.Logger] = None,
     weekly_dates = False,
-    sort_geos: bool = False
+    sort_geos: bool = False,
+    only_dates: Optional[Collection] = None,
 ):
     """Export data in the format expected by the Delphi API.
 
@@ -80,6 +102,9 @@ def create_export_csv(
     sort_geos: bool
         If True, the dataframe is sorted by geo before writing. Otherwise, the dataframe is
         written as is.
+    only_dates: Optional[Collection]
+        If given, only these dates are exported, e.g. the `dates` of an `ExportPlan`, which
+        are those whose source rows changed since the previous run.
 
     Returns
     ---------
@@ -100,41 +125,84 @@ def create_export_csv(
         ).sort_values()
     else:
         dates = pd.date_range(start_date, end_date)
+    if only_dates is not None:
+        dates = dates[dates.isin(pd.to_datetime(list(only_dates)))]
 
-    for date in dates:
-        if weekly_dates:
-            t = Week.fromdate(pd.to_datetime(str(date)))
-            date_str = "weekly_" + str(t.year) + str(t.week).zfill(2)
-        else:
-            date_str = date.strftime('%Y%m%d')
-        if metric is None:
-            export_filename = f"{date_str}_{geo_res}_{sensor}.csv"
-        else:
-            export_filename = f"{date_str}_{geo_res}_{metric}_{sensor}.csv"
-        export_file = join(export_dir, export_filename)
-        expected_columns = [
-            "geo_id",
-            "val",
-            "se",
-            "sample_size",
-            "missing_val",
-            "missing_se",
-            "missing_sample_size"
-        ]
-        export_df = df[df["timestamp"] == date].filter(items=expected_columns)
-        if "missing_val" in export_df.columns:
-            export_df = filter_contradicting_missing_codes(
-                export_df, sensor, metric, date, logger=logger
-            )
-        if remove_null_samples:
-            export_df = export_df[export_df["sample_size"].notnull()]
-        export_df = export_df.round({"val": 7, "se": 7})
-        if sort_geos:
-            export_df = export_df.sort_values(by="geo_id")
-        export_df.to_csv(export_file, index=False, na_rep="NA")
+    with profile_stage("write_csv", geo=geo_res, signal=sensor, metric=metric) as stage:
+        for date in dates:
+            if weekly_dates:
+                t = Week.fromdate(pd.to_datetime(str(date)))
+                date_str = "weekly_" + str(t.year) + str(t.week).zfill(2)
+            else:
+                date_str = date.strftime('%Y%m%d')
+            if metric is None:
+                export_filename = f"{date_str}_{geo_res}_{sensor}.csv"
+            else:
+                export_filename = f"{date_str}_{geo_res}_{metric}_{sensor}.csv"
+            export_file = join(export_dir, export_filename)
+            expected_columns = [
+                "geo_id",
+                "val",
+                "se",
+                "sample_size",
+                "missing_val",
+                "missing_se",
+                "missing_sample_size"
+            ]
+            export_df = df[df["timestamp"] == date].filter(items=expected_columns)
+            if "missing_val" in export_df.columns:
+                export_df = filter_contradicting_missing_codes(
+                    export_df, sensor, metric, date, logger=logger
+                )
+            if remove_null_samples:
+                export_df = export_df[export_df["sample_size"].notnull()]
+            export_df = export_df.round({"val": 7, "se": 7})
+            if sort_geos:
+                export_df = export_df.sort_values(by="geo_id")
+            export_df.to_csv(export_file, index=False, na_rep="NA")
+            for export_queue in _export_queues:
+                export_queue.put(export_file)
+            stage.add_rows(len(export_df))
     return dates
 
 
+def get_backup_file(
+    backup_dir: str,
+    issue: Optional[str] = None,
+    geo_res: Optional[str] = None,
+    sensor: Optional[str] = None,
+    metric: Optional[str] = None,
+) -> str:
+    """Get the path of a backup file, without extension, as written by `create_backup_csv`.
+
+    Parameters
+    ----------
+    backup_dir: str
+        Backup directory
+    issue: Optional[str]
+        The date the data was fetched, in YYYYMMDD format. Defaults to "today"
+        if not provided
+    geo_res: Optional[str]
+        Geographic resolution of the data
+    sensor: Optional[str]
+        Sensor that has been calculated (cumulative_counts vs new_counts)
+    metric: Optional[str]
+        Metric we are considering, if any.
+
+    Returns
+    ---------
+    backup_file: str
+        `<backup_dir>/<issue>[_<geo_res>][_<metric>][_<sensor>]`
+    """
+    # Label the file with today's date (the date the data was fetched).
+    if not issue:
+        issue = datetime.today().strftime("%Y%m%d")
+
+    backup_filename = [issue, geo_res, metric, sensor]
+    backup_filename = "_".join(filter(None, backup_filename))
+    return join(backup_dir, backup_filename)
+
+
 def create_backup_csv(
     df: pd.DataFrame,
     backup_dir: str,
@@ -144,12 +212,15 @@ def create_backup_csv(
     sensor: Optional[str] = None,
     metric: Optional[str] = None,
     logger: Optional[logging.Logger] = None,
+    parquet: bool = True,
 ):
     """Save data for use as a backup.
 
     This function is meant to save raw data fetched from data sources.
     Therefore, it avoids manipulating the data as much as possible to
-    preserve the input.
+    preserve the input. Data pulled with a `type_dict` by `fetch_socrata` is
+    already typed, so its backups hold the typed values rather than the strings
+    returned by the API; code reading them back should accept either.
 
     When only required arguments are passed, data will be saved to a file of
     the format `<export_dir>/<today's date as YYYYMMDD>.csv`. Optional arguments
@@ -176,6 +247,9 @@ def create_backup_csv(
         Metric we are considering, if any.
     logger: Optional[logging.Logger]
         Pass a logger object here to log information about name and size of the backup file.
+    parquet: bool
+        Also save the data as parquet. Pass False if the parquet backup was already written,
+        e.g. streamed by `fetch_socrata` to the file given by `get_backup_file`.
 
     Returns
     ---------
@@ -183,19 +257,14 @@ def create_backup_csv(
         Series of dates for which CSV files were exported.
     """
     if not custom_run:
-        # Label the file with today's date (the date the data was fetched).
-        if not issue:
-            issue = datetime.today().strftime("%Y%m%d")
-
-        backup_filename = [issue, geo_res, metric, sensor]
-        backup_filename = "_".join(filter(None, backup_filename))
-        backup_file = join(backup_dir, backup_filename)
+        backup_file = get_backup_file(backup_dir, issue, geo_res, sensor, metric)
         try:
             # defacto data format is csv, but parquet preserved data types (keeping both as intermidary measures)
             df.to_csv(
                 f"{backup_file}.csv.gz", index=False, na_rep="NA", compression="gzip"
             )
-            df.to_parquet(f"{backup_file}.parquet", index=False)
+            if parquet:
+                df.to_parquet(f"{backup_file}.parquet", index=False)
 
             if logger:
                 logger.info(
@@ -0,0 +1,181 @@
+"""Plan exports from the rows of a source that changed since the previous run.
+
+Weekly sources revise only a few recent reference dates at a time, yet every date is exported
+again on each run. An `ExportPlan` hashes each pulled row, keyed by its location and
+timestamp, and compares the hashes with those saved by the previous run to find the
+reference dates with added, changed or removed rows. Only those dates need to be exported:
+
+>>> plan = ExportPlan(df_pull, get_export_plan_dir(params, logger), "nssp", ["fips"],
+...                   output_config={"signals": SIGNALS, "geos": GEOS})
+>>> create_export_csv(df, export_dir, "state", "pct_ed_visits_covid", only_dates=plan.dates)
+>>> plan.save()
+
+The hashes are saved along with a fingerprint of the output configuration, e.g. the signals, geos
+and export window, and a run whose configuration differs exports every date.
+
+The plan assumes that each reference date is computed from the rows of that date only, and
+that all files exported by a run are archived. `save` only writes the hashes as pending:
+`run_indicator_pipeline` commits them once the exports are archived and delivered, and discards
+them if validation fails, so the next run compares with the last run whose exports were kept.
+An indicator run on its own never commits its hashes, and exports every date.
+
+Dates that didn't change aren't exported, so the static validator would report them as missing,
+and a run without any changes as empty. `get_export_plan_dir` therefore disables the plan when
+validation is configured outside of dry run.
+"""
+import hashlib
+import json
+from glob import glob
+from os import makedirs, remove, replace
+from os.path import dirname, exists, join
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROW_HASH_FILE = "{name}.parquet"
+PENDING_SUFFIX = ".pending"
+CONFIG_METADATA_KEY = b"output_config_fingerprint"
+
+
+def get_export_plan_dir(params: Dict[str, Any], logger=None) -> Optional[str]:
+    """Get the directory to keep row hashes in, or None if every date should be exported.
+
+    Exports aren't planned for custom runs, nor when the exports are validated outside of dry
+    run, since the static validator expects every date in its window to be exported.
+    """
+    plan_dir = params.get("indicator", {}).get("export_plan_dir")
+    if plan_dir is None or params["common"].get("custom_run", False):
+        return None
+    if "validation" in params and not params["validation"].get("common", {}).get("dry_run", False):
+        if logger:
+            logger.warning("Exporting all dates, since exports are validated outside of dry run",
+                           export_plan_dir=plan_dir)
+        return None
+    return plan_dir
+
+
+def commit_export_plans(plan_dir: str):
+    """Replace the row hashes in `plan_dir` by the pending ones, once the exports are archived."""
+    for pending_file in glob(join(plan_dir, ROW_HASH_FILE.format(name="*") + PENDING_SUFFIX)):
+        replace(pending_file, pending_file[:-len(PENDING_SUFFIX)])
+
+
+def discard_export_plans(plan_dir: str):
+    """Remove the pending row hashes in `plan_dir`, e.g. after the exports were discarded."""
+    for pending_file in glob(join(plan_dir, ROW_HASH_FILE.format(name="*") + PENDING_SUFFIX)):
+        remove(pending_file)
+
+
+def fingerprint_config(output_config: Optional[Dict]) -> str:
+    """Hash an output configuration, independently of the order of its keys."""
+    config = json.dumps(output_config, sort_keys=True, default=str)
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+def hash_rows(df: pd.DataFrame, geo_cols: List[str], date_col: str = "timestamp") -> pd.DataFrame:
+    """Hash the rows of a frame, keyed by location and timestamp.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Pulled data
+    geo_cols: List[str]
+        Columns identifying the location of each row
+    date_col: str
+        Column holding the reference date of each row
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns "timestamp", "row_key" (hash of the location and timestamp), "occurrence"
+        (number of earlier rows with the same key) and "row_hash" (hash of the other columns)
+    """
+    key_cols = geo_cols + [date_col]
+    hashes = pd.DataFrame({
+        "timestamp": pd.to_datetime(df[date_col]).values,
+        "row_key": pd.util.hash_pandas_object(df[key_cols], index=False).values,
+        "row_hash": pd.util.hash_pandas_object(df.drop(columns=key_cols), index=False).values,
+    })
+    hashes.insert(2, "occurrence", hashes.groupby("row_key").cumcount())
+    return hashes
+
+
+class ExportPlan:
+    """Reference dates to export, given the rows pulled by this run and the previous one.
+
+    Attributes
+    ----------
+    dates: Optional[pd.DatetimeIndex]
+        Sorted reference dates with added, changed or removed rows, to pass as `only_dates` to
+        `create_export_csv`. None if there are no hashes from a previous run to compare to, in
+        which case every date should be exported.
+    """
+
+    def __init__(self, df: pd.DataFrame, plan_dir: Optional[str], name: str,
+                 geo_cols: List[str], date_col: str = "timestamp",
+                 output_config: Optional[Dict] = None, logger=None):
+        """Compare the rows of `df` with the hashes saved by the previous run.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            Pulled data, before any aggregation
+        plan_dir: Optional[str]
+            Directory holding the row hashes of previous runs, usually from
+            `get_export_plan_dir`. If None, nothing is compared or saved, and every date
+            is exported.
+        name: str
+            Name of the pulled dataset, to tell apart the hashes of an indicator's datasets
+        geo_cols: List[str]
+            Columns identifying the location of each row
+        date_col: str
+            Column holding the reference date of each row
+        output_config: Optional[Dict]
+            What the run exports from the rows, e.g. its signals, geos and export start date.
+            If it differs from the previous run's, the previous hashes are ignored.
+        logger: Optional[logging.Logger]
+            Logger to report the number of changed rows and dates to
+        """
+        self.hash_file = None if plan_dir is None else join(plan_dir, ROW_HASH_FILE.format(name=name))
+        self.hashes = None
+        self.dates = None
+        self.fingerprint = fingerprint_config(output_config)
+        if self.hash_file is None:
+            return
+        self.hashes = hash_rows(df, geo_cols, date_col)
+        if not exists(self.hash_file):
+            if logger:
+                logger.info("No previous row hashes, exporting all dates", hash_file=self.hash_file)
+            return
+        metadata = pq.read_schema(self.hash_file).metadata or {}
+        if metadata.get(CONFIG_METADATA_KEY) != self.fingerprint.encode():
+            if logger:
+                logger.info("Output configuration changed, exporting all dates", hash_file=self.hash_file)
+            return
+
+        previous = pd.read_parquet(self.hash_file)
+        # Rows in only one of the runs, or whose values differ between them
+        changed = pd.concat([previous, self.hashes], ignore_index=True).drop_duplicates(keep=False)
+        self.dates = pd.DatetimeIndex(changed["timestamp"].unique()).sort_values()
+        if logger:
+            logger.info("Planned exports from changed rows", name=name,
+                        num_changed_rows=len(changed[["timestamp", "row_key"]].drop_duplicates()),
+                        num_dates=len(self.dates))
+
+    def save(self):
+        """Save the row hashes of this run as pending, once all of its exports are written.
+
+        The hashes are compared with by later runs once committed with `commit_export_plans`.
+        """
+        if self.hash_file is None:
+            return
+        makedirs(dirname(self.hash_file), exist_ok=True)
+        pending_file = self.hash_file + PENDING_SUFFIX
+        # Write to a temporary file first, so a failed write isn't committed
+        table = pa.Table.from_pandas(self.hashes, preserve_index=False)
+        table = table.replace_schema_metadata({**table.schema.metadata,
+                                               CONFIG_METADATA_KEY: self.fingerprint.encode()})
+        pq.write_table(table, f"{pending_file}.tmp")
+        replace(f"{pending_file}.tmp", pending_file)
@@ -70,15 +70,15 @@ def bin_approach(df, log=False):
     today's test-statistic values for the stream
     """
     def ts_dist(x, y, n):
-        """Initialize test statistic distribution which is then vectorized."""
-        return binom.cdf(x, int(n), y / n)
+        """Evaluate the test statistic distribution over arrays of streams."""
+        return binom.cdf(x, np.trunc(n), y / n)
 
-    vec_ts_dist = np.vectorize(ts_dist)
     if log:
-        return pd.DataFrame(vec_ts_dist(np.log(df.y + 2),
-                        np.log(df.yhat + 2), np.log(df['pop'] + 2)),
+        return pd.DataFrame(ts_dist(np.log(df.y.values + 2),
+                        np.log(df.yhat.values + 2), np.log(df['pop'].values + 2)),
                             index=df.index)
-    return pd.DataFrame(vec_ts_dist(df.y, df.yhat, df.pop), index=df.index)
+    return pd.DataFrame(ts_dist(df.y.values, df.yhat.values, df['pop'].values),
+                        index=df.index)
 
 
 
@@ -119,8 +119,10 @@ def apply_ar(last_7, lin_coeff, weekday_correction, non_daily_df, fips_pop_table
     """
     y = pd.concat([weekday_correction, non_daily_df], axis=1)
     y.index = ['y']
-    y_hat = pd.Series([np.dot(lin_coeff[x], last_7[x]) for x in last_7.columns], name='yhat')
-    y_hat.index = last_7.columns
+    # (lag x stream) arrays aligned on the stream axis; one contraction over lags
+    y_hat = pd.Series(np.einsum('ij,ij->j', lin_coeff[last_7.columns].to_numpy(dtype=float),
+                                last_7.to_numpy(dtype=float)),
+                      index=last_7.columns, name='yhat')
     df_for_ts = y.T.merge(y_hat, left_index=True,
                           right_index=True).merge(fips_pop_table,
                           left_index=True, right_index=True)
@@ -169,19 +171,52 @@ def evd_ranking_fn(ts_streams, EVD_max, EVD_min):
     -------
     evd_ranking: Ranking streams via the extreme value distribution
     """
-    evd_ranking = pd.concat([ts_streams.apply(lambda x: ts_val(x.values[0],
-                             EVD_min['0']), axis=1).sort_values(),
-                              ts_streams.apply(lambda x:
-                              1 - ts_val(x.values[0], EVD_max['0']),
-                              axis=1).sort_values()], axis=1).max(axis=1)
-    evd_ranking.name = 'evd_ranking'
+    ts = ts_streams.iloc[:, 0].values
+    evd_ranking = pd.Series(np.fmax(ts_vals(ts, sorted_distribution(EVD_min['0'])),
+                                    1 - ts_vals(ts, sorted_distribution(EVD_max['0']))),
+                            index=ts_streams.index, name='evd_ranking')
     return evd_ranking
 
 
+def two_sided_ranking(ranking):
+    """Fold a one-sided ranking so that both tails map towards 1.
+
+    Parameters
+    ----------
+    ranking: Series of p-values in [0, 1]
+
+    Returns
+    -------
+    Series of 2 * |p - 0.5|
+    """
+    return 2 * (ranking - 0.5).abs()
+
+
+def stream_individual_fn(stream, ts_streams):
+    """Create the ranking from each stream's own historical distribution.
+
+    Parameters
+    ----------
+    stream: historical test statistic csv
+    ts_streams: today's test-statistic values for the stream
+
+    Returns
+    -------
+    stream_individual: the ranking using each stream's test statistic distribution
+    """
+    ts = ts_streams.iloc[:, 0]
+    hist = stream[ts.index]
+    stream_individual = pd.Series(ts_vals_columns(ts.values, hist.values),
+                                  index=ts.index, name='stream_individual')
+    return stream_individual
+
+
 def streams_groups_fn(stream, ts_streams):
     """Create the ranking from streams using geographical groupings.
 
-    Uses historical distribution from the test-statistics.
+    Uses historical distribution from the test-statistics. Each state group's
+    distribution is pooled with all state-level streams and sorted once, so every
+    stream in the group is ranked with a single `np.searchsorted` call.
 
     Parameters
     ----------
@@ -192,17 +227,24 @@ def streams_groups_fn(stream, ts_streams):
     -------
     stream_group: the ranking using geographically group test statistic distributions
     """
-    streams_groups = stream.copy()
     streams_state = stream[list(filter(lambda x: len(x) == 2,
-                                       stream.columns))].unstack().dropna()  # .values
-    streams_groups.columns = streams_groups.columns.str[:2]
-    ranking_streams = {}
-    for key, group in streams_groups.stack().reset_index().groupby('level_1'):
-        for col, val in ts_streams.T.iterrows():
-            if key == col[:2]:
-                total_dist = pd.concat([group[0], streams_state]).reset_index(drop=True)
-                ranking_streams[col] = ts_val(val[0], total_dist)
-    stream_group = pd.Series(ranking_streams, name='stream_group')
+                                       stream.columns))].values.ravel()
+    stream_keys = stream.columns.str[:2]
+    ts = ts_streams.iloc[:, 0]
+    ts_keys = ts.index.str[:2]
+    ranking_streams = []
+    for key in pd.unique(stream_keys):
+        in_group = ts_keys == key
+        if not in_group.any():
+            continue
+        total_dist = sorted_distribution(np.concatenate(
+            [stream.loc[:, stream_keys == key].values.ravel(), streams_state]))
+        ranking_streams.append(pd.Series(ts_vals(ts.values[in_group], total_dist),
+                                         index=ts.index[in_group]))
+    if not ranking_streams:
+        return pd.Series(dtype=float, name='stream_group')
+    stream_group = pd.concat(ranking_streams)
+    stream_group.name = 'stream_group'
     return stream_group
 
 
@@ -243,6 +285,60 @@ def ts_val(val, dist):
     return sum(val <= dist) / dist.shape[0]
 
 
+def sorted_distribution(dist):
+    """Prepare a test statistic distribution for repeated p-value lookups.
+
+    Parameters
+    ----------
+    dist: The distribution to compare to; NaN entries are dropped
+
+    Returns: sorted array of the distribution's values
+    -------
+
+    """
+    dist = np.asarray(dist, dtype=float)
+    return np.sort(dist[~np.isnan(dist)])
+
+
+def ts_vals(vals, sorted_dist):
+    """Determine p-values for many test statistics against one distribution.
+
+    Vectorized equivalent of `ts_val`, answering each lookup by binary search.
+
+    Parameters
+    ----------
+    vals: array of test statistics
+    sorted_dist: The distribution to compare to, as returned by `sorted_distribution`
+
+    Returns: array of p-values
+    -------
+
+    """
+    vals = np.asarray(vals, dtype=float)
+    if sorted_dist.shape[0] == 0:
+        return np.full(vals.shape, np.nan)
+    return (sorted_dist.shape[0] - np.searchsorted(sorted_dist, vals, side='left')) \
+        / sorted_dist.shape[0]
+
+
+def ts_vals_columns(vals, dists):
+    """Determine p-values for each test statistic against its own distribution.
+
+    Parameters
+    ----------
+    vals: array of test statistics, one per column of `dists`
+    dists: 2D array with one distribution per column; NaN entries are ignored
+
+    Returns: array of p-values
+    -------
+
+    """
+    dists = np.asarray(dists, dtype=float)
+    counts = (~np.isnan(dists)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.asarray(vals, dtype=float)[np.newaxis, :] <= dists).sum(axis=0) / counts
+
+
 def generate_files(params, lag, signal, local=False, s3=None):
     """Generate files needed for evaluation.
 
@@ -358,10 +454,7 @@ def process_params(lag, day, input_df, signal, params, logger, local=False):
     ts_streams, df_for_ts = apply_ar(last_7, lin_coeff, weekday_correction,
                                      non_daily_df_test, fips_pop_table)
     # find stream ranking (individual)
-    stream_individual = ts_streams.T.apply(lambda x: ts_val(x.values[0],
-                                                            stream[x.name].dropna()))
-
-    stream_individual.name = 'stream_individual'
+    stream_individual = stream_individual_fn(stream, ts_streams)
 
     # find stream ranking (group)
     stream_group = streams_groups_fn(stream, ts_streams)
@@ -379,9 +472,8 @@ def process_params(lag, day, input_df, signal, params, logger, local=False):
     type_of_outlier = type_of_outlier.merge(glob,
                         left_index=True, right_index=True, how='outer').fillna(0)
 
-    stream_group = stream_group.apply(lambda x: 2 * (0.5 - x) if x < 0.5 else 2 * (x - 0.5))
-    stream_individual = stream_individual.apply(lambda x: 2 * (0.5 - x) if
-    x < 0.5 else 2 * (x - 0.5))
+    stream_group = two_sided_ranking(stream_group)
+    stream_individual = two_sided_ranking(stream_individual)
 
     type_of_outlier = type_of_outlier.merge(stream_individual,
         left_index=True, right_index=True,
@@ -4,35 +4,135 @@
 This module should contain a function called `run_module`, that is executed
 when the module is run with `python -m delphi_utils.flash_eval`.
 """
+import multiprocessing
+import time
 from datetime import date
 import pandas as pd
 from .eval_day import flash_eval
+from ..logger import get_structured_logger, LoggerThread
 from ..validator.datafetcher import read_filenames, load_csv
 
+# Seconds between checks on outstanding signals in pooled mode.
+POLL_INTERVAL = 1
+
+
+def load_signal_days(signal, export_dir, export_files):
+    """Concat the data from recent files at nation, state, and county resolution per day."""
+    days = {}
+    for x in export_files:
+        if signal in x and pd.Series([y in x for y in ['state', 'county', 'nation']]).any():
+            day = pd.to_datetime(x.split('_')[0], format="%Y%m%d", errors='raise')
+            days[day] = pd.concat([days.get(day, pd.DataFrame()),
+                                   load_csv(f"{export_dir}/{x}")])
+    return days
+
+
+def evaluate_signal(signal, params, export_files, logger=None):
+    """Evaluate every exported day of one signal with FlaSH.
+
+    Days are evaluated in date order, since each day updates the stored last 7 days
+    that the next day is predicted from.
+
+    Returns the number of days evaluated.
+    """
+    days = load_signal_days(signal, params["common"]["export_dir"], export_files)
+    for day, input_df in dict(sorted(days.items())).items():
+        start_time = time.time()
+        input_df = input_df[['geo_id', 'val']].set_index('geo_id').T
+        input_df.index = [day]
+        today = date.today()
+        lag= (pd.to_datetime(today)-pd.to_datetime(day)).days
+        # inital flash implementation assume lag == 1 always
+        #if str(lag) in params["flash"]["lags"]:
+        lag=1
+        flash_eval(int(lag), day, input_df, signal, params, logger=logger)
+        if logger:
+            logger.info("Completed FlaSH day",
+                        signal=signal,
+                        day=day.strftime("%Y-%m-%d"),
+                        elapsed_time_in_seconds=round(time.time() - start_time, 2))
+    return len(days)
+
+
+def _evaluate_signal_task(signal, params, export_files, logger, start_times):
+    """Pool entry point for `evaluate_signal` that records when the task started."""
+    start_times[signal] = time.time()
+    return evaluate_signal(signal, params, export_files, logger)
+
+
+def run_pooled(signals, params, export_files, logger):
+    """Evaluate signals concurrently, giving each signal its own time budget.
+
+    A signal that runs past `params["flash"]["task_timeout"]` seconds is abandoned
+    (its worker is terminated when the pool closes) and reported, while the results
+    of the other signals are still collected and logged.
+
+    Returns a dictionary from outcome ("completed", "failed", "timed_out") to signals.
+    """
+    n_cores = params["flash"]["n_cores"]
+    task_timeout = params["flash"].get("task_timeout", 300)
+    outcomes = {"completed": [], "failed": [], "timed_out": []}
+    with multiprocessing.Manager() as manager:
+        logger_thread = LoggerThread(logger, manager.Queue())
+        start_times = manager.dict()
+        try:
+            # Leaving the Pool context terminates workers still busy with abandoned signals.
+            with multiprocessing.Pool(n_cores) as pool:
+                pending = {
+                    signal: pool.apply_async(
+                        _evaluate_signal_task,
+                        args=(signal, params, export_files,
+                              logger_thread.get_sublogger(), start_times))
+                    for signal in signals
+                }
+                while pending:
+                    for signal, result in list(pending.items()):
+                        if result.ready():
+                            del pending[signal]
+                            try:
+                                n_days = result.get()
+                            except Exception as e: # pylint: disable=broad-except
+                                outcomes["failed"].append(signal)
+                                logger.error("FlaSH signal failed", signal=signal, error=str(e))
+                            else:
+                                outcomes["completed"].append(signal)
+                                logger.info("Completed FlaSH signal",
+                                            signal=signal, n_days=n_days,
+                                            elapsed_time_in_seconds=round(
+                                                time.time() - start_times[signal], 2))
+                        elif signal in start_times and \
+                                time.time() - start_times[signal] > task_timeout:
+                            del pending[signal]
+                            outcomes["timed_out"].append(signal)
+                            logger.error("FlaSH signal timed out, abandoning",
+                                         signal=signal, task_timeout=task_timeout)
+                    if pending:
+                        time.sleep(POLL_INTERVAL)
+        finally:
+            logger_thread.stop()
+    logger.info("Completed FlaSH evaluation", **outcomes)
+    return outcomes
+
+
 def run_module(params):
     """Run the FlaSH module.
 
     The parameters dictionary must include the signals and signals.
     We are only considering lag-1 data.
+
+    If `params["flash"]["n_cores"]` is greater than 1, signals are evaluated in a
+    pool of that many processes, each with a time budget of
+    `params["flash"]["task_timeout"]` seconds.
     """
     if params.get("flash", None):
         signals = params["flash"].get("signals", [])
+        export_files = [x for (x, _) in read_filenames(params["common"]["export_dir"])]
+        if params["flash"].get("n_cores", 1) > 1:
+            logger = get_structured_logger(
+                __name__,
+                filename=params["common"].get("log_filename", None),
+                log_exceptions=params["common"].get("log_exceptions", True))
+            run_pooled(signals, params, export_files, logger)
+            return
         for signal in signals:
-            export_files = read_filenames(params["common"]["export_dir"])
-            days = {}
-            for (x, _) in export_files:
-                #Concat the data from recent files at nation, state, and county resolution per day.
-                if signal in x and pd.Series([y in x for y in ['state', 'county', 'nation']]).any():
-                    day = pd.to_datetime(x.split('_')[0], format="%Y%m%d", errors='raise')
-                    days[day] = pd.concat([days.get(day, pd.DataFrame()),
-                                           load_csv(f"{params['common']['export_dir']}/{x}")])
-
-            for day, input_df in dict(sorted(days.items())).items():
-                input_df = input_df[['geo_id', 'val']].set_index('geo_id').T
-                input_df.index = [day]
-                today = date.today()
-                lag= (pd.to_datetime(today)-pd.to_datetime(day)).days
-                # inital flash implementation assume lag == 1 always
-                #if str(lag) in params["flash"]["lags"]:
-                lag=1
-                flash_eval(int(lag), day, input_df, signal, params)
+            evaluate_signal(signal, params, export_files)
@@ -8,6 +8,7 @@ from os.path import join
 from typing import Iterator, List, Literal, Optional, Set, Union
 
 import importlib_resources
+import numpy as np
 import pandas as pd
 from pandas.api.types import is_string_dtype
 
@@ -652,7 +653,12 @@ class GeoMapper:
         )
 
     def aggregate_by_weighted_sum(
-        self, df: pd.DataFrame, to_geo: str, sensor_col: str, time_col: str, population_col: str
+        self,
+        df: pd.DataFrame,
+        to_geo: str,
+        sensor_col: Union[str, List[str]],
+        time_col: str,
+        population_col: str,
     ) -> pd.DataFrame:
         """Aggregate sensor, weighted by time-dependent population.
 
@@ -671,8 +677,9 @@ class GeoMapper:
             to a from_geo, e.g. "wastewater collection site").
         to_geo: str
             The column name of the geocode to aggregate to.
-        sensor_col: str
-            The column name of the sensor to aggregate.
+        sensor_col: Union[str, List[str]]
+            The column name of the sensor to aggregate, or a list of them to aggregate
+            together. Each sensor gets its own weights, excluding its NA locations.
         time_col: str
             The column name of the timestamp to aggregate over.
         population_column: str
@@ -681,26 +688,29 @@ class GeoMapper:
         Returns
         ---------
         agg_df: pd.DataFrame
-            A dataframe with the aggregated sensor values, weighted by population.
+            A dataframe with the aggregated sensor values, weighted by population, in
+            a "weighted_<sensor_col>" column for each sensor.
         """
-        # Don't modify the input dataframe
-        df = df.copy()
-        # Zero-out populations where the sensor is NA
-        df["_zeroed_pop"] = df[population_col] * df[sensor_col].abs().notna()
-        # Weight the sensor by the population
-        df["_weighted_sensor"] = df[sensor_col] * df["_zeroed_pop"]
-        agg_df = (
-            df.groupby([time_col, to_geo])
-            .agg(
-            {
-                "_zeroed_pop": "sum",
-                "_weighted_sensor": lambda x: x.sum(min_count=1),
-            }
-            ).assign(
-                _new_sensor = lambda x: x["_weighted_sensor"] / x["_zeroed_pop"]
-            ).reset_index()
-            .rename(columns={"_new_sensor": f"weighted_{sensor_col}"})
-            .drop(columns=["_zeroed_pop", "_weighted_sensor"])
+        sensor_cols = [sensor_col] if isinstance(sensor_col, str) else list(sensor_col)
+        n_sensors = len(sensor_cols)
+        values = df[sensor_cols].to_numpy(dtype=float)
+        # Zero-out populations where each sensor is NA
+        zeroed_pop = df[population_col].to_numpy(dtype=float)[:, None] * ~np.isnan(values)
+        # Weight the sensors by the population
+        weighted = values * zeroed_pop
+        # Sum all populations and weighted sensors in one grouped reduction, counting the
+        # non-NA weighted sensors so that groups without any are NA rather than 0
+        grouped = pd.DataFrame(np.hstack([zeroed_pop, weighted]), index=df.index).groupby(
+            [df[time_col], df[to_geo]]
         )
+        sums = grouped.sum()
+        index, sums = sums.index, sums.to_numpy()
+        counts = grouped[list(range(n_sensors, 2 * n_sensors))].count().to_numpy()
+        weighted_sums = np.where(counts > 0, sums[:, n_sensors:], np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weighted_means = weighted_sums / sums[:, :n_sensors]
+        agg_df = pd.DataFrame(
+            weighted_means, index=index, columns=[f"weighted_{col}" for col in sensor_cols]
+        ).reset_index()
 
         return agg_df
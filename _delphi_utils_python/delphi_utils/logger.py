@@ -152,9 +152,10 @@ class LoggerThread():
     class SubLogger():
         """MP-safe logger-like interface to convey log messages to a listening LoggerThread."""
 
-        def __init__(self, queue):
-            """Create SubLogger with a bound queue."""
+        def __init__(self, queue, name=None):
+            """Create SubLogger with a bound queue, and the name of the logger it conveys to."""
             self.queue = queue
+            self.name = name
 
         def _log(self, level, *args, **kwargs):
             kwargs_plus = {'sub_pid': multiprocessing.current_process().pid}
@@ -216,7 +217,7 @@ class LoggerThread():
         logger.debug('starting thread')
         self.thread.start()
 
-        self.sublogger = LoggerThread.SubLogger(self.msg_queue)
+        self.sublogger = LoggerThread.SubLogger(self.msg_queue, logger.name)
         self.running = True
 
     def stop(self):
@@ -0,0 +1,123 @@
+"""Run an indicator for many issue dates, to patch its history.
+
+Each issue is exported to its own `[patch_dir]/issue_[YYYYMMDD]/[source]` directory, in the batch
+issue format, so issues are independent and can run in parallel. An indicator's `patch.py` lists
+the issue dates and hands over a function running one of them:
+
+>>> def run_issue(params, issue_date, export_dir, logger):
+...     params["patch"]["current_issue"] = issue_date.strftime("%Y-%m-%d")
+...     params["common"]["export_dir"] = export_dir
+...     run_module(params, logger)
+>>> run_patch(issue_dates, partial(run_issue, params), params["patch"]["patch_dir"], "source",
+...           logger, params["patch"].get("max_workers", 1))
+
+With more than one worker, the function and its arguments must be picklable, e.g. a module-level
+function, and it is handed a logger proxy supporting debug, info, warning, error and critical.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from os import makedirs, rename
+from os.path import dirname, exists, join
+from shutil import rmtree
+from typing import Callable, List
+
+from .logger import LoggerThread
+
+TMP_DIR = ".tmp"
+
+
+def get_issue_dir(patch_dir: str, issue_date: date, source: str) -> str:
+    """Return the directory that the exports of an issue are written to."""
+    return join(patch_dir, f"issue_{issue_date.strftime('%Y%m%d')}", source)
+
+
+def _run_issue(run_issue: Callable, issue_date: date, patch_dir: str, source: str, logger):
+    """Run one issue, exporting to a temporary directory moved in place once it succeeds."""
+    tmp_dir = get_issue_dir(join(patch_dir, TMP_DIR), issue_date, source)
+    # Left over by an interrupted run
+    rmtree(tmp_dir, ignore_errors=True)
+    makedirs(tmp_dir)
+    logger.info("Running issue", issue_date=issue_date.strftime("%Y-%m-%d"))
+    run_issue(issue_date, tmp_dir, logger)
+    issue_dir = get_issue_dir(patch_dir, issue_date, source)
+    makedirs(dirname(issue_dir), exist_ok=True)
+    rename(tmp_dir, issue_dir)
+    logger.info("Finished issue", issue_date=issue_date.strftime("%Y-%m-%d"))
+
+
+def run_patch(issue_dates: List[date], run_issue: Callable, patch_dir: str, source: str, logger,
+              max_workers: int = 1):
+    """Run an indicator for each issue date, across a pool of processes.
+
+    An issue's exports are only moved to its directory once it ran successfully, so issues
+    whose directory already exists are skipped, and an interrupted patch resumes where it
+    stopped. A failing issue is logged without stopping the others.
+
+    Parameters
+    ----------
+    issue_dates: List[date]
+        Issue dates to patch
+    run_issue: Callable
+        Function running one issue, called with the issue date, the directory to export to and
+        a logger
+    patch_dir: str
+        Directory to write the issue directories to
+    source: str
+        Name of the source directory within each issue directory
+    logger: logging.Logger
+        Logger to report the issues to
+    max_workers: int
+        Number of issues to run at once. With 1, issues are run one after another in this process.
+        Otherwise each issue runs in a worker process, which is not daemonic so that an issue may
+        start its own pool (e.g. doctor_visits with `params["indicator"]["parallel"]`); there may
+        then be up to `max_workers` such pools at once.
+
+    Raises
+    ------
+    RuntimeError
+        If any issue failed, once every issue has run
+    """
+    pending = []
+    for issue_date in issue_dates:
+        if exists(get_issue_dir(patch_dir, issue_date, source)):
+            logger.info("Skipping issue already patched", issue_date=issue_date.strftime("%Y-%m-%d"))
+        else:
+            pending.append(issue_date)
+    logger.info("Patching issues", patch_directory=patch_dir, num_issues=len(pending),
+                num_skipped=len(issue_dates) - len(pending), max_workers=max_workers)
+
+    failed = []
+    if max_workers > 1 and len(pending) > 1:
+        # Unlike multiprocessing.Pool workers, executor workers aren't daemonic and may have children
+        with multiprocessing.Manager() as manager:
+            logger_thread = LoggerThread(logger, manager.Queue())
+            try:
+                with ProcessPoolExecutor(min(max_workers, len(pending))) as executor:
+                    futures = [
+                        executor.submit(_run_issue, run_issue, issue_date, patch_dir, source,
+                                        logger_thread.get_sublogger())
+                        for issue_date in pending
+                    ]
+                    for issue_date, future in zip(pending, futures):
+                        try:
+                            future.result()
+                        except Exception:  # pylint: disable=broad-except
+                            logger.error("Failed to patch issue",
+                                         issue_date=issue_date.strftime("%Y-%m-%d"), exc_info=True)
+                            failed.append(issue_date)
+            finally:
+                logger_thread.stop()
+    else:
+        for issue_date in pending:
+            try:
+                _run_issue(run_issue, issue_date, patch_dir, source, logger)
+            except Exception:  # pylint: disable=broad-except
+                logger.error("Failed to patch issue", issue_date=issue_date.strftime("%Y-%m-%d"),
+                             exc_info=True)
+                failed.append(issue_date)
+
+    if failed:
+        raise RuntimeError(f"Failed to patch issues {', '.join(d.strftime('%Y-%m-%d') for d in failed)}; "
+                           "run the patch again to retry them")
+    rmtree(join(patch_dir, TMP_DIR), ignore_errors=True)
@@ -0,0 +1,185 @@
+"""Timing and memory profiling of indicator runs.
+
+`run_indicator_pipeline` activates a `RunProfile` for the whole run and records each of its
+stages in it. `create_export_csv` records a "write_csv" stage for each CSV export, which only
+covers writing the files. Computing each (geo, signal) is up to the indicator, which records
+its own stages with `profile_stage`, which does nothing when no profile is active:
+
+>>> with profile_stage("compute", geo=geo, signal=signal) as stage:
+...     df = aggregate(df)
+...     stage.add_rows(len(df))
+
+Stages measured in worker processes can't reach the active profile directly; a worker can
+measure them with `RunProfile().stage` and return them to be recorded with `add_stage`.
+
+Settings are read from `params["common"]["profiling"]`:
+    - "profile_file": path to write the JSON run profile to
+    - "code_profiler": "cprofile" or "pyinstrument", to also profile the run's code
+    - "code_profile_file": path to write the code profile to
+"""
+import cProfile
+import json
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# The RunProfile that stages are currently recorded in, if any.
+_active_profile: Optional["RunProfile"] = None
+
+
+def _peak_rss_in_mb(who=resource.RUSAGE_SELF):
+    """Get the peak resident set size of the process over its whole life so far, in MB."""
+    peak_rss = resource.getrusage(who).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return round(peak_rss / 2**20, 1)
+    return round(peak_rss / 2**10, 1)
+
+
+@dataclass
+class StageProfile:
+    """Measurements of one stage of a run.
+
+    The peak resident set size of a process only ever grows, so `process_peak_rss_in_mb` is the
+    peak of the whole run up to the end of the stage. `peak_rss_growth_in_mb` is how much the
+    stage raised that peak, which is the memory attributable to the stage itself: a stage using
+    less memory than an earlier one shows no growth.
+    """
+
+    stage: str
+    labels: Dict[str, Any] = field(default_factory=dict)
+    wall_time_in_seconds: Optional[float] = None
+    cpu_time_in_seconds: Optional[float] = None
+    peak_rss_growth_in_mb: Optional[float] = None
+    process_peak_rss_in_mb: Optional[float] = None
+    process_peak_children_rss_in_mb: Optional[float] = None
+    rows: Optional[int] = None
+
+    def add_rows(self, rows: int):
+        """Count rows processed in this stage."""
+        self.rows = (self.rows or 0) + int(rows)
+
+
+class RunProfile:
+    """Collect timing, memory, and row count measurements for the stages of a run."""
+
+    def __init__(self, logger=None):
+        """Create an empty profile, logging each completed stage to `logger` if provided."""
+        self.logger = logger
+        self.start_time = datetime.now()
+        self.stages: List[StageProfile] = []
+
+    @contextmanager
+    def activate(self):
+        """Record stages started with `profile_stage` in this profile within the context."""
+        global _active_profile # pylint: disable=global-statement
+        previous, _active_profile = _active_profile, self
+        try:
+            yield self
+        finally:
+            _active_profile = previous
+
+    @contextmanager
+    def stage(self, name: str, **labels):
+        """Measure the wall time, CPU time, and peak memory growth of the code within the context."""
+        stage = StageProfile(name, labels)
+        start_peak_rss = _peak_rss_in_mb()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stage
+        finally:
+            stage.wall_time_in_seconds = round(time.perf_counter() - start_wall, 3)
+            stage.cpu_time_in_seconds = round(time.process_time() - start_cpu, 3)
+            stage.process_peak_rss_in_mb = _peak_rss_in_mb()
+            stage.peak_rss_growth_in_mb = round(stage.process_peak_rss_in_mb - start_peak_rss, 1)
+            stage.process_peak_children_rss_in_mb = _peak_rss_in_mb(resource.RUSAGE_CHILDREN)
+            self.add(stage)
+
+    def add(self, stage: StageProfile):
+        """Record a completed stage, e.g. one measured in a worker process."""
+        self.stages.append(stage)
+        if self.logger:
+            self.logger.info("Completed stage",
+                             stage=stage.stage,
+                             **stage.labels,
+                             wall_time_in_seconds=stage.wall_time_in_seconds,
+                             cpu_time_in_seconds=stage.cpu_time_in_seconds,
+                             peak_rss_growth_in_mb=stage.peak_rss_growth_in_mb,
+                             process_peak_rss_in_mb=stage.process_peak_rss_in_mb,
+                             process_peak_children_rss_in_mb=stage.process_peak_children_rss_in_mb,
+                             rows=stage.rows)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the profile to a JSON-serializable dictionary."""
+        return {
+            "start_time": self.start_time.isoformat(),
+            "elapsed_time_in_seconds": round(
+                (datetime.now() - self.start_time).total_seconds(), 3),
+            "process_peak_rss_in_mb": _peak_rss_in_mb(),
+            "stages": [asdict(stage) for stage in self.stages],
+        }
+
+    def write(self, filename: str):
+        """Write the profile to `filename` as JSON."""
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+
+@contextmanager
+def profile_stage(name: str, **labels):
+    """Record a stage in the active `RunProfile`, if there is one.
+
+    Yields a `StageProfile` in either case, so callers can count rows unconditionally.
+    """
+    if _active_profile is None:
+        yield StageProfile(name, labels)
+    else:
+        with _active_profile.stage(name, **labels) as stage:
+            yield stage
+
+
+def add_stage(stage: StageProfile):
+    """Record a completed stage in the active `RunProfile`, if there is one."""
+    if _active_profile is not None:
+        _active_profile.add(stage)
+
+
+@contextmanager
+def code_profiler(profiler: Optional[str], filename: Optional[str]):
+    """Profile the code run within the context and dump the results to `filename`.
+
+    Parameters
+    ----------
+    profiler: Optional[str]
+        "cprofile" to write cProfile stats, "pyinstrument" to write a pyinstrument HTML report,
+        or None to not profile.
+    filename: Optional[str]
+        File to write the profile to.
+    """
+    if profiler is None:
+        yield
+    elif profiler == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(filename)
+    elif profiler == "pyinstrument":
+        from pyinstrument import Profiler # pylint: disable=import-outside-toplevel
+        prof = Profiler()
+        prof.start()
+        try:
+            yield
+        finally:
+            prof.stop()
+            with open(filename, "w") as f:
+                f.write(prof.output_html())
+    else:
+        raise ValueError(f"Unknown code profiler '{profiler}'; "
+                         "expected 'cprofile' or 'pyinstrument'")
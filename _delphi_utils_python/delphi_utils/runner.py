@@ -2,11 +2,16 @@
 import argparse as ap
 import importlib
 import os
+from os.path import basename, exists, join
 from typing import Any, Callable, Dict, Optional
 import multiprocessing
+import threading
 import time
 from .archive import ArchiveDiffer, archiver_from_params
+from .export import exported_files_queue
+from .export_plan import commit_export_plans, discard_export_plans, get_export_plan_dir
 from .logger import get_structured_logger
+from .profiling import RunProfile, code_profiler, profile_stage
 from .utils import read_params, transfer_files, delete_move_files
 from .validator.validate import Validator
 from .validator.run import validator_from_params
@@ -17,6 +22,117 @@ Params = Dict[str, Any]
 # Trivial function to use as default value for validator and archive functions.
 NULL_FN = lambda x: None
 
+class ExportStreamConsumer:
+    """Validate and diff export files in a background thread while the indicator writes them.
+
+    Used as a context manager around the indicator run. Files written with
+    `create_export_csv` from the indicator's process are picked up as they are written;
+    on exit, the export directory is rescanned so that files written any other way, or
+    rewritten after they were processed, are also covered before the results are used.
+    """
+
+    def __init__(self, export_dir: str, validator: Optional[Validator],
+                 archiver: Optional[ArchiveDiffer], logger):
+        """Create a consumer for files in `export_dir`; either stage may be None."""
+        self.export_dir = export_dir
+        self.validator = validator
+        self.archiver = archiver
+        self.logger = logger
+        # filename -> (file state, validate_file result, (is_new, diff_file))
+        self.processed: Dict[str, Any] = {}
+        self._cache_context = None
+        self._queue_context = None
+        self._queue = None
+        self._thread = None
+
+    def __enter__(self):
+        """Prepare the archive cache and start consuming exported files."""
+        if self.archiver:
+            self.archiver.update_cache()
+            self._cache_context = self.archiver.cache_context()
+            self._cache_context.__enter__()
+        self._queue_context = exported_files_queue()
+        self._queue = self._queue_context.__enter__()
+        self._thread = threading.Thread(target=self._consume, name="ExportStreamConsumer")
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Wait for queued files, then process anything in the export directory missed."""
+        self._queue.put(None)
+        self._thread.join()
+        self._queue_context.__exit__(None, None, None)
+        try:
+            if exc_type is None:
+                exported = {f for f in os.listdir(self.export_dir) if f.endswith(".csv")}
+                for filename in sorted(exported):
+                    self.process(filename)
+                for filename in set(self.processed) - exported:
+                    self._remove_diff(self.processed.pop(filename)[2])
+        finally:
+            if self._cache_context:
+                self._cache_context.__exit__(exc_type, exc_value, traceback)
+
+    def _consume(self):
+        while True:
+            export_file = self._queue.get()
+            if export_file is None:
+                break
+            try:
+                self.process(basename(export_file))
+            except Exception as e: # pylint: disable=broad-except
+                # Left unprocessed, so the file is retried when the stream is closed.
+                self.logger.warning("Failed to process exported file while streaming",
+                                    filename=export_file, error=str(e))
+
+    def process(self, filename: str):
+        """Validate and diff a single export file, unless it is unchanged since last time."""
+        try:
+            stat = os.stat(join(self.export_dir, filename))
+        except FileNotFoundError:
+            self.processed.pop(filename, None)
+            return
+        state = (stat.st_mtime_ns, stat.st_size)
+        if filename in self.processed:
+            if self.processed[filename][0] == state:
+                return
+            self._remove_diff(self.processed[filename][2])
+        validated = self.validator.validate_file(filename) if self.validator else None
+        diff = None
+        if self.archiver:
+            if exists(join(self.archiver.cache_dir, filename)):
+                diff = (False, self.archiver.diff_export_file(filename))
+            else:
+                diff = (True, None)
+        self.processed[filename] = (state, validated, diff)
+
+    def validated_files(self):
+        """Results of `Validator.validate_file` for every file in the export directory."""
+        return [validated for (_, validated, _) in self.processed.values()
+                if validated is not None]
+
+    def diffs(self):
+        """Return (common_diffs, new_files) for every file, as used by `ArchiveDiffer.run`."""
+        common_diffs, new_files = {}, []
+        for filename, (_, _, (is_new, diff_file)) in sorted(self.processed.items()):
+            export_file = join(self.export_dir, filename)
+            if is_new:
+                new_files.append(export_file)
+            else:
+                common_diffs[export_file] = diff_file
+        return common_diffs, new_files
+
+    def discard_diffs(self):
+        """Remove the diff files written while streaming."""
+        for (_, _, diff) in self.processed.values():
+            self._remove_diff(diff)
+
+    @staticmethod
+    def _remove_diff(diff):
+        if diff and diff[1] and exists(diff[1]):
+            os.remove(diff[1])
+
+
 def run_indicator_pipeline(indicator_fn:  Callable[[Params], None],
                             flash_fn: Callable[[Params], None] = NULL_FN,
                            validator_fn:  Callable[[Params], Optional[Validator]] = NULL_FN,
@@ -30,6 +146,20 @@ def run_indicator_pipeline(indicator_fn:  Callable[[Params], None],
     to be used in `indicator_fn`, `validator_fn`, `archiver_fn`, `flash_fn` and shared across
     functions, respectively.The timer function stops the flash process after a certain time.
 
+    If `params["common"]["stream_exports"]` is true, the validator and archiver are created
+    before the indicator runs, and each file the indicator exports is statically validated and
+    diffed against the archive while later files are still being computed. Checks across files,
+    the success decision, and archiving or delivery still happen only once the indicator is done.
+
+    If the indicator plans its exports with an `export_plan.ExportPlan`, the row hashes it saves
+    are only committed once archiving and delivery succeed, and are discarded if validation fails,
+    so that dates whose exports were discarded are exported again by the next run.
+
+    The wall time, CPU time, and peak memory of each stage are logged, along with any stages
+    the indicator records itself with `profiling.profile_stage`. See `profiling` for the
+    `params["common"]["profiling"]` settings that write these to a JSON run profile and
+    optionally profile the run with cProfile or pyinstrument.
+
     Arguments
     ---------
     indicator_fn: Callable[[Params], None]
@@ -70,38 +200,74 @@ def run_indicator_pipeline(indicator_fn:  Callable[[Params], None],
             "Started a covidcast-indicator without version.cfg", indicator_name=ind_name
         )
 
-    indicator_fn(params)
-    validator = validator_fn(params)
-    archiver = archiver_fn(params)
-
-    t1 = multiprocessing.Process(target=flash_fn, args=[params])
-    t1.start()
-    start = time.time()
-    while time.time()-start < timer:
-        if not t1.is_alive():
-            logger.info("Completed flash step",
-                    elapsed_time_in_seconds = round(time.time() - start, 2))
-            break
-        time.sleep(1)
-    else:
-        logger.error(
-            "Flash step timed out, terminating",
-            elapsed_time_in_seconds=round(time.time() - start, 2),
-        )
-        t1.terminate()
-        t1.join()
-    if validator:
-        validation_report = validator.validate()
-        validation_report.log(logger)
-        # Validators on dry-run always return success
-        if not validation_report.success():
-            delete_move_files()
-    if (not validator or validation_report.success()):
-        if archiver:
-            archiver.run(logger)
-        if "delivery" in params:
-            transfer_files()
+    plan_dir = get_export_plan_dir(params)
+    if plan_dir and exists(plan_dir):
+        # Left over by a run that failed before archiving
+        discard_export_plans(plan_dir)
+
+    profiling_params = params["common"].get("profiling", {})
+    profile = RunProfile(logger)
+    with profile.activate(), code_profiler(profiling_params.get("code_profiler"),
+                                           profiling_params.get("code_profile_file")):
+        consumer = None
+        if params["common"].get("stream_exports", False):
+            validator = validator_fn(params)
+            archiver = archiver_fn(params)
+            consumer = ExportStreamConsumer(params["common"]["export_dir"],
+                                            validator, archiver, logger)
+            with profile_stage("indicator"), consumer:
+                indicator_fn(params)
+        else:
+            with profile_stage("indicator"):
+                indicator_fn(params)
+            validator = validator_fn(params)
+            archiver = archiver_fn(params)
 
+        with profile_stage("flash"):
+            t1 = multiprocessing.Process(target=flash_fn, args=[params])
+            t1.start()
+            start = time.time()
+            while time.time()-start < timer:
+                if not t1.is_alive():
+                    logger.info("Completed flash step",
+                            elapsed_time_in_seconds = round(time.time() - start, 2))
+                    break
+                time.sleep(1)
+            else:
+                logger.error(
+                    "Flash step timed out, terminating",
+                    elapsed_time_in_seconds=round(time.time() - start, 2),
+                )
+                t1.terminate()
+                t1.join()
+        if validator:
+            with profile_stage("validation"):
+                if consumer:
+                    validation_report = validator.validate(consumer.validated_files())
+                else:
+                    validation_report = validator.validate()
+            validation_report.log(logger)
+            # Validators on dry-run always return success
+            if not validation_report.success():
+                if consumer:
+                    consumer.discard_diffs()
+                delete_move_files()
+                if plan_dir and exists(plan_dir):
+                    discard_export_plans(plan_dir)
+        if (not validator or validation_report.success()):
+            if archiver:
+                with profile_stage("archiving"):
+                    if consumer:
+                        archiver.run(logger, consumer.diffs())
+                    else:
+                        archiver.run(logger)
+            if "delivery" in params:
+                with profile_stage("delivery"):
+                    transfer_files()
+            if plan_dir and exists(plan_dir):
+                commit_export_plans(plan_dir)
+    if profiling_params.get("profile_file"):
+        profile.write(profiling_params["profile_file"])
 
 if __name__ == "__main__":
     parser = ap.ArgumentParser()
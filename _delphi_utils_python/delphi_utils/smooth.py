@@ -80,6 +80,8 @@ class Smoother:  # pylint: disable=too-many-instance-attributes
     smooth: np.ndarray or pd.Series
         Takes a 1D signal and returns a smoothed version.
         The input and the output have the same length and type.
+    smooth_columns: np.ndarray
+        Takes a 2D array and returns the smoothed version of each of its columns.
 
     Example Usage
     -------------
@@ -209,6 +211,70 @@ class Smoother:  # pylint: disable=too-many-instance-attributes
             signal_smoothed.index = pandas_index
         return signal_smoothed
 
+    def smooth_columns(self, signals: np.ndarray, lengths=None, impute_order=2) -> np.ndarray:
+        """Apply a smoother to each column of a 2D array.
+
+        Gives the same values as `smooth` on each column, computing the identity and the moving
+        average smoothers (without savgol imputation) for all columns at once. Other smoothers
+        are applied column by column.
+
+        Parameters
+        ----------
+        signals: np.ndarray
+            A 2D array whose columns are signals on the same time grid.
+        lengths: np.ndarray or None
+            The length of each signal. Rows past the length of a signal are padding: they are
+            not smoothed, and are nan in the output. If None, every signal spans all rows.
+        impute_order: int
+            The polynomial order of the fit used for imputation.
+
+        Returns
+        ----------
+        signals_smoothed: np.ndarray
+            An array of smoothed signals, of the same shape as the input.
+        """
+        n_rows, n_cols = signals.shape
+        lengths = np.full(n_cols, n_rows) if lengths is None else np.asarray(lengths)
+        padding = np.arange(n_rows)[:, None] >= lengths
+        if self.smoother_name == "identity":
+            signals_smoothed = signals.astype(float)
+        elif self.smoother_name != "moving_average" or self.impute_method == "savgol":
+            signals_smoothed = np.full((n_rows, n_cols), np.nan)
+            for col, length in enumerate(lengths):
+                signals_smoothed[:length, col] = self.smooth(
+                    signals[:length, col], impute_order=impute_order
+                )
+        else:
+            signals_smoothed = self._moving_average_columns(signals, lengths)
+        signals_smoothed[padding] = np.nan
+        return signals_smoothed
+
+    def _moving_average_columns(self, signals, lengths):
+        """Compute `smooth` with the moving average smoother on each column of a 2D array."""
+        if not isinstance(self.window_length, int):
+            raise ValueError("k must be int.")
+
+        n_rows, n_cols = signals.shape
+        not_nan = ~np.isnan(signals) & (np.arange(n_rows)[:, None] < lengths)
+        # Signals are truncated to start at their first non-nan value; all-nan signals pass through
+        first_value = np.where(not_nan.any(axis=0), not_nan.argmax(axis=0), lengths)
+        imputed = np.nan_to_num(signals) if self.impute_method == "zeros" else signals
+        padded = np.vstack([np.zeros((self.window_length - 1, n_cols)), imputed])
+        # Summed oldest first, as np.convolve does
+        window_sum = padded[:n_rows].copy()
+        for shift in range(1, self.window_length):
+            window_sum += padded[shift : shift + n_rows]
+        signals_smoothed = window_sum / self.window_length
+        signals_smoothed[
+            np.arange(n_rows)[:, None] < first_value + self.window_length - 1
+        ] = np.nan
+
+        # Don't smooth in the same edge cases as `smooth`
+        truncated_lengths = lengths - first_value
+        unsmoothed = (truncated_lengths < self.poly_fit_degree) | (truncated_lengths == 1)
+        signals_smoothed[:, unsmoothed] = signals[:, unsmoothed]
+        return signals_smoothed
+
     def _select_smoother(self):
         """Select a smoothing method based on the smoother type."""
         if self.smoother_name == "savgol":
@@ -0,0 +1,394 @@
+"""Fetch datasets from the Socrata (SODA 2.0) API.
+
+`fetch_socrata` first counts the rows of a dataset, then requests its pages concurrently,
+retrying transient failures with jittered exponential backoff:
+
+>>> df = fetch_socrata("rdmq-nq56", app_token=socrata_token, type_dict={"percent_visits_covid": float})
+
+Pages are converted to typed Arrow record batches as they arrive, and can be streamed to a
+parquet file, so only a few pages are ever held as Python objects.
+
+Given a `snapshot_dir`, it keeps the dataset there and only requests rows whose `:updated_at`
+system field is at least the latest one already stored.
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import makedirs, remove, replace
+from os.path import exists, join
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import requests
+
+# Root of the CDC's Socrata API.
+SOCRATA_BASE_URL = "https://data.cdc.gov"
+# Maximum number of rows per request allowed by SODA 2.0.
+PAGE_SIZE = 50000
+# HTTP status codes worth retrying.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Snapshots include the system fields identifying rows and when they were last updated.
+SNAPSHOT_SELECT = ":id, :updated_at, *"
+SNAPSHOT_FILE = "{dataset_id}.parquet"
+
+_sessions = threading.local()
+
+
+def _session() -> requests.Session:
+    """Get this thread's HTTP session, so each worker reuses its own connection."""
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def _get_json(url: str, params: Dict[str, str], app_token: Optional[str],
+              timeout: float, max_retries: int, backoff: float, logger=None):
+    """GET a SODA endpoint, retrying connection errors and transient HTTP errors.
+
+    The n-th retry waits `backoff * 2**n` seconds plus up to `backoff` seconds of jitter.
+    """
+    headers = {"X-App-Token": app_token} if app_token else {}
+    attempt = 0
+    while True:
+        try:
+            response = _session().get(url, params=params, headers=headers, timeout=timeout)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response.json()
+            error = requests.HTTPError(f"{response.status_code} Error for url: {response.url}",
+                                       response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        if attempt == max_retries:
+            raise error
+        if logger:
+            logger.warning("Retrying Socrata request", url=url, error=str(error), attempt=attempt + 1)
+        time.sleep(backoff * 2**attempt + random.uniform(0, backoff))
+        attempt += 1
+
+
+def count_rows(dataset_id: str,
+               app_token: Optional[str] = None,
+               where: Optional[str] = None,
+               base_url: str = SOCRATA_BASE_URL,
+               timeout: float = 60,
+               max_retries: int = 3,
+               backoff: float = 1.0,
+               logger=None) -> int:
+    """Count the rows of a dataset, or those matching a SoQL `where` clause."""
+    params = {"$select": "count(*) AS row_count"}
+    if where:
+        params["$where"] = where
+    result = _get_json(f"{base_url}/resource/{dataset_id}.json", params, app_token,
+                       timeout, max_retries, backoff, logger)
+    return int(result[0]["row_count"])
+
+
+def _arrow_types(type_dict: Optional[Dict]) -> Dict[str, pa.DataType]:
+    """Get the Arrow types to convert columns to as they are fetched.
+
+    Only numeric and datetime types are converted while fetching; other types in `type_dict`,
+    like str, bool or "category", are left to `pd.DataFrame.astype` once all rows are fetched.
+    """
+    types = {}
+    for col, dtype in (type_dict or {}).items():
+        try:
+            np_dtype = np.dtype(dtype)
+        except TypeError:
+            continue
+        if np_dtype.kind in "fiuM":
+            types[col] = pa.from_numpy_dtype(np_dtype)
+    return types
+
+
+def _cast_columns(table: pa.Table, types: Dict[str, pa.DataType]) -> pa.Table:
+    """Cast the columns of a table that have a type in `types`."""
+    for col, arrow_type in types.items():
+        if col in table.column_names and table.schema.field(col).type != arrow_type:
+            table = table.set_column(table.column_names.index(col), col,
+                                     table[col].cast(arrow_type))
+    return table
+
+
+def _concat_tables(tables: List[pa.Table]) -> pa.Table:
+    """Concatenate tables, filling in columns missing from some of them with nulls."""
+    if not tables:
+        return pa.table({})
+    return pa.concat_tables(tables, promote_options="default")
+
+
+class _ColumnarPages:
+    """Collect pages of Socrata rows as typed Arrow record batches.
+
+    Each page is converted as soon as it is added, so its rows can be freed. Columns are
+    ordered by first appearance, as in `pd.DataFrame.from_records`; since Socrata leaves
+    out null fields, a page may lack some columns, which are filled in with nulls.
+
+    With a `parquet_file`, batches are also written there as they are added. The file's
+    schema is fixed by the first page, so if a later page brings a column the first didn't
+    have, the file is instead written from the whole table when closed.
+    """
+
+    def __init__(self, types: Dict[str, pa.DataType], parquet_file: Optional[str] = None):
+        self.types = types
+        self.parquet_file = parquet_file
+        self.batches = []
+        self.num_pages = 0
+        self.writer = None
+        self.rewrite = False
+
+    def add(self, page: List[Dict]):
+        """Convert a page of rows and add it."""
+        self.num_pages += 1
+        if not page:
+            return
+        columns = list(dict.fromkeys(key for row in page for key in row))
+        arrays = []
+        for col in columns:
+            array = pa.array([row.get(col) for row in page])
+            if col in self.types:
+                array = array.cast(self.types[col])
+            arrays.append(array)
+        batch = pa.RecordBatch.from_arrays(arrays, names=columns)
+        self.batches.append(batch)
+        if self.parquet_file and not self.rewrite:
+            self._write(batch)
+
+    def _write(self, batch: pa.RecordBatch):
+        """Write a batch to the parquet file, conformed to the file's schema."""
+        if self.writer is None:
+            schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type)
+                                else field for field in batch.schema])
+            self.writer = pq.ParquetWriter(f"{self.parquet_file}.tmp", schema)
+        schema = self.writer.schema
+        if not set(batch.schema.names) <= set(schema.names):
+            self.rewrite = True
+            return
+        try:
+            arrays = [batch.column(field.name).cast(field.type) if field.name in batch.schema.names
+                      else pa.nulls(batch.num_rows, field.type) for field in schema]
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            self.rewrite = True
+            return
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    def table(self) -> pa.Table:
+        """Get all batches added so far as a single table."""
+        return _concat_tables([pa.Table.from_batches([batch]) for batch in self.batches])
+
+    def close(self, table: pa.Table):
+        """Finish writing the parquet file, given the table of all batches."""
+        if self.writer is not None:
+            self.writer.close()
+            if self.rewrite:
+                pq.write_table(table, f"{self.parquet_file}.tmp")
+            replace(f"{self.parquet_file}.tmp", self.parquet_file)
+
+    def abort(self):
+        """Discard the partially written parquet file."""
+        if self.writer is not None:
+            self.writer.close()
+            remove(f"{self.parquet_file}.tmp")
+
+
+def _fetch_rows(dataset_id: str, app_token: Optional[str], where: Optional[str],
+                select: Optional[str], base_url: str, page_size: int, max_workers: int,
+                timeout: float, max_retries: int, backoff: float, types: Dict[str, pa.DataType],
+                parquet_file: Optional[str] = None, logger=None) -> pa.Table:
+    """Count the rows matching `where`, then fetch their pages concurrently.
+
+    Pages are converted in order as they arrive, and at most `max_workers` fetched pages
+    wait to be converted at any time.
+    """
+    url = f"{base_url}/resource/{dataset_id}.json"
+
+    def get_page(offset: int) -> List[Dict]:
+        params = {"$limit": str(page_size), "$offset": str(offset), "$order": ":id"}
+        if select:
+            params["$select"] = select
+        if where:
+            params["$where"] = where
+        return _get_json(url, params, app_token, timeout, max_retries, backoff, logger)
+
+    pages = _ColumnarPages(types, parquet_file)
+    try:
+        n_rows = count_rows(dataset_id, app_token, where, base_url, timeout, max_retries,
+                            backoff, logger)
+        page = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque()
+            for offset in range(0, n_rows, page_size):
+                pending.append(pool.submit(get_page, offset))
+                if len(pending) > max_workers:
+                    page = pending.popleft().result()
+                    pages.add(page)
+            while pending:
+                page = pending.popleft().result()
+                pages.add(page)
+        # Rows added since counting
+        while len(page) == page_size:
+            page = get_page(pages.num_pages * page_size)
+            pages.add(page)
+        table = pages.table()
+        pages.close(table)
+    except BaseException:
+        pages.abort()
+        raise
+
+    if logger:
+        logger.info("Fetched Socrata rows", dataset_id=dataset_id, where=where,
+                    num_records=table.num_rows, num_pages=pages.num_pages)
+    return table
+
+
+def _update_snapshot(dataset_id: str, snapshot_dir: str, types: Dict[str, pa.DataType],
+                     parquet_file: Optional[str] = None, logger=None, **fetch_args) -> pa.Table:
+    """Bring the local snapshot of a dataset up to date and return it.
+
+    The snapshot holds the dataset's rows with their `:id` and `:updated_at` system fields.
+    Only rows updated since the latest `:updated_at` in the snapshot are fetched, and they
+    replace the snapshot rows with the same `:id`. Since deleted rows can't be detected this
+    way, the whole dataset is fetched again if the row count of the merged snapshot doesn't
+    match the dataset's.
+    """
+    snapshot_file = join(snapshot_dir, SNAPSHOT_FILE.format(dataset_id=dataset_id))
+    snapshot = pq.read_table(snapshot_file) if exists(snapshot_file) else pa.table({})
+    table = None
+    if snapshot.num_rows > 0:
+        # Snapshots written before a column was typed are converted here
+        snapshot = _cast_columns(snapshot, types)
+        high_water_mark = pc.max(snapshot[":updated_at"]).as_py().rstrip("Z")
+        changed = _fetch_rows(dataset_id, where=f":updated_at >= '{high_water_mark}'",
+                              select=SNAPSHOT_SELECT, types=types, logger=logger, **fetch_args)
+        if changed.num_rows == 0:
+            table = snapshot
+        else:
+            kept = snapshot.filter(pc.invert(pc.is_in(snapshot[":id"], value_set=changed[":id"])))
+            table = _concat_tables([kept, changed])
+        n_rows = count_rows(dataset_id, logger=logger, **{
+            key: value for key, value in fetch_args.items() if key not in ("page_size", "max_workers")})
+        if logger:
+            logger.info("Updated Socrata snapshot", dataset_id=dataset_id,
+                        high_water_mark=high_water_mark, num_changed=changed.num_rows)
+        if n_rows != table.num_rows:
+            if logger:
+                logger.warning("Socrata snapshot out of sync, fetching full dataset",
+                               dataset_id=dataset_id, num_rows=n_rows,
+                               num_snapshot_rows=table.num_rows)
+            table = None
+    if table is None:
+        table = _fetch_rows(dataset_id, where=None, select=SNAPSHOT_SELECT, types=types,
+                            logger=logger, **fetch_args)
+
+    makedirs(snapshot_dir, exist_ok=True)
+    # Write to a temporary file first, so a failed write leaves the previous snapshot intact
+    pq.write_table(table, f"{snapshot_file}.tmp")
+    replace(f"{snapshot_file}.tmp", snapshot_file)
+    if parquet_file:
+        pq.write_table(table.drop([col for col in table.column_names if col.startswith(":")]),
+                       parquet_file)
+    return table
+
+
+def fetch_socrata(dataset_id: str,
+                  app_token: Optional[str] = None,
+                  type_dict: Optional[Dict] = None,
+                  strict_types: bool = True,
+                  where: Optional[str] = None,
+                  snapshot_dir: Optional[str] = None,
+                  parquet_file: Optional[str] = None,
+                  base_url: str = SOCRATA_BASE_URL,
+                  page_size: int = PAGE_SIZE,
+                  max_workers: int = 4,
+                  timeout: float = 60,
+                  max_retries: int = 3,
+                  backoff: float = 1.0,
+                  logger=None) -> pd.DataFrame:
+    """Fetch all rows of a Socrata dataset as a DataFrame.
+
+    The rows are counted first, and the pages covering them are then requested
+    concurrently, ordered by Socrata's row id so that pages don't overlap. If the dataset
+    grew since it was counted, the remaining pages are requested one after the other.
+
+    Each page is converted to an Arrow record batch as soon as it arrives, casting the
+    numeric and datetime columns of `type_dict`, and is written to `parquet_file` if given.
+    The remaining types of `type_dict` are applied once all pages are fetched.
+
+    With a `snapshot_dir`, the dataset is kept there as parquet, and only the rows updated
+    since the previous pull are requested and merged into it.
+
+    Parameters
+    ----------
+    dataset_id: str
+        Socrata dataset identifier, e.g. "rdmq-nq56"
+    app_token: Optional[str]
+        Socrata app token
+    type_dict: Optional[Dict]
+        Types to convert columns to, as passed to `pd.DataFrame.astype`. A KeyError is
+        raised if any of these columns is missing, unless `strict_types` is False.
+    strict_types: bool
+        Whether columns of `type_dict` must be in the dataset. If False, only the columns
+        present are typed, since Socrata omits columns that are null in every row.
+    where: Optional[str]
+        SoQL filter on the rows to fetch; can't be combined with `snapshot_dir`
+    snapshot_dir: Optional[str]
+        Directory to keep a snapshot of the dataset in, to only fetch rows that changed
+    parquet_file: Optional[str]
+        File to write the fetched rows to as parquet, e.g. a data backup. The numeric and
+        datetime columns of `type_dict` are written typed. Without a snapshot, rows are
+        streamed to it page by page.
+    base_url: str
+        Root of the Socrata API
+    page_size: int
+        Number of rows per request
+    max_workers: int
+        Maximum number of concurrent requests
+    timeout: float
+        Seconds to wait for each response
+    max_retries: int
+        Number of times to retry a failed request
+    backoff: float
+        Base number of seconds to wait before retrying
+    logger: Optional[logging.Logger]
+        Logger to report retries and row counts to
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per dataset row. Columns are strings unless typed by `type_dict`.
+    """
+    fetch_args = {"app_token": app_token, "base_url": base_url, "page_size": page_size,
+                  "max_workers": max_workers, "timeout": timeout, "max_retries": max_retries,
+                  "backoff": backoff}
+    types = _arrow_types(type_dict)
+    if snapshot_dir is None:
+        table = _fetch_rows(dataset_id, where=where, select=None, types=types,
+                            parquet_file=parquet_file, logger=logger, **fetch_args)
+    elif where is not None:
+        raise ValueError("Socrata snapshots can't be filtered with a where clause")
+    else:
+        table = _update_snapshot(dataset_id, snapshot_dir, types, parquet_file, logger=logger,
+                                 **fetch_args)
+        table = table.drop([col for col in table.column_names if col.startswith(":")])
+
+    # Free the Arrow buffers as the columns are converted
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    # Missing strings are NaN, as in `pd.DataFrame.from_records`
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].fillna(np.nan)
+
+    if df.empty and type_dict is not None:
+        df = pd.DataFrame(columns=list(type_dict))
+    if type_dict is not None:
+        missing = [col for col in type_dict if col not in df.columns]
+        if missing and strict_types:
+            raise KeyError(f"Columns missing from Socrata dataset {dataset_id}: {missing}")
+        df = df.astype({col: dtype for col, dtype in type_dict.items() if col not in missing})
+    return df
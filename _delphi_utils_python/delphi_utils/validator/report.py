@@ -67,6 +67,23 @@ class ValidationReport:
         else:
             self.unsuppressed_errors.append(error)
 
+    def merge(self, other):
+        """Add the checks, errors, and warnings recorded in another report to this one.
+
+        Parameters
+        ----------
+        other: ValidationReport
+            Report of checks run separately, e.g. on a single file
+
+        Returns
+        -------
+        None
+        """
+        for error in other.raised_errors:
+            self.add_raised_error(error)
+        self.raised_warnings.extend(other.raised_warnings)
+        self.total_checks += other.total_checks
+
     def increment_total_checks(self):
         """Record a check."""
         self.total_checks += 1
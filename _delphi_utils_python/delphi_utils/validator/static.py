@@ -66,15 +66,32 @@ class StaticValidator:
         # Individual file checks
         # For every daily file, read in and do some basic format and value checks.
         for filename, match, data_df in file_list:
-            self.check_df_format(data_df, filename, report)
-            self.check_duplicate_rows(data_df, filename, report)
-            self.check_bad_geo_id_format(
-                data_df, filename, match.groupdict()['geo_type'], report)
-            self.check_bad_geo_id_value(
-                data_df, filename, match.groupdict()['geo_type'], report)
-            self.check_bad_val(data_df, filename, match.groupdict()['signal'], report)
-            self.check_bad_se(data_df, filename, report)
-            self.check_bad_sample_size(data_df, filename, report)
+            self.validate_file(filename, match, data_df, report)
+
+    def validate_file(self, filename, match, data_df, report):
+        """
+        Perform basic format and value checks on a single daily file.
+
+        Parameters
+        ----------
+        filename: str
+            name of the file
+        match: re.match
+            match of the filename with the geo regex
+        data_df: pd.DataFrame
+            data from the file
+        report: ValidationReport
+            report to which the results of these checks will be added
+        """
+        self.check_df_format(data_df, filename, report)
+        self.check_duplicate_rows(data_df, filename, report)
+        self.check_bad_geo_id_format(
+            data_df, filename, match.groupdict()['geo_type'], report)
+        self.check_bad_geo_id_value(
+            data_df, filename, match.groupdict()['geo_type'], report)
+        self.check_bad_val(data_df, filename, match.groupdict()['signal'], report)
+        self.check_bad_se(data_df, filename, report)
+        self.check_bad_sample_size(data_df, filename, report)
 
 
     def check_missing_date_files(self, daily_filenames, report):
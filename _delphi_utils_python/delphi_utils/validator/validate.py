@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 """Tools to validate CSV source data, including various check methods."""
 import time
-from .datafetcher import load_all_files
+from os.path import join
+from .datafetcher import FILENAME_REGEX, load_all_files, load_csv, make_date_filter
 from .dynamic import DynamicValidator
 from .errors import ValidationFailure
 from .report import ValidationReport
@@ -45,21 +46,49 @@ class Validator:
         self.static_validation = StaticValidator(validation_params)
         self.dynamic_validation = DynamicValidator(validation_params)
 
-    def validate(self):
+    def validate_file(self, filename):
+        """
+        Load one file from the export directory and run the single-file static checks on it.
+
+        Arguments:
+            - filename: name of a file in the export directory
+
+        Returns:
+            - None if the file is not a data CSV within the validation time window, otherwise a
+              tuple of the (filename, filename match, data) triple and a ValidationReport
+              holding the results of the checks
+        """
+        match = FILENAME_REGEX.match(filename)
+        if not make_date_filter(self.time_window.start_date, self.time_window.end_date)(match):
+            return None
+        loaded = (filename, match, load_csv(join(self.export_dir, filename)))
+        report = ValidationReport(self.suppressed_errors, self.data_source, self.dry_run)
+        self.static_validation.validate_file(*loaded, report)
+        return loaded, report
+
+    def validate(self, validated_files=None):
         """
         Run all data checks.
 
         Arguments:
-            - export_dir: path to data CSVs
+            - validated_files: optional list of results of `validate_file` for every file in
+              the export directory; if provided, files are not reloaded and only the checks
+              across files are run on them
 
         Returns:
             - ValidationReport collating the validation outcomes
         """
         start_time = time.time()
         report = ValidationReport(self.suppressed_errors, self.data_source, self.dry_run)
-        frames_list = load_all_files(self.export_dir, self.time_window.start_date,
-                                     self.time_window.end_date)
-        self.static_validation.validate(frames_list, report)
+        if validated_files is None:
+            frames_list = load_all_files(self.export_dir, self.time_window.start_date,
+                                         self.time_window.end_date)
+            self.static_validation.validate(frames_list, report)
+        else:
+            frames_list = [loaded for loaded, _ in validated_files]
+            self.static_validation.check_missing_date_files(frames_list, report)
+            for _, file_report in validated_files:
+                report.merge(file_report)
         # Dynamic Validation only performed when frames_list is populated
         if len(frames_list) > 0:
             self.dynamic_validation.validate(aggregate_frames(frames_list), report)
@@ -1,7 +1,12 @@
 """Tests for eval_day.py"""
 import mock
+import numpy as np
 import pandas as pd
-from delphi_utils.flash_eval.eval_day import (flash_eval)
+from scipy.stats import binom
+from delphi_utils.flash_eval.eval_day import (apply_ar, evd_ranking_fn, flash_eval,
+                                              sorted_distribution,
+                                              stream_individual_fn, streams_groups_fn,
+                                              ts_val, ts_vals)
 
 
 def test_flash_input():
@@ -18,3 +23,62 @@ def test_flash_input():
                                                   index_col=0, parse_dates=[0], header=0)
     last_7, type_of_outlier = flash_eval(lag, day, input_df, signal, params, logger=mock_logger, local=True)
     initial_7_day_file.to_csv(f'flash_ref/{signal}/last_7_1.csv')
+
+
+def test_ts_vals_matches_ts_val():
+    "Sorted-distribution lookups agree with the linear scan."
+    rng = np.random.default_rng(0)
+    dist = pd.Series(rng.normal(size=200))
+    vals = np.concatenate([rng.normal(size=50), dist.values[:5], [np.nan]])
+    expected = [ts_val(v, dist) for v in vals]
+    np.testing.assert_allclose(ts_vals(vals, sorted_distribution(dist)), expected)
+
+
+def test_stream_rankings():
+    "Individual and grouped rankings agree with the per-stream linear scan."
+    rng = np.random.default_rng(1)
+    stream = pd.DataFrame(rng.normal(size=(30, 5)),
+                          columns=['01', '01001', '01003', '02', '02013'])
+    stream.iloc[:4, 2] = np.nan
+    ts_streams = pd.DataFrame({'test-statistic': rng.normal(size=4)},
+                              index=['01', '01003', '02', '02013'])
+
+    individual = stream_individual_fn(stream, ts_streams)
+    for col, val in ts_streams['test-statistic'].items():
+        assert individual[col] == ts_val(val, stream[col].dropna())
+
+    group = streams_groups_fn(stream, ts_streams)
+    states = pd.concat([stream['01'], stream['02']])
+    for col, val in ts_streams['test-statistic'].items():
+        members = stream.loc[:, stream.columns.str[:2] == col[:2]].unstack().dropna()
+        total_dist = pd.concat([members, states]).reset_index(drop=True)
+        assert np.isclose(group[col], ts_val(val, total_dist))
+
+
+def test_apply_ar_and_evd_ranking():
+    "Vectorized AR prediction and EVD ranking agree with the per-stream versions."
+    rng = np.random.default_rng(2)
+    streams = ['01', '01001', '02']
+    last_7 = pd.DataFrame(rng.uniform(0, 50, size=(7, 3)), columns=streams)
+    lin_coeff = pd.DataFrame(rng.uniform(0, 0.3, size=(7, 3)), columns=streams[::-1])
+    weekday_correction = pd.DataFrame([[20.0, 3.0]], columns=['01', '01001'])
+    non_daily_df = pd.DataFrame([[7.0]], columns=['02'])
+    fips_pop_table = pd.DataFrame({'pop': [5000, 100, 700]}, index=streams)
+
+    ts_streams, df_for_ts = apply_ar(last_7, lin_coeff, weekday_correction,
+                                     non_daily_df, fips_pop_table)
+    for col in streams:
+        y_hat = np.dot(lin_coeff[col], last_7[col])
+        assert np.isclose(df_for_ts.loc[col, 'yhat'], y_hat)
+        n = np.log(fips_pop_table.loc[col, 'pop'] + 2)
+        expected = binom.cdf(np.log(df_for_ts.loc[col, 'y'] + 2), int(n),
+                             np.log(y_hat + 2) / n)
+        assert np.isclose(ts_streams.loc[col, 'test-statistic'], expected)
+
+    EVD_max = pd.DataFrame({'0': rng.uniform(size=100)})
+    EVD_min = pd.DataFrame({'0': rng.uniform(size=100)})
+    evd_ranking = evd_ranking_fn(ts_streams, EVD_max, EVD_min)
+    assert evd_ranking.name == 'evd_ranking'
+    for col, val in ts_streams['test-statistic'].items():
+        expected = max(ts_val(val, EVD_min['0']), 1 - ts_val(val, EVD_max['0']))
+        assert np.isclose(evd_ranking[col], expected)
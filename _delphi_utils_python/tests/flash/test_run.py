@@ -0,0 +1,52 @@
+"""Tests for flash_eval/run.py"""
+import time
+
+import mock
+import pandas as pd
+from delphi_utils import get_structured_logger
+from delphi_utils.flash_eval import run
+
+
+def fake_flash_eval(lag, day, input_df, signal, params, logger=None, local=False):
+    "Stand-in for flash_eval with per-signal behavior."
+    if signal == "slow":
+        time.sleep(30)
+    if signal == "broken":
+        raise ValueError("bad params")
+
+
+def write_exports(export_dir, signals):
+    "Write one day of state and county files for every signal."
+    for signal in signals:
+        for geo in ["state", "county"]:
+            pd.DataFrame({"geo_id": ["01", "02"], "val": [1.0, 2.0]}).to_csv(
+                export_dir / f"20230101_{geo}_{signal}.csv", index=False)
+
+
+class TestRunModule:
+    """Tests for sequential and pooled FlaSH runs."""
+
+    @mock.patch("delphi_utils.flash_eval.run.flash_eval")
+    def test_sequential(self, mock_flash_eval, tmp_path):
+        """Each signal's days are evaluated in order without a pool."""
+        write_exports(tmp_path, ["sig_one", "sig_two"])
+        params = {"common": {"export_dir": str(tmp_path)}, "flash": {"signals": ["sig_one", "sig_two"]}}
+        run.run_module(params)
+        assert [c.args[3] for c in mock_flash_eval.call_args_list] == ["sig_one", "sig_two"]
+        input_df = mock_flash_eval.call_args_list[0].args[2]
+        assert input_df.shape == (1, 4)
+
+    @mock.patch("delphi_utils.flash_eval.run.POLL_INTERVAL", 0.1)
+    @mock.patch("delphi_utils.flash_eval.run.flash_eval", fake_flash_eval)
+    def test_pooled_partial_results(self, tmp_path):
+        """A slow or failing signal does not prevent the others from completing."""
+        write_exports(tmp_path, ["fast", "slow", "broken"])
+        params = {"common": {"export_dir": str(tmp_path)},
+                  "flash": {"signals": ["fast", "slow", "broken"],
+                            "n_cores": 3, "task_timeout": 2}}
+        logger = get_structured_logger("test_flash_run")
+        start = time.time()
+        outcomes = run.run_pooled(params["flash"]["signals"], params,
+                                  [x.name for x in tmp_path.iterdir()], logger)
+        assert time.time() - start < 20
+        assert outcomes == {"completed": ["fast"], "failed": ["broken"], "timed_out": ["slow"]}
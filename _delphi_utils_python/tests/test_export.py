@@ -10,7 +10,7 @@ import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
 
-from delphi_utils import create_export_csv, Nans, create_backup_csv, get_structured_logger
+from delphi_utils import create_export_csv, Nans, create_backup_csv, get_backup_file, get_structured_logger
 
 
 def _set_df_dtypes(df: pd.DataFrame, dtypes: Dict[str, Any]) -> pd.DataFrame:
@@ -406,3 +406,10 @@ class TestExport:
         actual_parquet = pd.read_parquet(join(tmp_path, f"{today}_{geo_res}_{metric}_{sensor}.parquet"))
         assert actual_parquet.equals(actual)
 
+
+    def test_create_backup_without_parquet(self, tmp_path):
+        create_backup_csv(df=self.DF, backup_dir=tmp_path, custom_run=False, issue="20200215",
+                          sensor="prelim", parquet=False)
+        backup_file = get_backup_file(tmp_path, issue="20200215", sensor="prelim")
+        assert backup_file == join(tmp_path, "20200215_prelim")
+        assert listdir(tmp_path) == ["20200215_prelim.csv.gz"]
@@ -0,0 +1,103 @@
+"""Tests for planning exports from changed rows."""
+from os import listdir
+
+import numpy as np
+import pandas as pd
+
+from delphi_utils import (ExportPlan, commit_export_plans, create_export_csv, discard_export_plans,
+                          get_export_plan_dir)
+
+
+def save_and_commit(plan, plan_dir):
+    """Save the hashes of a plan, and commit them as the runner does once exports are archived."""
+    plan.save()
+    commit_export_plans(str(plan_dir))
+
+DF = pd.DataFrame({
+    "geo_id": ["ak", "al", "ak", "al", "ak", "al"],
+    "timestamp": pd.to_datetime(["2024-01-06"] * 2 + ["2024-01-13"] * 2 + ["2024-01-20"] * 2),
+    "val": [1.0, 2.0, 3.0, 4.0, 5.0, np.nan],
+})
+
+
+class TestExportPlan:
+    """Tests for ExportPlan."""
+
+    def test_first_run(self, tmp_path):
+        plan = ExportPlan(DF, str(tmp_path), "test", ["geo_id"])
+        assert plan.dates is None
+        plan.save()
+        assert listdir(tmp_path) == ["test.parquet.pending"]
+        commit_export_plans(str(tmp_path))
+        assert listdir(tmp_path) == ["test.parquet"]
+
+    def test_no_plan_dir(self, tmp_path):
+        plan = ExportPlan(DF, None, "test", ["geo_id"])
+        assert plan.dates is None
+        plan.save()
+
+    def test_changed_dates(self, tmp_path):
+        save_and_commit(ExportPlan(DF, str(tmp_path), "test", ["geo_id"]), tmp_path)
+
+        # Unchanged, in a different order
+        plan = ExportPlan(DF.iloc[::-1], str(tmp_path), "test", ["geo_id"])
+        assert plan.dates.empty
+
+        # One value revised, one filled in, one row removed and one date added
+        df = DF.copy()
+        df.loc[1, "val"] = 2.5
+        df.loc[5, "val"] = 6.0
+        df = pd.concat([df.drop(index=2), pd.DataFrame({
+            "geo_id": ["ak"], "timestamp": pd.to_datetime(["2024-01-27"]), "val": [7.0]})])
+        plan = ExportPlan(df, str(tmp_path), "test", ["geo_id"])
+        assert plan.dates.equals(pd.DatetimeIndex(["2024-01-06", "2024-01-13", "2024-01-20", "2024-01-27"]))
+
+        # Hashes are kept per dataset
+        assert ExportPlan(df, str(tmp_path), "other", ["geo_id"]).dates is None
+
+    def test_output_config(self, tmp_path):
+        config = {"signals": ["a", "b"], "geos": ["state"], "export_start_date": "2024-01-01"}
+        save_and_commit(ExportPlan(DF, str(tmp_path), "test", ["geo_id"], output_config=config), tmp_path)
+        reordered = dict(reversed(list(config.items())))
+        assert ExportPlan(DF, str(tmp_path), "test", ["geo_id"], output_config=reordered).dates.empty
+
+        # Changing the output configuration exports every date, even without changed rows
+        for changed in [{**config, "signals": ["a", "b", "c"]}, {**config, "geos": ["state", "nation"]},
+                        {**config, "export_start_date": "2023-01-01"}, None]:
+            assert ExportPlan(DF, str(tmp_path), "test", ["geo_id"], output_config=changed).dates is None
+
+    def test_discarded_hashes(self, tmp_path):
+        """Pending hashes are only compared with once committed."""
+        save_and_commit(ExportPlan(DF, str(tmp_path), "test", ["geo_id"]), tmp_path)
+        df = DF.assign(val=DF["val"] + 1)
+        ExportPlan(df, str(tmp_path), "test", ["geo_id"]).save()
+        plan = ExportPlan(df, str(tmp_path), "test", ["geo_id"])
+        assert plan.dates.equals(pd.DatetimeIndex(DF["timestamp"].unique()))
+        discard_export_plans(str(tmp_path))
+        assert listdir(tmp_path) == ["test.parquet"]
+
+    def test_get_export_plan_dir(self):
+        params = {"common": {}, "indicator": {"export_plan_dir": "plans"}}
+        assert get_export_plan_dir(params) == "plans"
+        assert get_export_plan_dir({"common": {}, "indicator": {}}) is None
+        assert get_export_plan_dir({**params, "common": {"custom_run": True}}) is None
+        assert get_export_plan_dir({**params, "validation": {"common": {"dry_run": True}}}) == "plans"
+        assert get_export_plan_dir({**params, "validation": {"common": {}}}) is None
+
+    def test_duplicate_keys(self, tmp_path):
+        df = pd.concat([DF, DF.iloc[:2]], ignore_index=True)
+        save_and_commit(ExportPlan(df, str(tmp_path), "test", ["geo_id"]), tmp_path)
+        assert ExportPlan(df, str(tmp_path), "test", ["geo_id"]).dates.empty
+        # Dropping one of the duplicates changes its date
+        plan = ExportPlan(DF, str(tmp_path), "test", ["geo_id"])
+        assert plan.dates.equals(pd.DatetimeIndex(["2024-01-06"]))
+
+    def test_export_only_dates(self, tmp_path):
+        df = DF.assign(se=np.nan, sample_size=np.nan)
+        dates = create_export_csv(df, str(tmp_path), "state", "test",
+                                  only_dates=pd.DatetimeIndex(["2024-01-13"]))
+        assert list(dates) == [pd.Timestamp("2024-01-13")]
+        assert listdir(tmp_path) == ["20240113_state_test.csv"]
+        dates = create_export_csv(df, str(tmp_path), "state", "test",
+                                  only_dates=pd.DatetimeIndex([]))
+        assert len(dates) == 0
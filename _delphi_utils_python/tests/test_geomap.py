@@ -553,3 +553,27 @@ class TestGeoMapper:
             }
         )
         pd.testing.assert_frame_equal(agg_df, agg_df_by_hand)
+
+    def test_aggregate_by_weighted_sum_multiple_sensors(self, geomapper: GeoMapper):
+        df = pd.DataFrame(
+            {
+                "timestamp": [0] * 7,
+                "state": ["al", "al", "ca", "ca", "nd", "me", "me"],
+                "a": [1, 2, 3, 4, 12, -2, 2],
+                "b": [5, 6, 7, np.nan, np.nan, -1, -2],
+                "population_served": [10, 5, 8, 1, 3, 1, 2],
+            }
+        )
+        agg_df = geomapper.aggregate_by_weighted_sum(
+            df,
+            to_geo="state",
+            sensor_col=["a", "b"],
+            time_col="timestamp",
+            population_col="population_served",
+        )
+        # Each sensor is weighted as if aggregated on its own
+        agg_a, agg_b = (
+            geomapper.aggregate_by_weighted_sum(df, "state", col, "timestamp", "population_served")
+            for col in ["a", "b"]
+        )
+        pd.testing.assert_frame_equal(agg_df, agg_a.merge(agg_b))
@@ -0,0 +1,71 @@
+"""Tests for running an indicator for many issue dates."""
+from datetime import date
+from functools import partial
+from multiprocessing import Pool
+from os import listdir
+from os.path import join
+
+import mock
+import pytest
+
+from delphi_utils import get_structured_logger, run_patch
+
+ISSUE_DATES = [date(2024, 4, 20), date(2024, 4, 21), date(2024, 4, 22)]
+
+
+def write_issue(failing_issue, issue_date, export_dir, logger):
+    """Export one file for the issue, failing for `failing_issue`."""
+    logger.info("Exporting", issue_date=str(issue_date))
+    if issue_date == failing_issue:
+        raise ValueError("bad issue")
+    with open(join(export_dir, f"{issue_date.strftime('%Y%m%d')}_state_sig.csv"), "w") as f:
+        f.write("geo_id,val\n")
+
+
+def write_issue_with_pool(issue_date, export_dir, logger):
+    """Export one file for the issue from a pool of processes."""
+    with Pool(1) as pool:
+        pool.apply(write_issue, (None, issue_date, export_dir, logger))
+
+
+class TestRunPatch:
+    """Tests for run_patch."""
+
+    def test_run_patch(self, tmp_path):
+        run_issue = mock.Mock(side_effect=partial(write_issue, None))
+        logger = mock.Mock()
+        run_patch(ISSUE_DATES, run_issue, str(tmp_path), "src", logger)
+
+        assert sorted(listdir(tmp_path)) == ["issue_20240420", "issue_20240421", "issue_20240422"]
+        assert listdir(tmp_path / "issue_20240421" / "src") == ["20240421_state_sig.csv"]
+        assert [call.args[0] for call in run_issue.call_args_list] == ISSUE_DATES
+        assert run_issue.call_args.args[2] is logger
+
+    def test_failure_and_resume(self, tmp_path):
+        """A failing issue doesn't stop the others, and is the only one run again."""
+        logger = mock.Mock()
+        with pytest.raises(RuntimeError, match="2024-04-21"):
+            run_patch(ISSUE_DATES, partial(write_issue, ISSUE_DATES[1]), str(tmp_path), "src", logger)
+        assert sorted(listdir(tmp_path)) == [".tmp", "issue_20240420", "issue_20240422"]
+        logger.error.assert_called_once()
+
+        run_issue = mock.Mock(side_effect=partial(write_issue, None))
+        run_patch(ISSUE_DATES, run_issue, str(tmp_path), "src", logger)
+        assert [call.args[0] for call in run_issue.call_args_list] == [ISSUE_DATES[1]]
+        assert sorted(listdir(tmp_path)) == ["issue_20240420", "issue_20240421", "issue_20240422"]
+        assert listdir(tmp_path / "issue_20240421" / "src") == ["20240421_state_sig.csv"]
+
+    def test_parallel(self, tmp_path):
+        logger = get_structured_logger("delphi_utils.test_patch")
+        with pytest.raises(RuntimeError, match="2024-04-22"):
+            run_patch(ISSUE_DATES, partial(write_issue, ISSUE_DATES[2]), str(tmp_path), "src", logger,
+                      max_workers=2)
+        assert sorted(listdir(tmp_path)) == [".tmp", "issue_20240420", "issue_20240421"]
+        assert listdir(tmp_path / "issue_20240420" / "src") == ["20240420_state_sig.csv"]
+
+    def test_parallel_nested_pool(self, tmp_path):
+        """Issues run in parallel may start their own pool of processes."""
+        logger = get_structured_logger("delphi_utils.test_patch")
+        run_patch(ISSUE_DATES[:2], write_issue_with_pool, str(tmp_path), "src", logger, max_workers=2)
+        assert sorted(listdir(tmp_path)) == ["issue_20240420", "issue_20240421"]
+        assert listdir(tmp_path / "issue_20240421" / "src") == ["20240421_state_sig.csv"]
@@ -0,0 +1,116 @@
+"""Tests for profiling.py."""
+import json
+import pstats
+
+import mock
+import pandas as pd
+import pytest
+
+from delphi_utils.export import create_export_csv
+from delphi_utils.profiling import RunProfile, add_stage, code_profiler, profile_stage
+
+
+class TestRunProfile:
+    """Tests for recording stages in a RunProfile."""
+
+    def test_stage(self):
+        """Test that a stage is measured and logged."""
+        logger = mock.Mock()
+        profile = RunProfile(logger)
+        with profile.stage("aggregate", geo="state") as stage:
+            stage.add_rows(3)
+            stage.add_rows(4)
+
+        assert len(profile.stages) == 1
+        recorded = profile.stages[0]
+        assert recorded.stage == "aggregate"
+        assert recorded.labels == {"geo": "state"}
+        assert recorded.rows == 7
+        assert recorded.wall_time_in_seconds >= 0
+        assert recorded.cpu_time_in_seconds >= 0
+        assert recorded.process_peak_rss_in_mb > 0
+        assert recorded.peak_rss_growth_in_mb >= 0
+        logger.info.assert_called_once()
+        assert logger.info.call_args.kwargs["geo"] == "state"
+
+    def test_peak_rss_growth(self):
+        """Test that only the stage raising the process peak shows memory growth."""
+        profile = RunProfile()
+        # Process peak before and after each stage, then the children's peak
+        peaks = [100.0, 300.0, 0.0, 300.0, 300.0, 0.0]
+        with mock.patch("delphi_utils.profiling._peak_rss_in_mb", side_effect=peaks):
+            with profile.stage("allocate"):
+                pass
+            with profile.stage("reuse"):
+                pass
+        allocate, reuse = profile.stages
+        assert allocate.peak_rss_growth_in_mb == 200.0
+        assert reuse.peak_rss_growth_in_mb == 0.0
+        assert reuse.process_peak_rss_in_mb == 300.0
+
+    def test_profile_stage_inactive(self):
+        """Test that profile_stage only records in an active profile."""
+        profile = RunProfile()
+        with profile_stage("outside") as stage:
+            stage.add_rows(1)
+        with profile.activate():
+            with profile_stage("inside"):
+                pass
+        with profile_stage("after"):
+            pass
+        assert [stage.stage for stage in profile.stages] == ["inside"]
+
+    def test_add_stage(self):
+        """Test that stages measured elsewhere are only recorded in an active profile."""
+        with RunProfile().stage("compute", geo="state") as measured:
+            measured.add_rows(2)
+        profile = RunProfile()
+        add_stage(measured)
+        with profile.activate():
+            add_stage(measured)
+        assert profile.stages == [measured]
+        assert profile.stages[0].rows == 2
+
+    def test_export_stages(self, tmp_path):
+        """Test that create_export_csv records rows per geo and signal."""
+        df = pd.DataFrame({"geo_id": ["ak", "al", "ak"],
+                           "timestamp": ["2020-02-15", "2020-02-15", "2020-02-16"],
+                           "val": [1.0, 2.0, 3.0], "se": [0.1] * 3, "sample_size": [10] * 3})
+        profile = RunProfile()
+        with profile.activate():
+            create_export_csv(df, str(tmp_path), "state", "sig")
+
+        assert len(profile.stages) == 1
+        assert profile.stages[0].stage == "write_csv"
+        assert profile.stages[0].labels == {"geo": "state", "signal": "sig", "metric": None}
+        assert profile.stages[0].rows == 3
+
+    def test_write(self, tmp_path):
+        """Test that the profile is written as JSON."""
+        profile = RunProfile()
+        with profile.stage("indicator"):
+            pass
+        profile.write(tmp_path / "profile.json")
+
+        with open(tmp_path / "profile.json") as f:
+            written = json.load(f)
+        assert [stage["stage"] for stage in written["stages"]] == ["indicator"]
+        assert set(written["stages"][0]) >= {"wall_time_in_seconds", "cpu_time_in_seconds",
+                                            "peak_rss_growth_in_mb", "process_peak_rss_in_mb",
+                                            "rows"}
+
+
+class TestCodeProfiler:
+    """Tests for optional code profiling."""
+
+    def test_cprofile(self, tmp_path):
+        """Test that cProfile stats are dumped."""
+        with code_profiler("cprofile", str(tmp_path / "run.prof")):
+            sum(range(1000))
+        assert pstats.Stats(str(tmp_path / "run.prof")).total_calls > 0
+
+    def test_unknown_profiler(self):
+        """Test that an unknown profiler name is rejected."""
+        with pytest.raises(ValueError, match="Unknown code profiler"):
+            with code_profiler("nonexistent", None):
+                pass
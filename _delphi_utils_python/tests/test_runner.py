@@ -1,8 +1,15 @@
 """Tests for runner.py."""
+import json
+import os
+from os.path import join
 
 import mock
+import pandas as pd
 import pytest
 
+from delphi_utils.archive import FilesystemArchiveDiffer
+from delphi_utils.export import create_export_csv
+from delphi_utils.export_plan import ExportPlan
 from delphi_utils.validator.report import ValidationReport
 from delphi_utils.validator.errors import ValidationFailure
 from delphi_utils.runner import run_indicator_pipeline
@@ -117,3 +124,103 @@ class TestRunIndicator:
         mock_indicator_fn.assert_called_once_with(self.PARAMS)
         mock_validator_fn.assert_called_once_with(self.PARAMS)
         mock_validator_fn.return_value.validate.assert_called_once()
+
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_stream_exports(self, mock_read_params, tmp_path):
+        """Test that exported files are validated and diffed while the indicator runs."""
+        export_dir = tmp_path / "receiving"
+        cache_dir = tmp_path / "cache"
+        export_dir.mkdir()
+        cache_dir.mkdir()
+        params = {"common": {"export_dir": str(export_dir), "stream_exports": True}}
+        mock_read_params.return_value = params
+        df = pd.DataFrame({"geo_id": ["ak", "al"], "timestamp": ["2020-01-01"] * 2,
+                           "val": [1.0, 2.0], "se": [0.1, 0.2], "sample_size": [10.0, 20.0]})
+        unchanged = "20200101_state_unchanged.csv"
+        changed = "20200101_state_changed.csv"
+        df[["geo_id", "val", "se", "sample_size"]].to_csv(cache_dir / unchanged, index=False)
+        df[["geo_id", "val", "se", "sample_size"]].assign(val=[1.0, 5.0]).to_csv(
+            cache_dir / changed, index=False)
+
+        def indicator_fn(params):
+            export_dir = params["common"]["export_dir"]
+            for sensor in ["unchanged", "changed", "new"]:
+                create_export_csv(df, export_dir, "state", sensor)
+            # Written without create_export_csv, so only picked up by the final rescan
+            df[["geo_id", "val"]].to_csv(join(export_dir, "20200101_state_other.csv"),
+                                         index=False)
+
+        validator = mock.Mock()
+        validator.validate_file.side_effect = lambda f: ((f, None, None), ValidationReport([]))
+        validator.validate.return_value = ValidationReport([])
+        archiver = FilesystemArchiveDiffer(str(cache_dir), str(export_dir))
+
+        run_indicator_pipeline(indicator_fn, validator_fn=lambda p: validator,
+                               archiver_fn=lambda p: archiver)
+
+        validated = validator.validate.call_args.args[0]
+        assert sorted(loaded[0] for loaded, _ in validated) == [
+            changed, "20200101_state_new.csv", "20200101_state_other.csv", unchanged]
+        assert sorted(os.listdir(export_dir)) == [
+            changed, "20200101_state_new.csv", "20200101_state_other.csv"]
+        changed_df = pd.read_csv(export_dir / changed)
+        assert changed_df["geo_id"].tolist() == ["al"]
+        assert sorted(os.listdir(cache_dir)) == sorted(os.listdir(export_dir) + [unchanged])
+
+    @mock.patch("delphi_utils.runner.delete_move_files")
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_export_plan(self, mock_read_params, mock_delete_move_files, tmp_path):
+        """Test that the dates of a run whose exports are discarded are exported again."""
+        export_dir = tmp_path / "receiving"
+        export_dir.mkdir()
+        mock_read_params.return_value = {
+            "common": {"export_dir": str(export_dir)},
+            "indicator": {"export_plan_dir": str(tmp_path / "plans")},
+            "validation": {"common": {"dry_run": True}},
+        }
+        mock_delete_move_files.side_effect = lambda: [os.remove(export_dir / f) for f in os.listdir(export_dir)]
+        df = pd.DataFrame({"geo_id": ["ak", "al"] * 2, "timestamp": ["2020-01-01"] * 2 + ["2020-01-08"] * 2,
+                           "val": [1.0, 2.0, 3.0, 4.0], "se": None, "sample_size": None})
+
+        def indicator_fn(params):
+            plan = ExportPlan(df, params["indicator"]["export_plan_dir"], "test", ["geo_id"])
+            create_export_csv(df, params["common"]["export_dir"], "state", "sig", only_dates=plan.dates)
+            plan.save()
+
+        def run(success):
+            validator = mock.Mock()
+            validator.validate.return_value = ValidationReport([])
+            if not success:
+                validator.validate.return_value.add_raised_error(ValidationFailure("", "2020-01-08", ""))
+            run_indicator_pipeline(indicator_fn, validator_fn=lambda p: validator)
+            exported = sorted(os.listdir(export_dir))
+            for f in exported:
+                os.remove(export_dir / f)
+            return exported
+
+        all_files = ["20200101_state_sig.csv", "20200108_state_sig.csv"]
+        assert run(True) == all_files
+        assert run(True) == []
+        df.loc[3, "val"] = 5.0
+        # The revision fails validation, so its date is exported again by the next run
+        run(False)
+        assert run(True) == ["20200108_state_sig.csv"]
+        assert run(True) == []
+
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_run_profile(self, mock_read_params, mock_indicator_fn, mock_validator_fn,
+                         mock_archiver_fn, tmp_path):
+        """Test that a run profile with every stage is written when configured."""
+        profile_file = str(tmp_path / "profile.json")
+        mock_read_params.return_value = {
+            "common": {"profiling": {"profile_file": profile_file}},
+            "delivery": {}
+        }
+
+        with mock.patch("delphi_utils.runner.transfer_files"):
+            run_indicator_pipeline(mock_indicator_fn, validator_fn=mock_validator_fn,
+                                   archiver_fn=mock_archiver_fn)
+
+        with open(profile_file) as f:
+            stages = [stage["stage"] for stage in json.load(f)["stages"]]
+        assert stages == ["indicator", "flash", "validation", "archiving", "delivery"]
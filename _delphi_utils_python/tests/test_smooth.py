@@ -296,3 +296,34 @@ class TestSmoothers:
         ix1 = signal.index
         ix2 = smoothed_signal.index
         assert ix1.equals(ix2)
+
+    @pytest.mark.parametrize("smoother", [
+        Smoother(smoother_name="identity"),
+        Smoother(smoother_name="moving_average", window_length=3, impute_method="zeros"),
+        Smoother(smoother_name="moving_average", window_length=3, impute_method="identity"),
+        Smoother(smoother_name="moving_average", window_length=3),
+        Smoother(smoother_name="savgol", window_length=4),
+    ])
+    def test_smooth_columns(self, smoother):
+        """Smoothing the columns at once matches smoothing each signal of its own length."""
+        signals = [
+            np.array([np.nan, np.nan, 5.0]),
+            np.arange(10.0),
+            np.array([np.nan] * 4),
+            np.array([1.0, np.nan, 3.0, 4.0, np.nan, 6.0]),
+            np.array([np.nan, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]),
+        ]
+        lengths = np.array([len(signal) for signal in signals])
+        values = np.full((lengths.max(), len(signals)), np.nan)
+        for col, signal in enumerate(signals):
+            values[:len(signal), col] = signal
+
+        smoothed = smoother.smooth_columns(values, lengths)
+
+        assert smoothed.shape == values.shape
+        for col, signal in enumerate(signals):
+            assert np.allclose(smoothed[:len(signal), col], smoother.smooth(signal), equal_nan=True)
+            assert np.isnan(smoothed[len(signal):, col]).all()
+        # Without lengths, every column spans all rows
+        assert np.allclose(smoother.smooth_columns(values[:, [1]]),
+                           smoother.smooth(values[:, 1])[:, None], equal_nan=True)
@@ -0,0 +1,266 @@
+"""Tests for fetching Socrata datasets, against a local stand-in for the Socrata API."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import mock
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from delphi_utils import socrata
+from delphi_utils.socrata import SNAPSHOT_SELECT, count_rows, fetch_socrata
+
+DATASET_ID = "abcd-1234"
+
+
+class SocrataStandIn:
+    """Serve a list of rows the way the Socrata API does, on a local port.
+
+    Rows hold the `:id` and `:updated_at` system fields, which are only returned when
+    selected. Supports counting rows, paging through them, and filtering them on
+    `:updated_at`; `failures` makes the first requests answer with that many 503 errors.
+    """
+
+    def __init__(self, rows, failures=0, delay=0.0):
+        self.rows = rows
+        self.failures = failures
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, handler):
+        url = urlparse(handler.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with self.lock:
+            self.requests.append((url.path, params, handler.headers.get("X-App-Token")))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            fail = self.failures > 0
+            self.failures -= fail
+        try:
+            time.sleep(self.delay)
+            if fail:
+                handler.send_response(503)
+                handler.end_headers()
+                return
+            if url.path != f"/resource/{DATASET_ID}.json":
+                handler.send_response(404)
+                handler.end_headers()
+                return
+            rows = self.rows
+            if "$where" in params:
+                updated_since = re.fullmatch(r":updated_at >= '(.*)'", params["$where"]).group(1)
+                rows = [row for row in rows if row[":updated_at"].rstrip("Z") >= updated_since]
+            if params.get("$select") == "count(*) AS row_count":
+                body = [{"row_count": str(len(rows))}]
+            else:
+                offset, limit = int(params["$offset"]), int(params["$limit"])
+                body = rows[offset:offset + limit]
+                if params.get("$select") != SNAPSHOT_SELECT:
+                    body = [{k: v for k, v in row.items() if not k.startswith(":")} for row in body]
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.end_headers()
+            handler.wfile.write(json.dumps(body).encode())
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+ROWS = [{":id": f"row-{i:04d}", ":updated_at": f"2024-01-{i % 28 + 1:02d}T12:00:00.000Z",
+         "geo": f"g{i % 7}", "week_end": f"2024-01-{i % 28 + 1:02d}T00:00:00.000", "val": str(i / 2)}
+        for i in range(23)]
+DATA = pd.DataFrame(ROWS).drop(columns=[":id", ":updated_at"])
+
+
+class TestFetchSocrata:
+    """Tests for fetch_socrata."""
+
+    def test_count_rows(self):
+        with SocrataStandIn(ROWS) as stand_in:
+            assert count_rows(DATASET_ID, "token", base_url=stand_in.base_url) == 23
+        assert stand_in.requests[0][2] == "token"
+
+    def test_pages_fetched_concurrently(self):
+        with SocrataStandIn(ROWS, delay=0.1) as stand_in:
+            df = fetch_socrata(DATASET_ID, base_url=stand_in.base_url, page_size=5, max_workers=3)
+
+        pd.testing.assert_frame_equal(df, DATA)
+        pages = [params for _, params, _ in stand_in.requests if "$offset" in params]
+        assert sorted(int(params["$offset"]) for params in pages) == [0, 5, 10, 15, 20]
+        assert all(params["$order"] == ":id" for params in pages)
+        assert stand_in.max_in_flight == 3
+
+    def test_typed(self):
+        with SocrataStandIn(ROWS) as stand_in:
+            df = fetch_socrata(DATASET_ID, base_url=stand_in.base_url, page_size=10,
+                               type_dict={"val": float, "week_end": "datetime64[ns]"})
+        assert df["val"].dtype == float
+        assert df["week_end"].dtype == "datetime64[ns]"
+        assert df["val"].sum() == sum(range(23)) / 2
+        with SocrataStandIn(ROWS) as stand_in:
+            with pytest.raises(KeyError):
+                fetch_socrata(DATASET_ID, base_url=stand_in.base_url, type_dict={"missing": float})
+        with SocrataStandIn(ROWS) as stand_in:
+            df = fetch_socrata(DATASET_ID, base_url=stand_in.base_url, strict_types=False,
+                               type_dict={"val": float, "missing": float})
+        assert df["val"].dtype == float
+        assert "missing" not in df.columns
+
+    def test_empty(self):
+        with SocrataStandIn([]) as stand_in:
+            df = fetch_socrata(DATASET_ID, base_url=stand_in.base_url, type_dict={"val": float})
+        assert df.empty
+        assert list(df.columns) == ["val"]
+
+    def test_parquet_file(self, tmp_path):
+        """Pages are streamed to the parquet file as they are fetched."""
+        parquet_file = str(tmp_path / "backup.parquet")
+        with SocrataStandIn(ROWS) as stand_in:
+            df = fetch_socrata(DATASET_ID, base_url=stand_in.base_url, page_size=5,
+                               type_dict={"val": float, "week_end": "datetime64[ns]"},
+                               parquet_file=parquet_file)
+        backup = pd.read_parquet(parquet_file)
+        pd.testing.assert_frame_equal(backup, df)
+        assert backup["val"].dtype == float
+        assert list(tmp_path.iterdir()) == [tmp_path / "backup.parquet"]
+
+    def test_parquet_file_columns_differ(self, tmp_path):
+        """Socrata leaves out null fields, so pages may have different columns."""
+        rows = [dict(row) for row in ROWS]
+        del rows[2]["val"]
+        rows[12]["note"] = "revised"
+        parquet_file = str(tmp_path / "backup.parquet")
+        with SocrataStandIn(rows) as stand_in:
+            df = fetch_socrata(DATASET_ID, base_url=stand_in.base_url, page_size=10,
+                               parquet_file=parquet_file)
+        pd.testing.assert_frame_equal(df, pd.DataFrame(rows).drop(columns=[":id", ":updated_at"]))
+        pd.testing.assert_frame_equal(pd.read_parquet(parquet_file).fillna(np.nan), df)
+
+    def test_parquet_file_failed_fetch(self, tmp_path):
+        """A fetch failing after some pages were written leaves no parquet file behind."""
+        get_json = socrata._get_json
+
+        def fail_third_page(url, params, *args):
+            if params.get("$offset") == "10":
+                raise requests.HTTPError("503 Server Error")
+            return get_json(url, params, *args)
+
+        with SocrataStandIn(ROWS) as stand_in, \
+             mock.patch("delphi_utils.socrata._get_json", side_effect=fail_third_page):
+            with pytest.raises(requests.HTTPError):
+                fetch_socrata(DATASET_ID, base_url=stand_in.base_url, page_size=5, max_workers=1,
+                              parquet_file=str(tmp_path / "backup.parquet"))
+        assert list(tmp_path.iterdir()) == []
+
+    def test_dataset_grew(self):
+        """Rows added after counting are still fetched."""
+        with SocrataStandIn(ROWS) as stand_in, \
+             mock.patch("delphi_utils.socrata.count_rows", return_value=20):
+            df = fetch_socrata(DATASET_ID, base_url=stand_in.base_url, page_size=10)
+        assert len(df) == 23
+
+    def test_retry(self):
+        logger = mock.Mock()
+        with SocrataStandIn(ROWS, failures=2) as stand_in, \
+             mock.patch("delphi_utils.socrata.time") as mock_time:
+            df = fetch_socrata(DATASET_ID, base_url=stand_in.base_url, backoff=0.5, logger=logger)
+        assert len(df) == 23
+        assert mock_time.sleep.call_count == 2
+        # Exponential backoff with jitter
+        first, second = (call.args[0] for call in mock_time.sleep.call_args_list)
+        assert 0.5 <= first <= 1 and 1 <= second <= 1.5
+        assert logger.warning.call_count == 2
+
+    def test_retries_exhausted(self):
+        with SocrataStandIn(ROWS, failures=3) as stand_in, \
+             mock.patch("delphi_utils.socrata.time"):
+            with pytest.raises(requests.HTTPError):
+                fetch_socrata(DATASET_ID, base_url=stand_in.base_url, max_retries=2)
+
+    def test_no_retry_on_client_error(self):
+        with SocrataStandIn(ROWS) as stand_in, \
+             mock.patch("delphi_utils.socrata.time") as mock_time:
+            with pytest.raises(requests.HTTPError):
+                fetch_socrata("wxyz-0000", base_url=stand_in.base_url)
+        assert mock_time.sleep.call_count == 0
+
+
+class TestSocrataSnapshot:
+    """Tests for fetch_socrata with a snapshot directory."""
+
+    def test_incremental(self, tmp_path):
+        rows = [dict(row) for row in ROWS]
+        with SocrataStandIn(rows) as stand_in:
+            df = fetch_socrata(DATASET_ID, snapshot_dir=tmp_path, base_url=stand_in.base_url,
+                               page_size=10)
+            pd.testing.assert_frame_equal(df, DATA)
+            assert (tmp_path / f"{DATASET_ID}.parquet").exists()
+
+            # One row revised and one added
+            rows[3].update({":updated_at": "2024-02-08T00:00:00.000Z", "val": "100.0"})
+            rows.append({":id": "row-0023", ":updated_at": "2024-02-08T00:00:00.000Z",
+                         "geo": "g0", "week_end": "2024-01-24T00:00:00.000", "val": "200.0"})
+            stand_in.requests.clear()
+            df = fetch_socrata(DATASET_ID, snapshot_dir=tmp_path, base_url=stand_in.base_url,
+                               page_size=10, type_dict={"val": float})
+
+        pages = [params for _, params, _ in stand_in.requests if "$offset" in params]
+        assert len(pages) == 1
+        assert pages[0]["$where"] == ":updated_at >= '2024-01-23T12:00:00.000'"
+        assert len(df) == 24
+        assert df["val"].sum() == sum(range(23)) / 2 - 1.5 + 100 + 200
+        assert list(df.columns) == ["geo", "week_end", "val"]
+
+    def test_unchanged(self, tmp_path):
+        with SocrataStandIn(ROWS) as stand_in:
+            fetch_socrata(DATASET_ID, snapshot_dir=tmp_path, base_url=stand_in.base_url)
+            stand_in.requests.clear()
+            df = fetch_socrata(DATASET_ID, snapshot_dir=tmp_path, base_url=stand_in.base_url)
+        pd.testing.assert_frame_equal(df, DATA)
+        # Only the rows at the high-water mark are fetched again
+        counts = [params for _, params, _ in stand_in.requests if "$where" in params
+                  and params.get("$select") == "count(*) AS row_count"]
+        assert len(counts) == 1
+
+    def test_deleted_rows(self, tmp_path):
+        """Deleted rows are noticed from the row count, and the full dataset refetched."""
+        logger = mock.Mock()
+        with SocrataStandIn(ROWS) as stand_in:
+            fetch_socrata(DATASET_ID, snapshot_dir=tmp_path, base_url=stand_in.base_url)
+            stand_in.rows = ROWS[:20]
+            df = fetch_socrata(DATASET_ID, snapshot_dir=tmp_path, base_url=stand_in.base_url,
+                               logger=logger)
+        pd.testing.assert_frame_equal(df, DATA[:20])
+        logger.warning.assert_called_once()
+        assert len(pd.read_parquet(tmp_path / f"{DATASET_ID}.parquet")) == 20
+
+    def test_where_not_allowed(self, tmp_path):
+        with pytest.raises(ValueError):
+            fetch_socrata(DATASET_ID, snapshot_dir=tmp_path, where="val > 1")
@@ -32,6 +32,23 @@ class TestValidationReport:
         assert len(report.unsuppressed_errors) == 0
         assert report.num_suppressed == 1
 
+    def test_merge(self):
+        """Test that merging a report adds its checks, errors, and warnings."""
+        report = ValidationReport([self.ERROR_1])
+        report.add_raised_error(self.ERROR_2)
+        other = ValidationReport([])
+        other.increment_total_checks()
+        other.increment_total_checks()
+        other.add_raised_error(self.ERROR_1)
+        other.add_raised_warning(self.WARNING_1)
+        report.merge(other)
+
+        assert report.total_checks == 2
+        assert report.raised_errors == [self.ERROR_2, self.ERROR_1]
+        assert report.unsuppressed_errors == [self.ERROR_2]
+        assert report.num_suppressed == 1
+        assert report.raised_warnings == [self.WARNING_1]
+
     def test_str(self):
         """Test that the string representation contains all information."""
         report = ValidationReport([self.ERROR_1])
@@ -13,22 +13,34 @@ To use this module, you need to specify the range of issue dates in params.json,
   "patch": {
     "patch_dir": "/Users/minhkhuele/Desktop/delphi/covidcast-indicators/doctor_visits/AprilPatch",
     "start_issue": "2024-04-20",
-    "end_issue": "2024-04-21"
+    "end_issue": "2024-04-21",
+    "max_workers": 4
   }
 }
 
 It will generate data for that range of issue dates, and store them in batch issue format:
 [name-of-patch]/issue_[issue-date]/doctor-visits/actual_data_file.csv
+
+Issues whose directory already exists are skipped, so an interrupted patch can be resumed by
+running it again.
 """
 
 from datetime import datetime, timedelta
+from functools import partial
 from os import makedirs
 
-from delphi_utils import get_structured_logger, read_params
+from delphi_utils import get_structured_logger, read_params, run_patch
 
 from .run import run_module
 
 
+def run_issue(params, issue_date, export_dir, logger):
+    """Run the doctor visits indicator for one issue date, exporting to export_dir."""
+    params["patch"]["current_issue"] = issue_date.strftime("%Y-%m-%d")
+    params["common"]["export_dir"] = export_dir
+    run_module(params, logger)
+
+
 def patch():
     """
     Run the doctor visits indicator for a range of issue dates.
@@ -38,6 +50,7 @@ def patch():
         - "start_date": str, YYYY-MM-DD format, first issue date
         - "end_date": str, YYYY-MM-DD format, last issue date
         - "patch_dir": str, directory to write all issues output
+        - "max_workers" (optional): int, number of issues to run in parallel, default 1
     """
     params = read_params()
     logger = get_structured_logger("delphi_doctor_visits.patch", filename=params["common"]["log_filename"])
@@ -54,21 +67,15 @@ def patch():
 
     makedirs(params["patch"]["patch_dir"], exist_ok=True)
 
+    issue_dates = []
     current_issue = start_issue
-
     while current_issue <= end_issue:
-        logger.info("Running issue", issue_date=current_issue.strftime("%Y-%m-%d"))
-
-        params["patch"]["current_issue"] = current_issue.strftime("%Y-%m-%d")
-
-        current_issue_yyyymmdd = current_issue.strftime("%Y%m%d")
-        current_issue_dir = f"""{params["patch"]["patch_dir"]}/issue_{current_issue_yyyymmdd}/doctor-visits"""
-        makedirs(f"{current_issue_dir}", exist_ok=True)
-        params["common"]["export_dir"] = f"""{current_issue_dir}"""
-
-        run_module(params, logger)
+        issue_dates.append(current_issue)
         current_issue += timedelta(days=1)
 
+    run_patch(issue_dates, partial(run_issue, params), params["patch"]["patch_dir"], "doctor-visits", logger,
+              params["patch"].get("max_workers", 1))
+
 
 if __name__ == "__main__":
     patch()
@@ -1,8 +1,11 @@
 """Functions for mapping between geo regions."""
 # -*- coding: utf-8 -*-
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 from delphi_utils import GeoMapper
+from scipy import sparse
 from .constants import METRICS, COMBINED_METRIC
 
 gmpr = GeoMapper()
@@ -48,10 +51,35 @@ def generate_transition_matrix(geo_res):
               ).fillna(0).reset_index().rename({mapping_flag: "geo_id"}, axis = 1)
     return map_df
 
+@lru_cache(maxsize=None)
+def sparse_transition_matrix(geo_res):
+    """
+    Get the transition matrix from county/state to geo_res as a sparse matrix.
+
+    The matrix is built once per geo_res and cached, since it doesn't depend on the data.
+
+    Parameters
+    ----------
+    geo_res: str
+        "msa", "hrr", "hhs" or "nation"
+
+    Returns
+    -------
+    tuple
+        ids of the county/state rows, ids of the geo_res rows, and the
+        (geo_res x county/state) sparse matrix of weights.
+    """
+    map_df = generate_transition_matrix(geo_res)
+    weights = sparse.csr_matrix(map_df.iloc[:, 1:].to_numpy(dtype=float).T)
+    return map_df["geo_id"].to_numpy(), np.array(map_df.columns[1:]), weights
+
 def geo_map(df, geo_res, namescols =  None):
     """
     Compute derived HRR and MSA counts as a weighted sum of the county dataset.
 
+    All dates are mapped at once: the data is pivoted to a (county/state x
+    (date, column)) array, which is multiplied by the sparse transition matrix.
+
     Parameters
     ----------
     df: pd.DataFrame
@@ -78,25 +106,27 @@ def geo_map(df, geo_res, namescols =  None):
     if geo_res == "county":
         return df
 
-    map_df = generate_transition_matrix(geo_res)
+    from_ids, to_ids, weights = sparse_transition_matrix(geo_res)
 
     dates_list = df["timestamp"].unique()
-    dfs_list = [pd.DataFrame()] * len(dates_list)
-
-    for i, _date in enumerate(dates_list):
-        val_lists = df[df["timestamp"] == _date].merge(
-                map_df["geo_id"], how="right"
-                )[namescols].fillna(0)
-        newdf = pd.DataFrame(
-                np.matmul(map_df.values[:, 1:].T, val_lists.values),
-                columns = list(val_lists.keys())
-                )
-        newdf["timestamp"] = _date
-        newdf["geo_id"] = list(map_df.keys())[1:]
-        mask = (newdf == 0)
-        newdf[mask] = np.nan
-        dfs_list[i] = newdf
+    date_idx = pd.Index(dates_list).get_indexer(df["timestamp"])
+    geo_idx = pd.Index(from_ids).get_indexer(df["geo_id"])
+    # Locations missing from the transition matrix are dropped, and missing values count as 0
+    in_map = geo_idx >= 0
+    values = np.zeros((len(from_ids), len(dates_list), len(namescols)))
+    values[geo_idx[in_map], date_idx[in_map]] = np.nan_to_num(
+        df[namescols].to_numpy(dtype=float)[in_map])
+
+    mapped = weights @ values.reshape(len(from_ids), -1)
+    # (date, geo_res) rows, as if mapping date by date
+    mapped = mapped.reshape(len(to_ids), len(dates_list), len(namescols)).transpose(1, 0, 2)
+    mapped[mapped == 0] = np.nan
+    newdf = pd.DataFrame(mapped.reshape(-1, len(namescols)),
+                         columns=namescols,
+                         index=np.tile(np.arange(len(to_ids)), len(dates_list)))
+    newdf["timestamp"] = np.repeat(dates_list, len(to_ids))
+    newdf["geo_id"] = np.tile(to_ids, len(dates_list))
 
     # Reindex to make sure output has same columns as input df. Filled with
     # NaN values if column doesn't already exist.
-    return pd.concat(dfs_list).reindex(df.columns, axis=1)
+    return newdf.reindex(df.columns, axis=1)
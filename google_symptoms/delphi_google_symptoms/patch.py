@@ -14,23 +14,48 @@ To use this module, you need to specify the range of issue dates in params.json,
   "patch": {
     "patch_dir": ".../covidcast-indicators/google-symptoms/AprilPatch",
     "start_issue": "2024-04-20",
-    "end_issue": "2024-04-21"
+    "end_issue": "2024-04-21",
+    "pull_once": true,
+    "source_dir": ".../covidcast-indicators/google-symptoms/AprilPatchSource",
+    "max_workers": 4
   }
 }
 
 It will generate data for that range of issue dates, and store them in batch issue format:
 [params patch_dir]/issue_[issue-date]/google-symptoms/xxx.csv
+
+With "pull_once", the data for all issue dates is pulled from BigQuery in a single query
+per geo level and stored as parquet in "source_dir", which each issue then reads from.
+
+Issues whose directory already exists are skipped, so an interrupted patch can be resumed by
+running it again.
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import partial
 from os import makedirs
 
-from delphi_utils import get_structured_logger, read_params
+from delphi_utils import get_structured_logger, read_params, run_patch
 
-from .date_utils import generate_patch_dates
+from .date_utils import generate_patch_dates, generate_query_dates
+from .pull import store_gs_data
 from .run import run_module
 
 
+def run_issue(params, patch_dates, issue_date, export_dir, logger):
+    """Run the google symptoms indicator for one issue date, exporting to export_dir."""
+    params["common"]["export_dir"] = export_dir
+    params["common"]["custom_run"] = True
+
+    date_settings = patch_dates[issue_date]
+
+    params["indicator"]["export_start_date"] = date_settings["export_start_date"].strftime("%Y-%m-%d")
+    params["indicator"]["export_end_date"] = date_settings["export_end_date"].strftime("%Y-%m-%d")
+    params["indicator"]["num_export_days"] = date_settings["num_export_days"]
+
+    run_module(params, logger)
+
+
 def patch(params):
     """
     Run the google symptoms indicator for a range of issue dates.
@@ -52,6 +77,9 @@ def patch(params):
         - "start_date": str, YYYY-MM-DD format, first issue date
         - "end_date": str, YYYY-MM-DD format, last issue date
         - "patch_dir": str, directory to write all issues output
+        - "pull_once" (optional): bool, whether to pull the data for all issues at once
+        - "source_dir": str, directory to store the pulled data in, if "pull_once"
+        - "max_workers" (optional): int, number of issues to run in parallel, default 1
     """
     logger = get_structured_logger("delphi_google_symptom.patch", filename=params["common"]["log_filename"])
 
@@ -69,26 +97,31 @@ def patch(params):
 
     patch_dates = generate_patch_dates(params)
 
-    while issue_date <= end_issue:
-        logger.info("Running issue", issue_date=issue_date.strftime("%Y-%m-%d"))
-
-        # Output dir setup
-        current_issue_yyyymmdd = issue_date.strftime("%Y%m%d")
-        current_issue_dir = f"""{params["patch"]["patch_dir"]}/issue_{current_issue_yyyymmdd}/google-symptoms"""
-        makedirs(f"{current_issue_dir}", exist_ok=True)
-
-        params["common"]["export_dir"] = f"""{current_issue_dir}"""
-        params["common"]["custom_run"] = True
-
-        date_settings = patch_dates[issue_date]
-
-        params["indicator"]["export_start_date"] = date_settings["export_start_date"].strftime("%Y-%m-%d")
-        params["indicator"]["export_end_date"] = date_settings["export_end_date"].strftime("%Y-%m-%d")
-        params["indicator"]["num_export_days"] = date_settings["num_export_days"]
-
-        run_module(params, logger)
-
-        issue_date += timedelta(days=1)
+    if params["patch"].get("pull_once", False):
+        query_dates = [
+            generate_query_dates(
+                date_settings["export_start_date"],
+                date_settings["export_end_date"],
+                date_settings["num_export_days"],
+                True,
+            )
+            for date_settings in patch_dates.values()
+        ]
+        store_gs_data(
+            params["indicator"]["bigquery_credentials"],
+            [min(dates[0] for dates in query_dates), max(dates[1] for dates in query_dates)],
+            params["patch"]["source_dir"],
+            logger,
+        )
+
+    run_patch(
+        sorted(patch_dates),
+        partial(run_issue, params, patch_dates),
+        params["patch"]["patch_dir"],
+        "google-symptoms",
+        logger,
+        params["patch"].get("max_workers", 1),
+    )
 
 
 if __name__ == "__main__":
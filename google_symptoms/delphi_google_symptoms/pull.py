@@ -1,9 +1,11 @@
 """Retrieve data and wrangle into appropriate format."""
 # -*- coding: utf-8 -*-
 import random
-import re
 import time
 from datetime import date, datetime  # pylint: disable=unused-import
+from glob import glob
+from os import makedirs
+from os.path import basename, exists, join
 
 import numpy as np
 import pandas as pd
@@ -14,10 +16,21 @@ from google.oauth2 import service_account
 from .constants import COMBINED_METRIC, DC_FIPS, DTYPE_CONVERSIONS, METRICS, SYMPTOM_SETS
 from .date_utils import generate_query_dates
 
+# Name of the parquet files written by `store_gs_data`.
+SOURCE_FILE = "{level}_{start_date}_{end_date}.parquet"
+
 # Create map of BigQuery symptom column names to desired column names.
 colname_map = {"symptom_" +
                metric.replace(" ", "_"): metric for metric in METRICS}
 
+# Position in METRICS of the symptoms of each combined metric, padded with len(METRICS).
+SYMPTOM_SET_SIZES = np.array([len(SYMPTOM_SETS[cb_metric]) for cb_metric in COMBINED_METRIC])
+SYMPTOM_SET_INDEX = np.array([
+    [METRICS.index(metric) for metric in SYMPTOM_SETS[cb_metric]]
+    + [len(METRICS)] * (SYMPTOM_SET_SIZES.max() - len(SYMPTOM_SETS[cb_metric]))
+    for cb_metric in COMBINED_METRIC
+])
+
 
 def preprocess(df, level):
     """
@@ -45,16 +58,23 @@ def preprocess(df, level):
     # Constants
     KEEP_COLUMNS = ["geo_id", "date"] + METRICS + COMBINED_METRIC
 
-    df.rename(colname_map, axis=1, inplace=True)
-    df["geo_id"] = df["open_covid_region_code"].apply(
-        lambda x: x.split("-")[-1].lower())
-
-    for cb_metric in COMBINED_METRIC:
-        df[cb_metric] = 0
-        for metric in SYMPTOM_SETS[cb_metric]:
-            df[cb_metric] += df[metric].fillna(0).astype(float)
-        df[cb_metric] = df[cb_metric]/len(SYMPTOM_SETS[cb_metric])
-        df.loc[df[SYMPTOM_SETS[cb_metric]].isnull().all(axis=1), cb_metric] = np.nan
+    df = df.rename(colname_map, axis=1)
+    df["geo_id"] = df["open_covid_region_code"].str.rsplit("-", n=1).str[-1].str.lower()
+
+    # Each combined metric is the mean of its symptoms, with missing symptoms
+    # counted as 0, or missing if all its symptoms are
+    symptoms = df[METRICS].to_numpy(dtype=float)
+    # (row x combined metric x symptom) array, padded with a column of zeros
+    symptom_sets = np.hstack([symptoms, np.zeros((len(df), 1))])[:, SYMPTOM_SET_INDEX]
+    all_missing = np.isnan(symptom_sets).sum(axis=2) == SYMPTOM_SET_SIZES
+    symptom_sets = np.nan_to_num(symptom_sets)
+    # Symptoms are added one at a time, in the order of their set
+    combined = symptom_sets[:, :, 0].copy()
+    for i in range(1, symptom_sets.shape[2]):
+        combined += symptom_sets[:, :, i]
+    combined /= SYMPTOM_SET_SIZES
+    combined[all_missing] = np.nan
+    df[COMBINED_METRIC] = combined
 
     # Delete rows with missing FIPS
     null_mask = (df["geo_id"].isnull())
@@ -62,10 +82,7 @@ def preprocess(df, level):
 
     # Confirm FIPS
     if level == "county":
-        test_result = []
-        for fips in df["geo_id"].values:
-            test_result.append(len(re.findall(r"\b\d{5}\b", fips)) == 1)
-        assert all(test_result)
+        assert (df["geo_id"].str.count(r"\b\d{5}\b") == 1).all()
 
     # keep necessary columns only
     try:
@@ -77,22 +94,25 @@ def preprocess(df, level):
         )
 
     if len(df) != 0:
-        # Make sure each FIPS/state has same number of rows
-        geo_list = df["geo_id"].unique()
-        date_list = pd.date_range(
-            start=df["date"].min(),
-            end=df["date"].max(),
-            freq='D')
-        index_df = pd.MultiIndex.from_product(
-            [geo_list, date_list], names=['geo_id', 'date']
-        )
-        df.date = pd.to_datetime(df.date)
-        df = df.set_index(
-            ["geo_id", "date"]
-        ).reindex(
-            index_df
-        ).reset_index(
-        )
+        # Make sure each FIPS/state has same number of rows, with geos in order
+        # of appearance and dates in order within each geo
+        dates = pd.to_datetime(df["date"])
+        date_list = pd.date_range(start=dates.min(), end=dates.max(), freq="D")
+        geo_idx, geo_list = pd.factorize(df["geo_id"])
+        date_idx = (dates - date_list[0]).dt.days.to_numpy()
+        row_idx = geo_idx * len(date_list) + date_idx
+        if np.bincount(row_idx).max() > 1:
+            raise ValueError("cannot reindex on an axis with duplicate labels")
+
+        values = np.full((len(geo_list) * len(date_list), len(KEEP_COLUMNS) - 2), np.nan)
+        values[row_idx] = df[KEEP_COLUMNS[2:]].to_numpy(dtype=float)
+        out = pd.DataFrame(values, columns=KEEP_COLUMNS[2:])
+        # Categories are sorted, so sorting by geo_id still sorts alphabetically
+        categories = np.sort(geo_list.to_numpy())
+        out.insert(0, "geo_id", pd.Categorical.from_codes(
+            np.repeat(categories.searchsorted(geo_list), len(date_list)), categories=categories))
+        out.insert(1, "date", np.tile(date_list, len(geo_list)))
+        df = out
 
     df = df.rename({"date": "timestamp"}, axis=1)
 
@@ -158,22 +178,8 @@ def produce_query(level, date_range):
     return query
 
 
-def pull_gs_data_one_geolevel(level, date_range, logger):
-    """Pull latest data for a single geo level.
-
-    Fetch data and transform it into the appropriate format, as described in
-    the preprocess function.
-
-    Note that we retrieve state level data from "symptom_search_sub_region_1_daily"
-    where there are state level data for 51 states including 'District of Columbia'.
-
-    We retrieve the county level data from "symptom_search_sub_region_2_daily"
-    where there is county level data available except District of Columbia.
-    We filter the data such that we only keep rows with valid FIPS.
-
-    Each of these tables should be static and contain all dates.
-
-    PS:  No information for PR
+def fetch_gs_data_one_geolevel(level, date_range):
+    """Query BigQuery for the raw data of a single geo level.
 
     Parameters
     ----------
@@ -206,6 +212,101 @@ def pull_gs_data_one_geolevel(level, date_range, logger):
             raise e
     if df is None:
         df = pandas_gbq.read_gbq(query, progress_bar_type=None, dtypes=DTYPE_CONVERSIONS)
+    return df
+
+
+def store_gs_data(credentials, date_range, source_dir, logger):
+    """Pull the raw data of each geo level once and store it in a local parquet file.
+
+    Patches use this to query the union of their issues' date ranges a single
+    time; each issue then reads its own range from `source_dir`.
+
+    Parameters
+    ----------
+    credentials: dict
+        Dict of BigQuery API credentials from service account json file
+    date_range: list[date]
+        [first date, last date] to retrieve data for
+    source_dir: str
+        Directory to store the parquet files in
+    logger: logging.Logger
+        Structured logger
+    """
+    retrieve_dates = format_dates_for_query(date_range)
+    makedirs(source_dir, exist_ok=True)
+    initialize_credentials(credentials)
+    for level in ("state", "county"):
+        filename = join(source_dir, SOURCE_FILE.format(
+            level=level, start_date=retrieve_dates[0], end_date=retrieve_dates[1]))
+        if exists(filename):
+            logger.info("Using stored source data", geo_level=level, filename=filename)
+            continue
+        df = fetch_gs_data_one_geolevel(level, retrieve_dates)
+        df.to_parquet(filename, index=False)
+        logger.info("Stored source data", geo_level=level, filename=filename, rows=len(df))
+
+
+def read_stored_gs_data(level, date_range, source_dir):
+    """Read the raw data of a geo level for a date range from stored parquet files.
+
+    Parameters
+    ----------
+    level: str
+        "county" or "state"
+    date_range: list[str]
+        ["YYYY-MM-DD"), "YYYY-MM-DD"] where dates are BigQuery-compatible.
+    source_dir: str
+        Directory the parquet files were stored in by `store_gs_data`
+
+    Returns
+    -------
+    pd.DataFrame, or None if no stored file covers the date range
+    """
+    for filename in sorted(glob(join(source_dir, SOURCE_FILE.format(level=level, start_date="*", end_date="*")))):
+        start_date, end_date = basename(filename)[len(level) + 1:-len(".parquet")].split("_")
+        if start_date <= date_range[0] and date_range[1] <= end_date:
+            return pd.read_parquet(filename, filters=[
+                ("date", ">=", pd.Timestamp(date_range[0])),
+                ("date", "<=", pd.Timestamp(date_range[1]))])
+    return None
+
+
+def pull_gs_data_one_geolevel(level, date_range, logger, source_dir=None):
+    """Pull latest data for a single geo level.
+
+    Fetch data and transform it into the appropriate format, as described in
+    the preprocess function.
+
+    Note that we retrieve state level data from "symptom_search_sub_region_1_daily"
+    where there are state level data for 51 states including 'District of Columbia'.
+
+    We retrieve the county level data from "symptom_search_sub_region_2_daily"
+    where there is county level data available except District of Columbia.
+    We filter the data such that we only keep rows with valid FIPS.
+
+    Each of these tables should be static and contain all dates.
+
+    PS:  No information for PR
+
+    Parameters
+    ----------
+    level: str
+        "county" or "state"
+    date_range: list[str]
+        ["YYYY-MM-DD"), "YYYY-MM-DD"] where dates are BigQuery-compatible.
+    source_dir: str
+        Directory of data stored by `store_gs_data`, if any. BigQuery is only
+        queried if no stored file covers the date range.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    df = None
+    if source_dir is not None:
+        df = read_stored_gs_data(level, date_range, source_dir)
+    if df is None:
+        df = fetch_gs_data_one_geolevel(level, date_range)
 
     if len(df) == 0:
         df = pd.DataFrame(columns=["open_covid_region_code", "date"] + list(colname_map.keys()))
@@ -235,7 +336,9 @@ def initialize_credentials(credentials):
     pandas_gbq.context.project = credentials.project_id
 
 
-def pull_gs_data(credentials, export_start_date, export_end_date, num_export_days, custom_run_flag, logger):
+def pull_gs_data(
+    credentials, export_start_date, export_end_date, num_export_days, custom_run_flag, logger, source_dir=None
+):
     """Pull latest dataset for each geo level and combine.
 
     PS:  No information for PR
@@ -252,6 +355,8 @@ def pull_gs_data(credentials, export_start_date, export_end_date, num_export_day
         last date to retrieve data for
     num_export_days: int
         number of days before end date to export
+    source_dir: str
+        Directory of data stored by `store_gs_data`, if any
 
     Returns
     -------
@@ -267,9 +372,9 @@ def pull_gs_data(credentials, export_start_date, export_end_date, num_export_day
     dfs = {}
 
     # For state level data
-    dfs["state"] = pull_gs_data_one_geolevel("state", retrieve_dates, logger)
+    dfs["state"] = pull_gs_data_one_geolevel("state", retrieve_dates, logger, source_dir)
     # For county level data
-    dfs["county"] = pull_gs_data_one_geolevel("county", retrieve_dates, logger)
+    dfs["county"] = pull_gs_data_one_geolevel("county", retrieve_dates, logger, source_dir)
 
     # Add District of Columbia as county
     try:
@@ -277,6 +382,7 @@ def pull_gs_data(credentials, export_start_date, export_end_date, num_export_day
             "geo_id", axis=1)
         df_dc_county["geo_id"] = DC_FIPS
         dfs["county"] = pd.concat([dfs["county"], df_dc_county])
+        dfs["county"]["geo_id"] = dfs["county"]["geo_id"].astype("category")
     except KeyError:
         pass
     return dfs
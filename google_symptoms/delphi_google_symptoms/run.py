@@ -9,6 +9,7 @@ from datetime import date, datetime
 from itertools import product
 
 import numpy as np
+import pandas as pd
 from delphi_utils import create_export_csv, get_structured_logger
 
 from .constants import COMBINED_METRIC, FULL_BKFILL_START_DATE, GEO_RESOLUTIONS, SMOOTHERS, SMOOTHERS_MAP
@@ -17,6 +18,102 @@ from .geo import geo_map
 from .pull import pull_gs_data
 
 
+def smooth_signals(df, metrics=None, smoothers=None):
+    """
+    Compute every metric x smoother signal of a geo level in one pass.
+
+    The values of each geo_id are smoothed in the order of their rows, as
+    grouping by geo_id and transforming each metric would. The input frame is
+    not modified.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Columns "geo_id", "timestamp", and the metrics
+    metrics: list of str
+        Metrics to smooth, COMBINED_METRIC by default
+    smoothers: list of str
+        Keys of SMOOTHERS_MAP to apply, SMOOTHERS by default
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns "geo_id", "timestamp", and a column (metric, smoother) per signal
+    """
+    if metrics is None:
+        metrics = COMBINED_METRIC
+    if smoothers is None:
+        smoothers = SMOOTHERS
+    geo_idx, geo_ids = pd.factorize(df["geo_id"])
+    row_idx = pd.Series(geo_idx).groupby(geo_idx).cumcount().to_numpy()
+    # (row within geo x geo x metric) array, padded with NaNs at the end
+    values = np.full((row_idx.max() + 1 if len(df) else 0, len(geo_ids), len(metrics)), np.nan)
+    values[row_idx, geo_idx] = df[metrics].to_numpy(dtype=float)
+
+    signals = pd.DataFrame({"geo_id": df["geo_id"].values,
+                            "timestamp": df["timestamp"].values},
+                           index=df.index)
+    flat_values = values.reshape(values.shape[0], -1)
+    # Number of rows of each geo, for each of its metric columns
+    lengths = np.repeat(np.bincount(geo_idx, minlength=len(geo_ids)), len(metrics))
+    for smoother in smoothers:
+        smoothed = SMOOTHERS_MAP[smoother][0].smooth_columns(flat_values, lengths).reshape(values.shape)
+        for i, metric in enumerate(metrics):
+            signals[(metric, smoother)] = smoothed[row_idx, geo_idx, i]
+    return signals
+
+def export_signals(signals, geo_res, export_dir, export_start_date, logger):
+    """
+    Write the CSV files of all signals of a geo level.
+
+    Parameters
+    ----------
+    signals: pd.DataFrame
+        Output of `smooth_signals`
+    geo_res: str
+        Geo level of the signals
+    export_dir: str
+        Directory to write to
+    export_start_date: datetime
+        First date to export; raw signals start a week earlier
+    logger: logging.Logger
+        Structured logger
+
+    Returns
+    -------
+    list of pd.Series
+        Dates exported for each signal
+    """
+    exported_dates = []
+    for metric, smoother in product(COMBINED_METRIC, SMOOTHERS):
+        sensor_name = "_".join([smoother, "search"])
+        logger.info("Generating signal and exporting to CSV", geo_type=geo_res, signal=f"{metric}_{sensor_name}")
+        df = pd.DataFrame({"geo_id": signals["geo_id"],
+                           "timestamp": signals["timestamp"],
+                           "val": signals[(metric, smoother)],
+                           "se": np.nan,
+                           "sample_size": np.nan})
+        # Drop early entries where data insufficient for smoothing
+        df = df.loc[~df["val"].isnull(), :]
+        if len(df) == 0:
+            logger.info("No data for signal", geo_type=geo_res, signal=f"{metric}_{sensor_name}")
+            continue
+        exported_csv_dates = create_export_csv(
+            df,
+            export_dir=export_dir,
+            start_date=SMOOTHERS_MAP[smoother][1](export_start_date),
+            metric=metric.lower(),
+            geo_res=geo_res,
+            sensor=sensor_name)
+        if not exported_csv_dates.empty:
+            logger.info("Exported CSV",
+                        csv_export_count=exported_csv_dates.size,
+                        min_csv_export_date=min(exported_csv_dates).strftime("%Y-%m-%d"),
+                        max_csv_export_date=max(exported_csv_dates).strftime("%Y-%m-%d"))
+            exported_dates.append(exported_csv_dates)
+    return exported_dates
+
+
 def run_module(params, logger=None):
     """
     Run Google Symptoms module.
@@ -61,6 +158,11 @@ def run_module(params, logger=None):
         False if not params["common"].get("custom_run", False) else params["indicator"].get("custom_run", False)
     )
 
+    # Patches pulling their source data once read each issue's range from it
+    source_dir = None
+    if params["common"].get("custom_run", False) and params.get("patch", {}).get("pull_once", False):
+        source_dir = params["patch"]["source_dir"]
+
     # Pull GS data
     dfs = pull_gs_data(
         params["indicator"]["bigquery_credentials"],
@@ -69,6 +171,7 @@ def run_module(params, logger=None):
         num_export_days,
         custom_run_flag,
         logger,
+        source_dir,
     )
 
     for geo_res, mapped_res in GEO_RESOLUTIONS.items():
@@ -83,39 +186,13 @@ def run_module(params, logger=None):
         else:
             df_pull = geo_map(dfs[mapped_res], geo_res)
 
-        for metric, smoother in product(COMBINED_METRIC, SMOOTHERS):
-            sensor_name = "_".join([smoother, "search"])
-            logger.info("Generating signal and exporting to CSV", geo_type=geo_res, signal=f"{metric}_{sensor_name}")
-            df = df_pull
-            df["val"] = df[metric].astype(float)
-            df["val"] = df[["geo_id", "val"]].groupby(
-                "geo_id")["val"].transform(
-                SMOOTHERS_MAP[smoother][0].smooth)
-            df["se"] = np.nan
-            df["sample_size"] = np.nan
-            # Drop early entries where data insufficient for smoothing
-            df = df.loc[~df["val"].isnull(), :]
-            df = df.reset_index()
-            if len(df) == 0:
-                logger.info("No data for signal", geo_type=geo_res, signal=f"{metric}_{sensor_name}")
-                continue
-            exported_csv_dates = create_export_csv(
-                df,
-                export_dir=export_dir,
-                start_date=SMOOTHERS_MAP[smoother][1](export_start_date),
-                metric=metric.lower(),
-                geo_res=geo_res,
-                sensor=sensor_name)
-            if not exported_csv_dates.empty:
-                logger.info("Exported CSV",
-                            csv_export_count=exported_csv_dates.size,
-                            min_csv_export_date=min(exported_csv_dates).strftime("%Y-%m-%d"),
-                            max_csv_export_date=max(exported_csv_dates).strftime("%Y-%m-%d"))
-                csv_export_count += exported_csv_dates.size
-                if not oldest_final_export_date:
-                    oldest_final_export_date = max(exported_csv_dates)
-                oldest_final_export_date = min(
-                    oldest_final_export_date, max(exported_csv_dates))
+        signals = smooth_signals(df_pull)
+        for exported_csv_dates in export_signals(signals, geo_res, export_dir, export_start_date, logger):
+            csv_export_count += exported_csv_dates.size
+            if not oldest_final_export_date:
+                oldest_final_export_date = max(exported_csv_dates)
+            oldest_final_export_date = min(
+                oldest_final_export_date, max(exported_csv_dates))
 
     elapsed_time_in_seconds = round(time.time() - start_time, 2)
     max_lag_in_days = None
@@ -14,7 +14,8 @@ required = [
     "pylint==2.8.3",
     "pytest-cov",
     "pytest",
-    "pytest-freezegun~=0.4.2"
+    "pytest-freezegun~=0.4.2",
+    "scipy",
 ]
 
 setup(
@@ -68,6 +68,23 @@ covidcast_metadata = pd.read_csv(f"{TEST_DIR}/test_data/covid_metadata.csv",
                                  parse_dates=["max_time", "min_time", "max_issue", "last_update"])
 
 NEW_DATE = "2024-02-20"
+
+
+def local_read_gbq(state_df, county_df=None):
+    """Make a stand-in for pandas_gbq.read_gbq that answers queries from local frames."""
+    tables = {
+        "symptom_search_sub_region_1_daily": state_df,
+        "symptom_search_sub_region_2_daily": county_df,
+    }
+    def read_gbq(query, *args, **kwargs):
+        start_date, end_date = re.findall(r'\d{4}-\d{2}-\d{2}', query)
+        for table, df in tables.items():
+            if table in query and df is not None:
+                return df[(df["date"] >= start_date) & (df["date"] <= end_date)]
+        return pd.DataFrame(columns=keep_cols)
+    return read_gbq
+
+
 @pytest.fixture(scope="session")
 def logger():
     return logging.getLogger()
@@ -127,19 +144,5 @@ def run_as_module(params):
          mock.patch("pandas_gbq.read_gbq") as mock_read_gbq, \
          mock.patch("delphi_google_symptoms.pull.initialize_credentials", return_value=None), \
          mock.patch("delphi_google_symptoms.date_utils.covidcast.metadata", return_value=covidcast_metadata):
-        def side_effect(*args, **kwargs):
-            if "symptom_search_sub_region_1_daily" in args[0]:
-                df = state_data
-                pattern = re.compile(r'\d{4}-\d{2}-\d{2}')
-                start_date, end_date = re.findall(pattern, args[0])
-                return df[(df["date"] >= start_date) & (df["date"] <= end_date)]
-            elif "symptom_search_sub_region_2_daily" in args[0]:
-                df = county_data
-                pattern = re.compile(r'\d{4}-\d{2}-\d{2}')
-                start_date, end_date = re.findall(pattern, args[0])
-                return df[(df["date"] >= start_date) & (df["date"] <= end_date)]
-            else:
-                return pd.DataFrame()
-
-        mock_read_gbq.side_effect = side_effect
+        mock_read_gbq.side_effect = local_read_gbq(state_data, county_data)
         delphi_google_symptoms.run.run_module(params)
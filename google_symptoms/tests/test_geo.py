@@ -217,3 +217,23 @@ class TestGeo:
         assert new_df[METRICS[25]].values == pytest.approx(df_plus[METRICS[25]].tolist())
         assert new_df[COMBINED_METRIC[4]].values == pytest.approx(df_plus[COMBINED_METRIC[4]].tolist())
 
+
+    def test_multiple_dates(self):
+        df = pd.DataFrame(
+            {
+                "geo_id": ["01001", "01009", "01007", "01001", "01007", "99999"],
+                "timestamp": ["2020-02-15", "2020-02-15", "2020-02-15",
+                              "2020-02-16", "2020-02-16", "2020-02-16"],
+                METRICS[23]: [10, 15, 2, 8, np.nan, 5],
+                COMBINED_METRIC[4]: [39, 19, 23, 11, 12, 5],
+            }
+        )
+        namescols = [METRICS[23], COMBINED_METRIC[4]]
+
+        new_df = geo_map(df, "hrr", namescols=namescols)
+
+        # Mapping all dates at once matches mapping each date on its own
+        for date, date_df in df.groupby("timestamp"):
+            expected = geo_map(date_df, "hrr", namescols=namescols)
+            pd.testing.assert_frame_equal(new_df[new_df["timestamp"] == date], expected)
+        assert set(new_df.dropna(how="all", subset=namescols)["geo_id"]) == set(["1", "5", "7", "9"])
@@ -1,3 +1,4 @@
+import copy
 from datetime import datetime, timedelta
 import unittest
 
@@ -14,7 +15,7 @@ from delphi_utils.validator.utils import lag_converter
 from delphi_google_symptoms.constants import SMOOTHERS_MAP, FULL_BKFILL_START_DATE
 from delphi_google_symptoms.date_utils import generate_query_dates
 
-from conftest import state_data_gap, covidcast_metadata, TEST_DIR
+from conftest import state_data_gap, covidcast_metadata, local_read_gbq, TEST_DIR
 
 
 class TestPatchModule:
@@ -55,21 +56,13 @@ class TestPatchModule:
              mock_patch("delphi_google_symptoms.pull.initialize_credentials", return_value=None), \
              mock_patch("delphi_google_symptoms.date_utils.covidcast.metadata", return_value=covidcast_metadata), \
              mock_patch("delphi_google_symptoms.run.GEO_RESOLUTIONS", new={"state": "state"}):
-            def side_effect(*args, **kwargs):
-                if "symptom_search_sub_region_1_daily" in args[0]:
-                    df = state_data_gap
-                    pattern = re.compile(r'\d{4}-\d{2}-\d{2}')
-                    start_date, end_date = re.findall(pattern, args[0])
-                    return df[(df["date"] >= start_date) & (df["date"] <= end_date)]
-                else:
-                    return pd.DataFrame()
-
-            mock_read_gbq.side_effect = side_effect
+            mock_read_gbq.side_effect = local_read_gbq(state_data_gap)
             start_date = datetime.strptime(params_["patch"]["start_issue"], "%Y-%m-%d")
 
             patch(params_)
 
             patch_path = Path(f"{TEST_DIR}/{params_['patch']['patch_dir']}")
+            exported = {}
 
             for issue_dir in sorted(list(patch_path.iterdir())):
                 assert f'issue_{datetime.strftime(start_date, "%Y%m%d")}' == issue_dir.name
@@ -81,10 +74,14 @@ class TestPatchModule:
                 assert smoothed_dates == expected_smoothed_dates
                 assert raw_dates == expected_raw_dates
 
+                for f in Path(issue_dir, "google-symptoms").glob("*.csv"):
+                    exported[(issue_dir.name, f.name)] = pd.read_csv(f)
                 shutil.rmtree(issue_dir)
 
                 start_date += timedelta(days=1)
 
+            return exported, mock_read_gbq.call_count
+
     def test_patch_default(self, params_w_patch):
         params_w_patch["indicator"]["num_export_days"] = None
         self.mocked_patch(params_w_patch)
@@ -92,6 +89,26 @@ class TestPatchModule:
     def test_patch_date_set(self, params_w_patch):
         self.mocked_patch(params_w_patch)
 
+    def test_patch_pull_once(self, params_w_patch):
+        exported, n_queries = self.mocked_patch(copy.deepcopy(params_w_patch))
+        assert n_queries == 2 * 3
+
+        source_dir = Path(f"{TEST_DIR}/patch_source")
+        params_w_patch["patch"]["pull_once"] = True
+        params_w_patch["patch"]["source_dir"] = str(source_dir)
+        try:
+            exported_once, n_queries = self.mocked_patch(params_w_patch)
+            # One query per geo level for all issues
+            assert n_queries == 2
+            assert sorted(p.name for p in source_dir.iterdir()) == [
+                "county_2024-06-02_2024-06-24.parquet", "state_2024-06-02_2024-06-24.parquet"]
+        finally:
+            shutil.rmtree(source_dir, ignore_errors=True)
+
+        assert exported.keys() == exported_once.keys()
+        for key, df in exported.items():
+            pd.testing.assert_frame_equal(exported_once[key], df)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
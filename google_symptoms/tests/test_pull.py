@@ -4,13 +4,14 @@ from freezegun import freeze_time
 from datetime import date, datetime
 from google.api_core.exceptions import BadRequest, ServerError
 
+import numpy as np
 import pandas as pd
 from google.rpc import error_details_pb2
 from pandas.testing import assert_frame_equal
 
 from delphi_google_symptoms.pull import (
     pull_gs_data, preprocess, format_dates_for_query, pull_gs_data_one_geolevel)
-from delphi_google_symptoms.constants import METRICS, COMBINED_METRIC
+from delphi_google_symptoms.constants import METRICS, COMBINED_METRIC, SYMPTOM_SETS
 from conftest import TEST_DIR
 from delphi_utils import get_structured_logger
 
@@ -162,6 +163,22 @@ class TestPullGoogleSymptoms:
                 mock_read_gbq.side_effect = [badRequestException,pd.DataFrame()]
                 pull_gs_data_one_geolevel("state", ["", ""], self.logger)
 
+    def test_preprocess_combined_metrics(self):
+        """Combined metrics average their symptoms, counting missing ones as 0."""
+        df = pd.DataFrame(0.0, index=range(3), columns=keep_cols[2:])
+        df.insert(0, "open_covid_region_code", ["US-NY-36061", "US-AL-01001", "US-NY-36061"])
+        df.insert(1, "date", pd.to_datetime(["2020-08-01", "2020-08-01", "2020-08-03"]))
+        df["symptom_Cough"] = [2.0, np.nan, 1.0]
+        df["symptom_Phlegm"] = [1.0, np.nan, np.nan]
+        df.loc[1, [f"symptom_{m.replace(' ', '_')}" for m in SYMPTOM_SETS["s01"]]] = np.nan
+        out = preprocess(df, "county")
+
+        assert out["geo_id"].dtype == "category"
+        assert list(out["geo_id"]) == ["36061"] * 3 + ["01001"] * 3
+        assert list(out["timestamp"]) == list(pd.date_range("2020-08-01", "2020-08-03")) * 2
+        np.testing.assert_array_equal(out["s01"], [0.75, np.nan, 0.25, np.nan, np.nan, np.nan])
+        np.testing.assert_array_equal(out["s02"], [0, np.nan, 0, 0, np.nan, np.nan])
+
     def test_preprocess_no_data(self):
         output = preprocess(pd.DataFrame(columns=keep_cols), "state")
         expected = pd.DataFrame(columns=new_keep_cols)
@@ -9,7 +9,8 @@ import pytest
 import freezegun
 
 from conftest import TEST_DIR
-from delphi_google_symptoms.constants import COMBINED_METRIC, GEO_RESOLUTIONS
+from delphi_google_symptoms.constants import COMBINED_METRIC, GEO_RESOLUTIONS, SMOOTHERS, SMOOTHERS_MAP
+from delphi_google_symptoms.run import smooth_signals
 class TestRun:
     @pytest.mark.freeze_time("2020-08-15")
     def test_output_files_exist(self, run_as_module):
@@ -100,3 +101,47 @@ class TestRun:
                       suffixes=('_smoothed', '_raw'))
 
         assert np.allclose(df['val_smoothed'].values, df['val_raw'].values)
+
+    def test_smooth_signals(self):
+        """Smoothing all signals at once matches smoothing each geo and metric separately."""
+        np.random.seed(0)
+        n_days = 12
+        df = pd.DataFrame({
+            "geo_id": np.repeat(["a", "b", "c", "d"], n_days),
+            "timestamp": np.tile(pd.date_range("2020-08-01", periods=n_days), 4),
+        })
+        for metric in COMBINED_METRIC:
+            df[metric] = np.random.rand(len(df))
+        df.loc[df["geo_id"] == "b", COMBINED_METRIC[0]] = np.nan
+        df.loc[(df["geo_id"] == "c") & (df.index % n_days < 5), COMBINED_METRIC[1]] = np.nan
+        df.loc[(df["geo_id"] == "d") & (df.index % n_days < n_days - 1), COMBINED_METRIC[2]] = np.nan
+        df.loc[5, COMBINED_METRIC[3]] = np.nan
+        # Shorter series for one geo, in shuffled row order
+        df = df.drop(index=range(3 * n_days, 3 * n_days + 4)).sample(frac=1, random_state=0)
+        expected = df.copy()
+
+        signals = smooth_signals(df)
+
+        pd.testing.assert_frame_equal(df, expected)
+        for metric, smoother in product(COMBINED_METRIC, SMOOTHERS):
+            expected_val = df.groupby("geo_id")[metric].transform(SMOOTHERS_MAP[smoother][0].smooth)
+            pd.testing.assert_series_equal(signals[(metric, smoother)], expected_val,
+                                           check_names=False)
+
+    def test_smooth_signals_unequal_lengths(self):
+        """A geo shorter than the others isn't smoothed as if padded to their length."""
+        df = pd.DataFrame({
+            "geo_id": ["a"] * 3 + ["b"] * 10,
+            "timestamp": list(pd.date_range("2020-08-08", periods=3)) +
+                         list(pd.date_range("2020-08-01", periods=10)),
+        })
+        for metric in COMBINED_METRIC:
+            df[metric] = [np.nan, np.nan, 5.0] + list(np.arange(10.0))
+
+        signals = smooth_signals(df)
+
+        for metric in COMBINED_METRIC:
+            assert signals[(metric, "smoothed")].iloc[2] == 5.0
+            expected_val = df.groupby("geo_id")[metric].transform(SMOOTHERS_MAP["smoothed"][0].smooth)
+            pd.testing.assert_series_equal(signals[(metric, "smoothed")], expected_val,
+                                           check_names=False)
@@ -27,3 +27,7 @@ SMOOTHERS = [
     (Smoother("identity", impute_method=None), ""),
     (Smoother("moving_average", window_length=7), "_7dav"),
 ]
+
+# When the latest data is cached, date ranges of Epidata.covid_hosp ending within this many days
+# of the last requested day are still fetched on each run, since they are the most often revised
+REVISION_DAYS = 60
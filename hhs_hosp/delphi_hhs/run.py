@@ -4,18 +4,21 @@
 This module should contain a function called `run_module`, that is executed
 when the module is run with `python -m delphi_hhs`.
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
-from itertools import product
+from os import makedirs, replace
+from os.path import exists, getmtime, join
 
 import time
 from delphi_epidata import Epidata
 from delphi_utils.export import create_export_csv
 from delphi_utils.geomap import GeoMapper
+from delphi_utils.profiling import profile_stage
 from delphi_utils import get_structured_logger
 import numpy as np
 import pandas as pd
 
-from .constants import SIGNALS, GEOS, SMOOTHERS, CONFIRMED, SUM_CONF_SUSP, CONFIRMED_FLU
+from .constants import SIGNALS, GEOS, SMOOTHERS, CONFIRMED, SUM_CONF_SUSP, CONFIRMED_FLU, REVISION_DAYS
 
 def _date_to_int(d):
     """Return a date object as a yyyymmdd int."""
@@ -64,6 +67,120 @@ def generate_date_ranges(start, end):
     return output
 
 
+def _is_cached(cache_file, max_age):
+    """Return whether a range can be read from its cache file."""
+    return cache_file is not None and exists(cache_file) and \
+        (max_age is None or time.time() - getmtime(cache_file) < max_age.total_seconds())
+
+
+def fetch_range(request_all_states, date_range, epidata_params, last_range, cache_file=None, max_age=None):
+    """
+    Fetch one date range of Epidata.covid_hosp.
+
+    Parameters
+    ----------
+    request_all_states: str
+      Comma-separated states to request.
+    date_range: dict
+      Range generated by Epidata.range.
+    epidata_params: dict
+      Extra parameters to send to Epidata.covid_hosp.
+    last_range: bool
+      Whether this is the last range, which might only have recent days without any data.
+    cache_file: Optional[str]
+      Parquet file to read the range from if it exists, and to save it to otherwise.
+    max_age: Optional[timedelta]
+      Age after which the cache file is ignored, and the range fetched and saved again.
+
+    Returns
+    -------
+    pd.DataFrame of the range, or None if the last range has no results.
+    """
+    if _is_cached(cache_file, max_age):
+        return pd.read_parquet(cache_file)
+    response = Epidata.covid_hosp(request_all_states, date_range, **epidata_params)
+    # The last date range might only have recent days that don't have any data, so don't error.
+    if response["result"] != 1 and not last_range:
+        raise Exception(f"Bad result from Epidata for {date_range}: {response['message']}")
+    if response["result"] == -2 and last_range:  # -2 code means no results
+        return None
+    df = pd.DataFrame(response["epidata"])
+    if cache_file is not None:
+        # Write to a temporary file first, so an interrupted write isn't read as a cached range
+        df.to_parquet(f"{cache_file}.tmp", index=False)
+        replace(f"{cache_file}.tmp", cache_file)
+    return df
+
+
+def fetch_hosp_data(request_all_states, date_ranges, epidata_params, end_day, cache_dir=None, max_workers=4,
+                    latest_cache_max_age_days=0, logger=None):
+    """
+    Fetch the date ranges of Epidata.covid_hosp concurrently, using cached past ranges.
+
+    Ranges are cached by the `as_of` parameter. With a past `as_of`, every range ending before
+    it is immutable and cached. Otherwise the latest data is fetched, and nothing is immutable:
+    ranges are only cached if `latest_cache_max_age_days` is positive, in which case revisions
+    to ranges ending more than `REVISION_DAYS` before `end_day` are pulled up to that many days
+    late.
+
+    Parameters
+    ----------
+    request_all_states: str
+      Comma-separated states to request.
+    date_ranges: list
+      Ordered ranges generated by `generate_date_ranges`.
+    epidata_params: dict
+      Extra parameters to send to Epidata.covid_hosp.
+    end_day: date
+      Last day requested.
+    cache_dir: Optional[str]
+      Directory to cache past ranges in. If None, every range is fetched.
+    max_workers: int
+      Maximum number of concurrent requests.
+    latest_cache_max_age_days: int
+      Number of days to read cached ranges of the latest data for, if any.
+    logger: Optional[logging.Logger]
+      Logger to report the ranges read from the cache to.
+
+    Returns
+    -------
+    pd.DataFrame of all the ranges, in order.
+    """
+    as_of = epidata_params.get("as_of")
+    if as_of is not None and int(as_of) <= _date_to_int(end_day):
+        settled_before = int(as_of)
+        max_age = None
+    else:
+        # An as_of after end_day is in the future, and can't pin down the data either
+        settled_before = _date_to_int(end_day - timedelta(REVISION_DAYS))
+        max_age = timedelta(latest_cache_max_age_days)
+        if latest_cache_max_age_days <= 0:
+            cache_dir = None
+    range_cache_dir = join(cache_dir, str(as_of or "latest")) if cache_dir else None
+    if range_cache_dir:
+        makedirs(range_cache_dir, exist_ok=True)
+
+    cache_files = []
+    for i, date_range in enumerate(date_ranges):
+        if range_cache_dir and i < len(date_ranges) - 1 and date_range["to"] < settled_before:
+            cache_files.append(join(range_cache_dir, f"{date_range['from']}_{date_range['to']}.parquet"))
+        else:
+            cache_files.append(None)
+    num_cached = sum(_is_cached(cache_file, max_age) for cache_file in cache_files)
+    if logger and num_cached:
+        logger.info("Reading date ranges from the cache", num_ranges=num_cached,
+                    cache_dir=range_cache_dir, max_age_days=None if max_age is None else max_age.days)
+
+    def fetch(i):
+        last_range = i == len(date_ranges) - 1
+        return fetch_range(request_all_states, date_ranges[i], epidata_params, last_range, cache_files[i], max_age)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map returns the ranges in the order they were requested
+        dfs = [df for df in executor.map(fetch, range(len(date_ranges))) if df is not None]
+    return pd.concat(dfs)
+
+
 def run_module(params):
     """
     Generate ground truth HHS hospitalization data.
@@ -76,6 +193,12 @@ def run_module(params):
             - "export_dir": str, directory to write output
             - "log_filename" (optional): str, name of file to write logs
             - "epidata" (optional): dict, extra parameters to send to Epidata.covid_hosp
+            - "input_cache_dir" (optional): str, directory to cache past date ranges of
+              Epidata.covid_hosp in
+            - "max_workers" (optional): int, maximum number of concurrent Epidata requests
+            - "latest_cache_max_age_days" (optional): int, without an `as_of`, number of days
+              to read date ranges older than REVISION_DAYS from the cache for. Revisions to
+              them are published up to that many days late. 0 by default, not caching them.
         - "validation":
             - "common":
                 - "api_credentials": str, api key to prevent hitting max number of query limit.
@@ -98,25 +221,15 @@ def run_module(params):
         )
     past_reference_day = date(year=2020, month=1, day=1)  # first available date in DB
     date_range = generate_date_ranges(past_reference_day, end_day)
-    dfs = []
-    for r in date_range:
-        response = Epidata.covid_hosp(request_all_states, r, **params["common"].get("epidata", {}))
-        # The last date range might only have recent days that don't have any data, so don't error.
-        if response["result"] != 1 and r != date_range[-1]:
-            raise Exception(f"Bad result from Epidata for {r}: {response['message']}")
-        if response["result"] == -2 and r == date_range[-1]:  # -2 code means no results
-            continue
-        dfs.append(pd.DataFrame(response['epidata']))
-    all_columns = pd.concat(dfs)
-    geo_mapper = GeoMapper()
+    all_columns = fetch_hosp_data(request_all_states, date_range, params["common"].get("epidata", {}), end_day,
+                                  params["common"].get("input_cache_dir"), params["common"].get("max_workers", 4),
+                                  params["common"].get("latest_cache_max_age_days", 0), logger)
     stats = []
-    for sensor, smoother, geo in product(SIGNALS, SMOOTHERS, GEOS):
+    for sensor, smoother, geo, df in generate_signals(all_columns, mapper):
         logger.info("Generating signal and exporting to CSV",
                     geo_res = geo,
                     sensor = sensor,
                     smoother = smoother)
-        df = make_signal(all_columns, sensor)
-        df = transform_signal(sensor, smoother, geo, df, geo_mapper)
         if df.empty:
             continue
         sensor_name = sensor + smoother[1]
@@ -150,6 +263,16 @@ def smooth_values(df, smoother):
     )
     return df
 
+def smooth_signal(sensor, smoother, geo, df):
+    """Smooth a geo-mapped signal, and drop values that shouldn't be exported."""
+    df = smooth_values(df, smoother[0])
+    # Fix N/A MA values, see issue #1360
+    if geo == "state" and sensor.startswith(CONFIRMED_FLU):
+        ma_filter = df.val.isna() & (df.geo_id == "ma") & (df.timestamp > "08-01-2021") & \
+            (df.timestamp.dt.day_name() == "Tuesday")
+        df = df[~ma_filter]
+    return df
+
 def transform_signal(sensor, smoother, geo, df, geo_mapper):
     """Transform base df into specified geo/smoothing/prop configuration."""
     df = geo_mapper.add_geocode(df, "state_id", "state_code", from_col="state")
@@ -163,13 +286,49 @@ def transform_signal(sensor, smoother, geo, df, geo_mapper):
     if sensor.endswith("_prop"):
         df["val"]=round(df["val"]/df["population"]*100000, 7)
         df.drop("population", axis=1, inplace=True)
-    df = smooth_values(df, smoother[0])
-    # Fix N/A MA values, see issue #1360
-    if geo == "state" and sensor.startswith(CONFIRMED_FLU):
-        ma_filter = df.val.isna() & (df.geo_id == "ma") & (df.timestamp > "08-01-2021") & \
-            (df.timestamp.dt.day_name() == "Tuesday")
-        df = df[~ma_filter]
-    return df
+    return smooth_signal(sensor, smoother, geo, df)
+
+def generate_signals(all_columns, geo_mapper):
+    """Generate every signal, smoother and geo of the product, computing each intermediate once.
+
+    This gives the same frames as `transform_signal` on `make_signal`, but shares their steps:
+    the states and dates are converted and geocoded once, and the base signals summed once,
+    with each proportion sharing the base signal of its count. For each geo, the counts are
+    mapped once, and so are the counts with their population, since states without a
+    population are left out of proportions. Both smoothers start from the same mapped frame.
+    The mapping of each geo and the computation of each of its signals are profiled as
+    "aggregate" and "compute" stages.
+
+    Yields
+    ------
+    Tuples of (sensor, smoother, geo, df) over `product(SIGNALS, SMOOTHERS, GEOS)`, by geo.
+    """
+    base_signals = list(dict.fromkeys(_base_signal(sensor) for sensor in SIGNALS))
+    counts = make_signal_keys(all_columns)
+    for base in base_signals:
+        counts[base] = signal_values(all_columns, base)
+    counts = geo_mapper.add_geocode(counts, "state_id", "state_code", from_col="state")
+    # sum admission counts *and* population counts during make_geo
+    props = geo_mapper.add_population_column(counts, "state_code")
+    for geo in GEOS:
+        with profile_stage("aggregate", geo=geo) as stage:
+            mapped_counts = make_geo(counts, geo, geo_mapper)
+            mapped_props = make_geo(props, geo, geo_mapper)
+            stage.add_rows(len(mapped_counts))
+        for sensor in SIGNALS:
+            base = _base_signal(sensor)
+            for smoother in SMOOTHERS:
+                # Each stage ends before the yield, so it doesn't time the caller's export
+                with profile_stage("compute", geo=geo, signal=sensor + smoother[1]) as stage:
+                    if sensor.endswith("_prop"):
+                        signal = mapped_props[["geo_id", "timestamp", "se", "sample_size"]].copy()
+                        signal["val"] = round(mapped_props[base]/mapped_props["population"]*100000, 7)
+                    else:
+                        signal = mapped_counts[["geo_id", "timestamp", "se", "sample_size"]].copy()
+                        signal["val"] = mapped_counts[base]
+                    signal = smooth_signal(sensor, smoother, geo, signal)
+                    stage.add_rows(len(signal))
+                yield sensor, smoother, geo, signal
 
 def make_geo(state, geo, geo_mapper):
     """Transform incoming geo (state) to another geo."""
@@ -183,38 +342,42 @@ def make_geo(state, geo, geo_mapper):
     return exported
 
 
-def make_signal(all_columns, sig):
+def _base_signal(sig):
+    """Return the name of the count signal a signal is derived from."""
+    return sig[:-len("_prop")] if sig.endswith("_prop") else sig
+
+
+def make_signal_keys(all_columns):
+    """Generate the lowercase state and timestamp of each row."""
+    return pd.DataFrame({
+        "state": all_columns.state.apply(str.lower),
+        "timestamp":int_date_to_previous_day_datetime(all_columns.date),
+    })
+
+
+def signal_values(all_columns, sig):
     """Generate column sums according to signal name."""
     assert sig in SIGNALS, f"Unexpected signal name '{sig}';" + \
         " familiar names are '{', '.join(SIGNALS)}'"
     if sig.startswith(CONFIRMED):
-        df = pd.DataFrame({
-            "state": all_columns.state.apply(str.lower),
-            "timestamp":int_date_to_previous_day_datetime(all_columns.date),
-            "val": \
-            all_columns.previous_day_admission_adult_covid_confirmed + \
+        val = all_columns.previous_day_admission_adult_covid_confirmed + \
             all_columns.previous_day_admission_pediatric_covid_confirmed
-        })
     elif sig.startswith(SUM_CONF_SUSP):
-        df = pd.DataFrame({
-            "state": all_columns.state.apply(str.lower),
-            "timestamp":int_date_to_previous_day_datetime(all_columns.date),
-            "val": \
-            all_columns.previous_day_admission_adult_covid_confirmed + \
+        val = all_columns.previous_day_admission_adult_covid_confirmed + \
             all_columns.previous_day_admission_adult_covid_suspected + \
             all_columns.previous_day_admission_pediatric_covid_confirmed + \
-            all_columns.previous_day_admission_pediatric_covid_suspected,
-        })
+            all_columns.previous_day_admission_pediatric_covid_suspected
     elif sig.startswith(CONFIRMED_FLU):
-        df = pd.DataFrame({
-            "state": all_columns.state.apply(str.lower),
-            "timestamp":int_date_to_previous_day_datetime(all_columns.date),
-            "val": \
-            all_columns.previous_day_admission_influenza_confirmed
-        })
+        val = all_columns.previous_day_admission_influenza_confirmed
     else:
         raise Exception(
             "Bad programmer: signal '{sig}' in SIGNALS but not handled in make_signal"
         )
-    df["val"] = df.val.astype(float)
+    return val.astype(float)
+
+
+def make_signal(all_columns, sig):
+    """Generate column sums according to signal name."""
+    df = make_signal_keys(all_columns)
+    df["val"] = signal_values(all_columns, sig)
     return df
@@ -1,11 +1,13 @@
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from itertools import product
 import json
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 import tempfile
 import os
+import time
 
 from delphi_hhs.run import _date_to_int, int_date_to_previous_day_datetime, generate_date_ranges, \
-    make_signal, make_geo, run_module, transform_signal
+    make_signal, make_geo, run_module, transform_signal, fetch_hosp_data, generate_signals
 from delphi_hhs.constants import SMOOTHERS, GEOS, SIGNALS, \
     CONFIRMED, SUM_CONF_SUSP, CONFIRMED_FLU, CONFIRMED_PROP, SUM_CONF_SUSP_PROP, CONFIRMED_FLU_PROP
 from delphi_utils.geomap import GeoMapper
@@ -175,6 +177,23 @@ def test_make_geo():
             pd.testing.assert_series_equal(expected[series], result[series], obj=f"{geo}:{series}")
 
 
+def test_generate_signals():
+    """Check that sharing intermediates gives the same signals as transforming each one."""
+    with open("test_response.json", "r") as f:
+        all_columns = pd.DataFrame(json.load(f)["epidata"])
+    geo_mapper = GeoMapper()
+    with patch.object(geo_mapper, "replace_geocode", wraps=geo_mapper.replace_geocode) as replace_geocode:
+        signals = list(generate_signals(all_columns, geo_mapper))
+    # counts and proportions are each mapped once per geo
+    assert replace_geocode.call_count == 2 * (len(GEOS) - 1)
+    assert [tuple(key) for *key, _ in signals] == \
+        [(sensor, smoother, geo) for geo, sensor, smoother in product(GEOS, SIGNALS, SMOOTHERS)]
+    for sensor, smoother, geo, df in signals:
+        expected = transform_signal(sensor, smoother, geo, make_signal(all_columns, sensor), geo_mapper)
+        pd.testing.assert_frame_equal(df[expected.columns].reset_index(drop=True),
+                                      expected.reset_index(drop=True), obj=f"{sensor}{smoother[1]} {geo}")
+
+
 @freeze_time("2020-01-01")
 @patch("delphi_epidata.Epidata.covid_hosp")
 def test_output_files(mock_covid_hosp):
@@ -203,7 +222,8 @@ def test_output_files(mock_covid_hosp):
 @patch("delphi_hhs.run.create_export_csv")
 @patch("delphi_epidata.Epidata.covid_hosp")
 def test_ignore_last_range_no_results(mock_covid_hosp, mock_export):
-    mock_covid_hosp.side_effect = [
+    # Ranges are requested concurrently, so answer by range rather than in call order
+    mock_covid_hosp.side_effect = lambda states, date_range, **kwargs: \
         {"result": 1,
          "epidata":
              {"state": ["placeholder"],
@@ -214,9 +234,7 @@ def test_ignore_last_range_no_results(mock_covid_hosp, mock_export):
               "previous_day_admission_pediatric_covid_suspected": [0],
               "previous_day_admission_influenza_confirmed": [0]
               }
-         },
-        {"result": -2, "message": "no results"}
-    ]
+         } if date_range["from"] == 20200101 else {"result": -2, "message": "no results"}
     mock_export.return_value = None
     params = {
         "common": {
@@ -230,3 +248,75 @@ def test_ignore_last_range_no_results(mock_covid_hosp, mock_export):
             }
     }
     assert not run_module(params)  # function should not raise value error and has no return value
+
+
+def stub_covid_hosp(states, date_range, **kwargs):
+    """Answer with one row per range, dated at its start."""
+    return {"result": 1, "epidata": [{"state": "PA", "date": date_range["from"], "issue": 20200601}]}
+
+
+@patch("delphi_epidata.Epidata.covid_hosp", side_effect=stub_covid_hosp)
+def test_fetch_hosp_data(mock_covid_hosp):
+    """Check that ranges are fetched in order, and past ranges cached by as_of."""
+    date_ranges = generate_date_ranges(date(2020, 1, 1), date(2020, 5, 12))
+    starts = [r["from"] for r in date_ranges]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Every range before as_of is immutable, so only the last one is fetched again
+        for _ in range(2):
+            df = fetch_hosp_data("pa", date_ranges, {"as_of": 20200512}, date(2020, 5, 12), tmpdir)
+            assert list(df.date) == starts
+        assert mock_covid_hosp.call_count == 5 + 1
+        assert mock_covid_hosp.call_args.kwargs == {"as_of": 20200512}
+        assert len(os.listdir(os.path.join(tmpdir, "20200512"))) == 4
+
+        # Without as_of, nothing is immutable, so the latest data isn't cached by default
+        mock_covid_hosp.reset_mock()
+        for _ in range(2):
+            df = fetch_hosp_data("pa", date_ranges, {}, date(2020, 5, 12), tmpdir, max_workers=2)
+            assert list(df.date) == starts
+        assert mock_covid_hosp.call_count == 5 + 5
+        assert not os.path.exists(os.path.join(tmpdir, "latest"))
+
+        # Unless opted in, with ranges that may still be revised fetched again
+        mock_covid_hosp.reset_mock()
+        logger = Mock()
+        for _ in range(2):
+            df = fetch_hosp_data("pa", date_ranges, {}, date(2020, 5, 12), tmpdir, max_workers=2,
+                                 latest_cache_max_age_days=7, logger=logger)
+            assert list(df.date) == starts
+        assert mock_covid_hosp.call_count == 5 + 3
+        assert sorted(os.listdir(os.path.join(tmpdir, "latest"))) == \
+            ["20200101_20200131.parquet", "20200201_20200302.parquet"]
+        logger.info.assert_called_once_with("Reading date ranges from the cache", num_ranges=2,
+                                            cache_dir=os.path.join(tmpdir, "latest"), max_age_days=7)
+
+        # Cached ranges of the latest data expire, to pull revisions to older ranges
+        mock_covid_hosp.reset_mock()
+        expired = time.time() - timedelta(8).total_seconds()
+        os.utime(os.path.join(tmpdir, "latest", "20200101_20200131.parquet"), (expired, expired))
+        fetch_hosp_data("pa", date_ranges, {}, date(2020, 5, 12), tmpdir, latest_cache_max_age_days=7)
+        assert mock_covid_hosp.call_count == 1 + 3
+        # Ranges pinned by as_of never expire
+        mock_covid_hosp.reset_mock()
+        for name in os.listdir(os.path.join(tmpdir, "20200512")):
+            os.utime(os.path.join(tmpdir, "20200512", name), (expired, expired))
+        fetch_hosp_data("pa", date_ranges, {"as_of": 20200512}, date(2020, 5, 12), tmpdir)
+        assert mock_covid_hosp.call_count == 1
+
+    # Without a cache, every range is fetched
+    mock_covid_hosp.reset_mock()
+    fetch_hosp_data("pa", date_ranges, {}, date(2020, 5, 12))
+    assert mock_covid_hosp.call_count == 5
+
+
+@patch("delphi_epidata.Epidata.covid_hosp")
+def test_fetch_hosp_data_bad_result(mock_covid_hosp):
+    """Check that a bad result for a past range isn't cached, and raises."""
+    mock_covid_hosp.side_effect = lambda states, date_range, **kwargs: \
+        {"result": -1, "message": "error"} if date_range["from"] == 20200201 else \
+        stub_covid_hosp(states, date_range)
+    date_ranges = generate_date_ranges(date(2020, 1, 1), date(2020, 5, 12))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with pytest.raises(Exception, match="Bad result from Epidata"):
+            fetch_hosp_data("pa", date_ranges, {"as_of": 20200512}, date(2020, 5, 12), tmpdir)
+        assert "20200201_20200302.parquet" not in os.listdir(os.path.join(tmpdir, "20200512"))
@@ -30,3 +30,6 @@ INCIDENCE_BASE = 100000
 # construct detailed error reports
 # (https://www.python.org/dev/peps/pep-0498/#escape-sequences)
 NEWLINE = "\n"
+
+# Days of the week (Monday is 0) on which the daily exports are also published
+PUBLISH_WEEKDAYS = {0, 3}
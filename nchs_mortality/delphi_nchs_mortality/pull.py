@@ -6,9 +6,8 @@ from typing import Optional
 
 import numpy as np
 import pandas as pd
-from delphi_utils import create_backup_csv
+from delphi_utils import create_backup_csv, fetch_socrata, get_backup_file
 from delphi_utils.geomap import GeoMapper
-from sodapy import Socrata
 
 from .constants import METRICS, NEWLINE, RENAME
 
@@ -30,6 +29,7 @@ def pull_nchs_mortality_data(
     custom_run: bool,
     logger: Optional[logging.Logger] = None,
     test_file: Optional[str] = None,
+    snapshot_dir: Optional[str] = None,
 ):
     """Pull the latest NCHS Mortality data, and conforms it into a dataset.
 
@@ -54,6 +54,8 @@ def pull_nchs_mortality_data(
         Flag indicating if the current run is a patch. If so, don't save any data to disk
     test_file: Optional[str]
         When not null, name of file from which to read test data
+    snapshot_dir: Optional[str]
+        Directory to keep a snapshot of the dataset in, so only rows updated since the last pull are pulled
 
     Returns
     -------
@@ -67,13 +69,13 @@ def pull_nchs_mortality_data(
 
     if test_file:
         df = pd.read_csv("./test_data/%s"%test_file)
+        create_backup_csv(df, backup_dir, custom_run=custom_run, logger=logger)
     else:
-        # Pull data from Socrata API
-        client = Socrata("data.cdc.gov", socrata_token)
-        results = client.get("r8kw-7aab", limit=10**10)
-        df = pd.DataFrame.from_records(results)
-
-    create_backup_csv(df, backup_dir, custom_run=custom_run, logger=logger)
+        # Pull data from Socrata API, streaming it to the parquet backup
+        parquet_file = None if custom_run else f"{get_backup_file(backup_dir)}.parquet"
+        df = fetch_socrata("r8kw-7aab", socrata_token, snapshot_dir=snapshot_dir,
+                           parquet_file=parquet_file, logger=logger)
+        create_backup_csv(df, backup_dir, custom_run=custom_run, logger=logger, parquet=False)
 
     if not test_file:
         # drop "By Total" rows
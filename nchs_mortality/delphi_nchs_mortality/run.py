@@ -9,11 +9,11 @@ from datetime import datetime, date, timedelta
 from typing import Dict, Any
 
 import numpy as np
-from delphi_utils import S3ArchiveDiffer, get_structured_logger, create_export_csv, Nans
+from delphi_utils import ExportPlan, S3ArchiveDiffer, get_export_plan_dir, get_structured_logger, create_export_csv, Nans
 
 from .archive_diffs import arch_diffs
 from .constants import (METRICS, SENSOR_NAME_MAP,
-                        SENSORS, INCIDENCE_BASE)
+                        SENSORS, INCIDENCE_BASE, PUBLISH_WEEKDAYS)
 from .pull import pull_nchs_mortality_data
 
 
@@ -43,6 +43,12 @@ def run_module(params: Dict[str, Any]):
         - "static_file_dir": str, directory containing population csv files
         - "test_file" (optional): str, name of file from which to read test data
         - "socrata_token": str, authentication for upstream data pull
+        - "socrata_snapshot_dir" (optional): str, directory to keep a snapshot of the source
+            dataset in, so that only rows updated since the previous run are pulled
+        - "export_plan_dir" (optional): str, directory to keep hashes of the pulled rows in,
+            so that only dates whose rows changed since the previous run are exported. Ignored
+            when validation isn't a dry run; see `delphi_utils.export_plan`.. All
+            dates are still exported on the days they are published.
     - "archive" (optional): if provided, output will be archived with S3
         - "aws_credentials": Dict[str, str], AWS login credentials (see S3 documentation)
         - "bucket_name: str, name of S3 bucket to read/write
@@ -73,8 +79,17 @@ def run_module(params: Dict[str, Any]):
 
     stats = []
     df_pull = pull_nchs_mortality_data(
-        socrata_token, backup_dir, custom_run=custom_run, test_file=test_file, logger=logger
+        socrata_token, backup_dir, custom_run=custom_run, test_file=test_file, logger=logger,
+        snapshot_dir=params["indicator"].get("socrata_snapshot_dir")
     )
+    export_plan = ExportPlan(
+        df_pull, get_export_plan_dir(params, logger),
+        "nchs_mortality", ["geo_id"],
+        output_config={"metrics": METRICS, "sensors": SENSORS,
+                       "export_start_date": params["indicator"]["export_start_date"]},
+        logger=logger)
+    # The weekly publication copies today's exports only, so they must cover every date
+    only_dates = None if date.today().weekday() in PUBLISH_WEEKDAYS else export_plan.dates
     for metric in METRICS:
         for geo in ["state", "nation"]:
             if metric == 'percent_of_expected_deaths':
@@ -95,7 +110,8 @@ def run_module(params: Dict[str, Any]):
                     export_dir=daily_export_dir,
                     start_date=datetime.strptime(export_start_date, "%Y-%m-%d"),
                     sensor=SENSOR_NAME_MAP[metric],
-                    weekly_dates=True
+                    weekly_dates=True,
+                    only_dates=only_dates
                 )
             else:
                 for sensor in SENSORS:
@@ -120,7 +136,8 @@ def run_module(params: Dict[str, Any]):
                         export_dir=daily_export_dir,
                         start_date=datetime.strptime(export_start_date, "%Y-%m-%d"),
                         sensor=sensor_name,
-                        weekly_dates=True
+                        weekly_dates=True,
+                        only_dates=only_dates
                     )
             if len(dates) > 0:
                 stats.append((max(dates), len(dates)))
@@ -133,6 +150,7 @@ def run_module(params: Dict[str, Any]):
 #     - Does not export any issues into receiving
     if "archive" in params:
         arch_diffs(params, daily_arch_diff, logger)
+    export_plan.save()
 
     elapsed_time_in_seconds = round(time.time() - start_time, 2)
     min_max_date = stats and min(s[0] for s in stats)
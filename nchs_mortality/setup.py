@@ -15,7 +15,6 @@ required = [
     "pylint==2.8.3",
     "pytest-cov",
     "pytest",
-    "sodapy",
 ]
 
 setup(
@@ -40,6 +40,14 @@ TYPE_DICT = {
     NUM_HOSP_REPORTING_RSV: float,
 }
 
+# types of the columns from socrata used above, applied as the rows are pulled;
+# both datasets share these columns
+SOURCE_TYPE_DICT = {
+    "weekendingdate": "datetime64[ns]",
+    "jurisdiction": str,
+    **{col_name: float for col_name in SIGNALS_MAP.values()},
+}
+
 # signal mapping for secondary, preliminary source
 # made copy incase things would diverge
 
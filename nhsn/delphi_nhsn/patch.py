@@ -11,21 +11,26 @@ To use this module, you need to specify the range of issue dates in params.json,
     ...
   },
   "patch": {
-    "patch_dir": "/Users/minhkhuele/Desktop/delphi/covidcast-indicators/nhsn/patch"
+    "patch_dir": "/Users/minhkhuele/Desktop/delphi/covidcast-indicators/nhsn/patch",
+    "max_workers": 4
   }
 }
 
 It will generate data for the range of issue dates corresponding to source data files available in "backup_dir"
 specified under "common", and store them in batch issue format under "patch_dir":
 [name-of-patch]/issue_[issue-date]/nhsn/actual_data_file.csv
+
+Issues whose directory already exists are skipped, so an interrupted patch can be resumed by
+running it again.
 """
 
 from datetime import datetime
+from functools import partial
 from os import makedirs
 from pathlib import Path
 from typing import List
 
-from delphi_utils import get_structured_logger, read_params
+from delphi_utils import get_structured_logger, read_params, run_patch
 from epiweeks import Week
 
 from .run import run_module
@@ -56,6 +61,16 @@ def filter_source_files(source_files: List[Path]):
     return filtered_patch_list
 
 
+def run_issue(params, issue_date, export_dir, logger):
+    """Run the nhsn indicator for one issue date, from the source data file of that date."""
+    # regardless of week date type or not the directory name must be issue_date_YYYYMMDD
+    # conversion in done in acquisition
+    params["patch"]["issue_date"] = issue_date.strftime("%Y%m%d")
+    params["common"]["export_dir"] = export_dir
+    params["common"]["custom_run"] = True
+    run_module(params, logger)
+
+
 def patch(params):
     """
     Run the doctor visits indicator for a range of issue dates.
@@ -63,6 +78,7 @@ def patch(params):
     The range of issue dates is specified in params.json using the following keys:
     - "patch": Only used for patching data
         - "patch_dir": str, directory to write all issues output
+        - "max_workers" (optional): int, number of issues to run in parallel, default 1
     """
     logger = get_structured_logger("delphi_nhsn.patch", filename=params["common"]["log_filename"])
 
@@ -77,17 +93,15 @@ def patch(params):
     )
 
     patch_list = filter_source_files(source_files)
-    for file in patch_list:
-        issue_date_str = file.name.split(".")[0]
-        logger.info("Running issue", issue_date=datetime.strptime(issue_date_str, "%Y%m%d").strftime("%Y-%m-%d"))
-        params["patch"]["issue_date"] = issue_date_str
-        # regardless of week date type or not the directory name must be issue_date_YYYYMMDD
-        # conversion in done in acquisition
-        current_issue_dir = f"{params['patch']['patch_dir']}/issue_{issue_date_str}/nhsn"
-        makedirs(current_issue_dir, exist_ok=True)
-        params["common"]["export_dir"] = current_issue_dir
-        params["common"]["custom_run"] = True
-        run_module(params, logger)
+    issue_dates = [datetime.strptime(file.name.split(".")[0], "%Y%m%d") for file in patch_list]
+    run_patch(
+        issue_dates,
+        partial(run_issue, params),
+        params["patch"]["patch_dir"],
+        "nhsn",
+        logger,
+        params["patch"].get("max_workers", 1),
+    )
 
 
 if __name__ == "__main__":
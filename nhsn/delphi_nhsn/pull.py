@@ -2,18 +2,23 @@
 """Functions for pulling NSSP ER data."""
 import copy
 import logging
-import random
-import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
-from urllib.error import HTTPError
 
 import pandas as pd
-from delphi_utils import create_backup_csv
+from delphi_utils import create_backup_csv, fetch_socrata, get_backup_file
 from sodapy import Socrata
 
-from .constants import MAIN_DATASET_ID, PRELIM_DATASET_ID, PRELIM_SIGNALS_MAP, PRELIM_TYPE_DICT, SIGNALS_MAP, TYPE_DICT
+from .constants import (
+    MAIN_DATASET_ID,
+    PRELIM_DATASET_ID,
+    PRELIM_SIGNALS_MAP,
+    PRELIM_TYPE_DICT,
+    SIGNALS_MAP,
+    SOURCE_TYPE_DICT,
+    TYPE_DICT,
+)
 
 
 def check_last_updated(socrata_token, dataset_id, logger):
@@ -55,38 +60,30 @@ def check_last_updated(socrata_token, dataset_id, logger):
         raise
 
 
-def pull_data(socrata_token: str, dataset_id: str, backup_dir: str, logger):
-    """Pull data from Socrata API."""
-    client = Socrata("data.cdc.gov", socrata_token)
+def pull_data(socrata_token: str, dataset_id: str, backup_dir: str, logger, snapshot_dir: Optional[str] = None):
+    """Pull data from Socrata API, keeping a snapshot of the dataset in `snapshot_dir` if provided.
+
+    The rows are typed and streamed to the parquet backup as they are pulled.
+    """
     logger.info(
         f"Pulling {'main' if dataset_id == MAIN_DATASET_ID else 'preliminary'} data from Socrata API",
         dataset_id=dataset_id,
     )
-    results = []
-    offset = 0
-    limit = 50000  # maximum limit allowed by SODA 2.0
-    # retry logic for 500 error
-    try:
-        page = client.get(dataset_id, limit=limit, offset=offset)
-    except HTTPError as err:
-        if err.code == 503:
-            time.sleep(2 + random.randint(0, 1000) / 1000.0)
-            page = client.get(dataset_id, limit=limit, offset=offset)
-        else:
-            logger.info("Error pulling data from Socrata API", error=str(err))
-            raise err
-
-    while len(page) > 0:
-        results.extend(page)
-        offset += limit
-        page = client.get(dataset_id, limit=limit, offset=offset)
-
-    if results:
-        df = pd.DataFrame.from_records(results)
-        sensor = "prelim" if dataset_id == PRELIM_DATASET_ID else None
-        create_backup_csv(df, backup_dir, False, sensor=sensor, logger=logger)
-    else:
-        df = pd.DataFrame()
+    sensor = "prelim" if dataset_id == PRELIM_DATASET_ID else None
+    backup_file = get_backup_file(backup_dir, sensor=sensor)
+    df = fetch_socrata(
+        dataset_id,
+        socrata_token,
+        type_dict=SOURCE_TYPE_DICT,
+        # Signal columns may be missing, see `pull_nhsn_data`
+        strict_types=False,
+        snapshot_dir=snapshot_dir,
+        parquet_file=f"{backup_file}.parquet",
+        logger=logger,
+    )
+
+    if not df.empty:
+        create_backup_csv(df, backup_dir, False, sensor=sensor, logger=logger, parquet=False)
     return df
 
 
@@ -126,6 +123,7 @@ def pull_nhsn_data(
     issue_date: Optional[str],
     preliminary: bool = False,
     logger: Optional[logging.Logger] = None,
+    snapshot_dir: Optional[str] = None,
 ):
     """Pull the latest NHSN hospital admission data, and conforms it into a dataset.
 
@@ -148,6 +146,8 @@ def pull_nhsn_data(
         date to indicate which backup file to pull for patching
     logger: Optional[logging.Logger]
         logger object
+    snapshot_dir: Optional[str]
+        Directory to keep a snapshot of the dataset in, so only rows updated since the last pull are pulled
 
     Returns
     -------
@@ -157,7 +157,7 @@ def pull_nhsn_data(
     dataset_id = PRELIM_DATASET_ID if preliminary else MAIN_DATASET_ID
     # Pull data from Socrata API
     df = (
-        pull_data(socrata_token, dataset_id, backup_dir, logger)
+        pull_data(socrata_token, dataset_id, backup_dir, logger, snapshot_dir)
         if not custom_run
         else pull_data_from_file(backup_dir, issue_date, logger, prelim_flag=preliminary)
     )
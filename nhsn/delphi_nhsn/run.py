@@ -12,6 +12,9 @@ the following structure:
         - "wip_signal": (optional) Any[str, bool], list of signals that are works in progress, or
             True if all signals in the registry are works in progress, or False if only
             unpublished signals are.  See `delphi_utils.add_prefix()`
+        - "export_plan_dir" (optional): str, directory to keep hashes of the pulled rows in,
+            so that only dates whose rows changed since the previous run are exported. Ignored
+            when validation isn't a dry run; see `delphi_utils.export_plan`.
         - Any other indicator-specific settings
 """
 import re
@@ -20,8 +23,9 @@ from datetime import date, datetime, timedelta
 from itertools import product
 
 import numpy as np
-from delphi_utils import GeoMapper, get_structured_logger
+from delphi_utils import ExportPlan, GeoMapper, get_export_plan_dir, get_structured_logger
 from delphi_utils.export import create_export_csv
+from delphi_utils.profiling import profile_stage
 
 from .constants import GEOS, PRELIM_SIGNALS_MAP, SIGNALS_MAP
 from .pull import pull_nhsn_data
@@ -55,43 +59,78 @@ def run_module(params, logger=None):
         export_start_date = date.today() - timedelta(days=date.today().weekday() + 2)
         export_start_date = export_start_date.strftime("%Y-%m-%d")
 
-    nhsn_df = pull_nhsn_data(socrata_token, backup_dir, custom_run=custom_run, issue_date=issue_date, logger=logger)
+    snapshot_dir = params["indicator"].get("socrata_snapshot_dir")
+    nhsn_df = pull_nhsn_data(
+        socrata_token, backup_dir, custom_run=custom_run, issue_date=issue_date, logger=logger, snapshot_dir=snapshot_dir
+    )
     preliminary_nhsn_df = pull_nhsn_data(
-        socrata_token, backup_dir, custom_run=custom_run, issue_date=issue_date, logger=logger, preliminary=True
+        socrata_token,
+        backup_dir,
+        custom_run=custom_run,
+        issue_date=issue_date,
+        logger=logger,
+        preliminary=True,
+        snapshot_dir=snapshot_dir,
     )
 
+    # Datasets that weren't pulled, e.g. because they are stale, keep their previous hashes
+    plan_dir = get_export_plan_dir(params, logger)
+    export_plans = {
+        name: ExportPlan(
+            df_pull,
+            plan_dir if not df_pull.empty else None,
+            name,
+            ["geo_id"],
+            output_config={
+                "signals": list(signals_map.items()),
+                "geos": GEOS,
+                "export_start_date": params["indicator"]["export_start_date"],
+            },
+            logger=logger,
+        )
+        for name, df_pull, signals_map in [
+            ("nhsn", nhsn_df, SIGNALS_MAP),
+            ("nhsn_prelim", preliminary_nhsn_df, PRELIM_SIGNALS_MAP),
+        ]
+    }
+
     geo_mapper = GeoMapper()
     signal_df_dict = dict()
+    signal_plans = dict()
     if not nhsn_df.empty:
         signal_df_dict.update({signal: nhsn_df for signal in SIGNALS_MAP})
+        signal_plans.update({signal: export_plans["nhsn"] for signal in SIGNALS_MAP})
     # some of the source backups do not include for preliminary data
     if not preliminary_nhsn_df.empty:
         signal_df_dict.update({signal: preliminary_nhsn_df for signal in PRELIM_SIGNALS_MAP})
+        signal_plans.update({signal: export_plans["nhsn_prelim"] for signal in PRELIM_SIGNALS_MAP})
 
     for geo, signals_df in product(GEOS, signal_df_dict.items()):
         signal, df_pull = signals_df
         df = df_pull.copy()
         try:
-            df = df[["timestamp", "geo_id", signal]]
-            df.rename({signal: "val"}, axis=1, inplace=True)
-
-            if geo == "nation":
-                df = df[df["geo_id"] == "us"]
-            elif geo == "hhs":
-                df = df[df["geo_id"] != "us"]
-                df = df[df["geo_id"].str.len() == 2]
-                df.rename(columns={"geo_id": "state_id"}, inplace=True)
-                df = geo_mapper.add_geocode(df, "state_id", "state_code", from_col="state_id")
-                df = geo_mapper.add_geocode(df, "state_code", "hhs", from_col="state_code", new_col="hhs")
-                df = geo_mapper.replace_geocode(
-                    df, from_col="state_code", from_code="state_code", new_col="geo_id", new_code="hhs"
-                )
-            elif geo == "state":
-                df = df[df_pull["geo_id"] != "us"]
-                df = df[df["geo_id"].str.len() == 2]  # hhs region is a value in geo_id column
-
-            df["se"] = np.nan
-            df["sample_size"] = np.nan
+            with profile_stage("compute", geo=geo, signal=signal) as stage:
+                df = df[["timestamp", "geo_id", signal]]
+                df.rename({signal: "val"}, axis=1, inplace=True)
+
+                if geo == "nation":
+                    df = df[df["geo_id"] == "us"]
+                elif geo == "hhs":
+                    df = df[df["geo_id"] != "us"]
+                    df = df[df["geo_id"].str.len() == 2]
+                    df.rename(columns={"geo_id": "state_id"}, inplace=True)
+                    df = geo_mapper.add_geocode(df, "state_id", "state_code", from_col="state_id")
+                    df = geo_mapper.add_geocode(df, "state_code", "hhs", from_col="state_code", new_col="hhs")
+                    df = geo_mapper.replace_geocode(
+                        df, from_col="state_code", from_code="state_code", new_col="geo_id", new_code="hhs"
+                    )
+                elif geo == "state":
+                    df = df[df_pull["geo_id"] != "us"]
+                    df = df[df["geo_id"].str.len() == 2]  # hhs region is a value in geo_id column
+
+                df["se"] = np.nan
+                df["sample_size"] = np.nan
+                stage.add_rows(len(df))
 
             dates = create_export_csv(
                 df,
@@ -100,6 +139,7 @@ def run_module(params, logger=None):
                 start_date=datetime.strptime(export_start_date, "%Y-%m-%d"),
                 sensor=signal,
                 weekly_dates=True,
+                only_dates=signal_plans[signal].dates,
             )
             if len(dates) > 0:
                 run_stats.append((max(dates), len(dates)))
@@ -112,6 +152,9 @@ def run_module(params, logger=None):
             else:
                 raise RuntimeError("Column(s) that shouldn't be missing is missing") from e
 
+    for export_plan in export_plans.values():
+        export_plan.save()
+
     elapsed_time_in_seconds = round(time.time() - start_time, 2)
     min_max_date = run_stats and min(s[0] for s in run_stats)
     csv_export_count = sum(s[-1] for s in run_stats)
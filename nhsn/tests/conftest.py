@@ -3,6 +3,7 @@ import json
 import time
 from unittest.mock import patch
 
+import pandas as pd
 import pytest
 from pathlib import Path
 
@@ -61,17 +62,14 @@ def params_w_patch(params):
 
 @pytest.fixture(scope="function")
 def run_as_module(params):
-    with patch('sodapy.Socrata.get') as mock_get, \
+    with patch('delphi_nhsn.pull.fetch_socrata') as mock_fetch, \
          patch('sodapy.Socrata.get_metadata') as mock_get_metadata:
         def side_effect(*args, **kwargs):
-            if kwargs['offset'] == 0:
-                if "ua7e-t2fy" in args[0]:
-                    return TEST_DATA
-                if "mpgq-jmmr" in args[0]:
-                    return PRELIM_TEST_DATA
-            else:
-                return []
-        mock_get.side_effect = side_effect
+            if "ua7e-t2fy" in args[0]:
+                return pd.DataFrame(TEST_DATA)
+            if "mpgq-jmmr" in args[0]:
+                return pd.DataFrame(PRELIM_TEST_DATA)
+        mock_fetch.side_effect = side_effect
         mock_get_metadata.return_value = {"viewLastModified": time.time()}
         run_module(params)
 
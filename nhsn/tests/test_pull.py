@@ -3,7 +3,6 @@ import time
 from unittest.mock import patch, MagicMock
 import os
 import pytest
-from urllib.error import HTTPError
 import pandas as pd
 
 from delphi_nhsn.pull import (
@@ -12,7 +11,7 @@ from delphi_nhsn.pull import (
     pull_data_from_file,
     check_last_updated
 )
-from delphi_nhsn.constants import TYPE_DICT, PRELIM_TYPE_DICT, PRELIM_DATASET_ID, MAIN_DATASET_ID
+from delphi_nhsn.constants import TYPE_DICT, PRELIM_TYPE_DICT, PRELIM_DATASET_ID, MAIN_DATASET_ID, SOURCE_TYPE_DICT
 
 from delphi_utils import get_structured_logger
 from conftest import TEST_DATA, PRELIM_TEST_DATA, TEST_DIR
@@ -36,27 +35,29 @@ DATASETS = [{"id":MAIN_DATASET_ID,
 
 
 class TestPullNHSNData:
-    @patch("delphi_nhsn.pull.Socrata")
+    @patch("delphi_nhsn.pull.fetch_socrata")
     @pytest.mark.parametrize('dataset', DATASETS, ids=["data", "prelim_data"])
-    def test_socrata_call(self, mock_socrata, dataset, params):
+    def test_socrata_call(self, mock_fetch, dataset, params):
         test_token = params["indicator"]["socrata_token"]
         backup_dir = f"{TEST_DIR}/test_data"
         logger = get_structured_logger()
+        mock_fetch.return_value = pd.DataFrame()
 
-        # Mock Socrata client and its get method
-        mock_client = MagicMock()
-        mock_socrata.return_value = mock_client
-        # testing retry behavior
-        http_error = HTTPError(url="", hdrs="", fp="", msg="Service Temporarily Unavailable",code=503)
-        mock_client.get.side_effect = [http_error,[]]
-
-        pull_data(test_token, dataset["id"], backup_dir, logger)
+        df = pull_data(test_token, dataset["id"], backup_dir, logger)
 
-        # Check that Socrata client was initialized with correct arguments
-        mock_socrata.assert_called_once_with("data.cdc.gov", test_token)
-
-        # Check that get method was called with correct arguments
-        mock_client.get.assert_any_call(dataset["id"], limit=50000, offset=0)
+        # Check that the dataset was fetched with correct arguments
+        today = pd.Timestamp.today().strftime("%Y%m%d")
+        parquet_file = f"{backup_dir}/{today}_prelim.parquet" if dataset["prelim_flag"] else f"{backup_dir}/{today}.parquet"
+        mock_fetch.assert_called_once_with(
+            dataset["id"],
+            test_token,
+            type_dict=SOURCE_TYPE_DICT,
+            strict_types=False,
+            snapshot_dir=None,
+            parquet_file=parquet_file,
+            logger=logger,
+        )
+        assert df.empty
 
     @pytest.mark.parametrize('dataset', DATASETS, ids=["data", "prelim_data"])
     def test_pull_from_file(self, caplog, dataset, params_w_patch):
@@ -78,14 +79,15 @@ class TestPullNHSNData:
         pd.testing.assert_frame_equal(expected_data, df)
 
     @patch("delphi_nhsn.pull.Socrata")
+    @patch("delphi_nhsn.pull.fetch_socrata")
     @patch("delphi_nhsn.pull.create_backup_csv")
     @pytest.mark.parametrize('dataset', DATASETS, ids=["data", "prelim_data"])
-    def test_pull_nhsn_data_output(self, mock_create_backup, mock_socrata, dataset, caplog, params):
+    def test_pull_nhsn_data_output(self, mock_create_backup, mock_fetch, mock_socrata, dataset, caplog, params):
         now = time.time()
-        # Mock Socrata client and its get method
+        # Mock Socrata fetch and client metadata
+        mock_fetch.return_value = pd.DataFrame(dataset["test_data"])
         mock_client = MagicMock()
         mock_socrata.return_value = mock_client
-        mock_client.get.side_effect = [dataset["test_data"],[]]
         mock_client.get_metadata.return_value = {"viewLastModified": now}
 
         backup_dir = params["common"]["backup_dir"]
@@ -115,13 +117,14 @@ class TestPullNHSNData:
 
 
     @patch("delphi_nhsn.pull.Socrata")
+    @patch("delphi_nhsn.pull.fetch_socrata")
     @pytest.mark.parametrize('dataset', DATASETS, ids=["data", "prelim_data"])
-    def test_pull_nhsn_data_backup(self, mock_socrata, dataset, caplog, params):
+    def test_pull_nhsn_data_backup(self, mock_fetch, mock_socrata, dataset, caplog, params):
         now = time.time()
-        # Mock Socrata client and its get method
+        # Mock Socrata fetch and client metadata
+        mock_fetch.return_value = pd.DataFrame(dataset["test_data"])
         mock_client = MagicMock()
         mock_socrata.return_value = mock_client
-        mock_client.get.side_effect = [dataset["test_data"], []]
 
         mock_client.get_metadata.return_value = {"viewLastModified": now}
 
@@ -140,17 +143,13 @@ class TestPullNHSNData:
         # Check logger used:
         assert "Backup file created" in caplog.text
 
-        # Check that backup file was created
+        # Check that backup file was created; the parquet backup is streamed by fetch_socrata
         backup_files = glob.glob(f"{backup_dir}/{today}*")
-        assert len(backup_files) == 2, "Backup file was not created"
-
-        for backup_file in backup_files:
-            if backup_file.endswith(".csv.gz"):
-                dtypes = expected_data.dtypes.to_dict()
-                actual_data = pd.read_csv(backup_file, dtype=dtypes)
-            else:
-                actual_data = pd.read_parquet(backup_file)
-            pd.testing.assert_frame_equal(expected_data, actual_data)
+        assert len(backup_files) == 1, "Backup file was not created"
+
+        dtypes = expected_data.dtypes.to_dict()
+        actual_data = pd.read_csv(backup_files[0], dtype=dtypes)
+        pd.testing.assert_frame_equal(expected_data, actual_data)
 
         # clean up
         for file in backup_files:
@@ -42,3 +42,14 @@ TYPE_DICT.update(
         "fips": str,
     }
 )
+
+# TYPE_DICT keyed by the dataset's column names, applied as the rows are pulled
+SOURCE_TYPE_DICT = {key: float for key in SIGNALS_MAP}
+SOURCE_TYPE_DICT.update(
+    {
+        "week_end": "datetime64[ns]",
+        "geography": str,
+        "county": str,
+        "fips": str,
+    }
+)
@@ -21,6 +21,7 @@ To use this module, configure params.json like so:
     "patch_dir": "delphi/covidcast-indicators/nssp/AprilPatch",
     "start_issue": "2024-04-20",
     "end_issue": "2024-04-21",
+    "max_workers": 4
   }
 }
 
@@ -33,21 +34,26 @@ In this params.json, we
     + "patch_dir": the local directory where to write all patch issues output
     + "start_date": str, YYYY-MM-DD format, first issue date
     + "end_date": str, YYYY-MM-DD format, last issue date
+    + "max_workers" (optional): int, number of issues to run in parallel, default 1
 
 if "source_dir" doesn't exist locally or has no files in it, we download source data to source_dir
 else, we assume all needed source files are already in source_dir.
 
 This module will generate data for that range of issue dates, and store them in batch issue format in the patch_dir:
 [patch_dir]/issue_[issue-date]/nssp/actual_data_file.csv
+
+Issues whose directory already exists are skipped, so an interrupted patch can be resumed by
+running it again.
 """
 
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import partial
 from os import listdir, makedirs, path
 from shutil import rmtree
 
 import pandas as pd
-from delphi_utils import get_structured_logger, read_params
+from delphi_utils import get_structured_logger, read_params, run_patch
 from epiweeks import Week
 
 from .pull import get_source_data
@@ -130,6 +136,13 @@ def get_patch_dates(start_issue, end_issue, source_dir):
     return patch_dates
 
 
+def run_issue(params, patch_dates, issue_date, export_dir, logger):
+    """Run nssp indicator for one issue date, from the source data of its patch date."""
+    params["patch"]["current_issue"] = patch_dates[issue_date].strftime("%Y%m%d")
+    params["common"]["export_dir"] = export_dir
+    run_module(params, logger)
+
+
 def patch():
     """Run nssp indicator for a range of issue dates."""
     params = read_params()
@@ -156,27 +169,25 @@ def patch():
 
     patch_dates = get_patch_dates(start_issue, end_issue, source_dir)
 
+    # Issue dates can be different from patch dates due to weekly cadence of nssp data.
+    # For weekly sources, issue dates in our db matches with first date of epiweek that
+    # the reporting date falls in, rather than reporting date itself.
+    issue_patch_dates = {}
     for current_issue in patch_dates:
-        logger.info("patching issue", issue_date=current_issue.strftime("%Y%m%d"))
-
         current_issue_source_csv = f"""{source_dir}/{current_issue.strftime("%Y%m%d")}.csv.gz"""
         if not path.isfile(current_issue_source_csv):
             logger.info("No source data at this path", current_issue_source_csv=current_issue_source_csv)
-            current_issue += timedelta(days=1)
             continue
-
-        params["patch"]["current_issue"] = current_issue.strftime("%Y%m%d")
-
-        # current_issue_date can be different from params["patch"]["current_issue"]
-        # due to weekly cadence of nssp data. For weekly sources, issue dates in our
-        # db matches with first date of epiweek that the reporting date falls in,
-        # rather than reporting date itself.
-        current_issue_date = Week.fromdate(current_issue).startdate()
-        current_issue_dir = f"""{params["patch"]["patch_dir"]}/issue_{current_issue_date.strftime("%Y%m%d")}/nssp"""
-        makedirs(f"{current_issue_dir}", exist_ok=True)
-        params["common"]["export_dir"] = f"""{current_issue_dir}"""
-
-        run_module(params, logger)
+        issue_patch_dates[Week.fromdate(current_issue).startdate()] = current_issue
+
+    run_patch(
+        list(issue_patch_dates),
+        partial(run_issue, params, issue_patch_dates),
+        params["patch"]["patch_dir"],
+        "nssp",
+        logger,
+        params["patch"].get("max_workers", 1),
+    )
 
     if download_source:
         rmtree(source_dir)
@@ -10,10 +10,9 @@ from typing import Optional
 
 import pandas as pd
 import paramiko
-from delphi_utils import create_backup_csv
-from sodapy import Socrata
+from delphi_utils import create_backup_csv, fetch_socrata, get_backup_file
 
-from .constants import DATASET_ID, NEWLINE, SIGNALS, SIGNALS_MAP, TYPE_DICT
+from .constants import DATASET_ID, NEWLINE, SIGNALS, SIGNALS_MAP, SOURCE_TYPE_DICT, TYPE_DICT
 
 
 def print_callback(remote_file_name, logger, bytes_so_far, bytes_total, progress_chunks):
@@ -98,7 +97,13 @@ def warn_string(df, type_dict):
     return warn
 
 
-def pull_with_socrata_api(socrata_token: str, dataset_id: str):
+def pull_with_socrata_api(
+    socrata_token: str,
+    dataset_id: str,
+    logger: Optional[logging.Logger] = None,
+    snapshot_dir: Optional[str] = None,
+    parquet_file: Optional[str] = None,
+):
     """Pull data from Socrata API.
 
     Parameters
@@ -107,23 +112,32 @@ def pull_with_socrata_api(socrata_token: str, dataset_id: str):
         My App Token for pulling the NSSP data (could be the same as the nchs data)
     dataset_id: str
         The dataset id to pull data from
+    logger: Optional[logging.Logger]
+        logger object
+    snapshot_dir: Optional[str]
+        Directory to keep a snapshot of the dataset in, so only rows updated since the last pull are pulled
+    parquet_file: Optional[str]
+        File to stream the rows to as they are pulled, e.g. the parquet backup; its numeric and
+        datetime columns are typed
 
 
     Returns
     -------
-    list of dictionaries, each representing a row in the dataset
+    pd.DataFrame
+        Dataframe with a row for each row in the dataset
     """
-    client = Socrata("data.cdc.gov", socrata_token, timeout=50)  # set timeout to avoid read timed out error
-    results = []
-    offset = 0
-    limit = 50000  # maximum limit allowed by SODA 2.0
-    while True:
-        page = client.get(dataset_id, limit=limit, offset=offset)
-        if not page:
-            break  # exit the loop if no more results
-        results.extend(page)
-        offset += limit
-    return results
+    # set timeout to avoid read timed out error
+    return fetch_socrata(
+        dataset_id,
+        socrata_token,
+        type_dict=SOURCE_TYPE_DICT,
+        # Missing columns are reported by `pull_nssp_data`
+        strict_types=False,
+        snapshot_dir=snapshot_dir,
+        parquet_file=parquet_file,
+        timeout=50,
+        logger=logger,
+    )
 
 
 def pull_nssp_data(
@@ -132,6 +146,7 @@ def pull_nssp_data(
     custom_run: bool,
     issue_date: Optional[str] = None,
     logger: Optional[logging.Logger] = None,
+    snapshot_dir: Optional[str] = None,
 ):
     """Pull the NSSP ER visits primary dataset.
 
@@ -141,6 +156,8 @@ def pull_nssp_data(
     ----------
     socrata_token: str
         My App Token for pulling the NSSP data (could be the same as the nchs data)
+    snapshot_dir: Optional[str]
+        Directory to keep a snapshot of the dataset in, so only rows updated since the last pull are pulled
 
     Returns
     -------
@@ -148,9 +165,11 @@ def pull_nssp_data(
         Dataframe as described above.
     """
     if not custom_run:
-        socrata_results = pull_with_socrata_api(socrata_token, DATASET_ID)
-        df_ervisits = pd.DataFrame.from_records(socrata_results)
-        create_backup_csv(df_ervisits, backup_dir, custom_run, logger=logger)
+        backup_file = get_backup_file(backup_dir)
+        df_ervisits = pull_with_socrata_api(
+            socrata_token, DATASET_ID, logger, snapshot_dir, parquet_file=f"{backup_file}.parquet"
+        )
+        create_backup_csv(df_ervisits, backup_dir, custom_run, logger=logger, parquet=False)
         logger.info("Number of records grabbed", num_records=len(df_ervisits), source="Socrata API")
     elif custom_run and logger.name == "delphi_nssp.patch":
         if issue_date is None:
@@ -16,6 +16,11 @@ the following structure:
             `delphi_utils.add_prefix()`
         - "test_file" (optional): str, name of file from which to read test data
         - "socrata_token": str, authentication for upstream data pull
+        - "socrata_snapshot_dir" (optional): str, directory to keep a snapshot of the source
+            dataset in, so that only rows updated since the previous run are pulled
+        - "export_plan_dir" (optional): str, directory to keep hashes of the pulled rows in,
+            so that only dates whose rows changed since the previous run are exported. Ignored
+            when validation isn't a dry run; see `delphi_utils.export_plan`.
     - "archive" (optional): if provided, output will be archived with S3
         - "aws_credentials": Dict[str, str], AWS login credentials (see S3 documentation)
         - "bucket_name: str, name of S3 bucket to read/write
@@ -27,9 +32,10 @@ from datetime import datetime
 
 import numpy as np
 import us
-from delphi_utils import create_export_csv, get_structured_logger
+from delphi_utils import ExportPlan, create_export_csv, get_export_plan_dir, get_structured_logger
 from delphi_utils.geomap import GeoMapper
 from delphi_utils.nancodes import add_default_nancodes
+from delphi_utils.profiling import profile_stage
 
 from .constants import AUXILIARY_COLS, CSV_COLS, GEOS, SIGNALS
 from .pull import pull_nssp_data
@@ -46,6 +52,64 @@ def add_needed_columns(df, col_names=None):
     return df
 
 
+def state_ids(state_names):
+    """Look up the state id of each distinct state name, for mapping a column of them.
+
+    Names not found by `us.states.lookup` are taken to be DC.
+    """
+    table = {}
+    for name in state_names:
+        state = us.states.lookup(name)
+        table[name] = state.abbr.lower() if state else "dc"
+    return table
+
+
+def aggregate_signals(df_pull, geo, geo_mapper):
+    """Map the pulled data to a geo, with a column per signal.
+
+    Parameters
+    ----------
+    df_pull: pd.DataFrame
+        Pulled data, as returned by `pull_nssp_data`
+    geo: str
+        Geo resolution to map to, one of GEOS
+    geo_mapper: GeoMapper
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns "geo_id", "timestamp" and SIGNALS
+    """
+    if geo == "nation":
+        df = df_pull[df_pull["geography"] == "United States"].copy()
+        df["geo_id"] = "us"
+    elif geo == "state":
+        df = df_pull[(df_pull["county"] == "All") & (df_pull["geography"] != "United States")].copy()
+        df["geo_id"] = df["geography"].map(state_ids(df["geography"].unique()))
+    elif geo in ("hrr", "msa"):
+        df = df_pull[["fips", "timestamp"] + SIGNALS]
+        # fips -> msa doesn't have a weighted version, so we need to add columns and sum ourselves
+        df = geo_mapper.add_population_column(df, geocode_type="fips", geocode_col="fips")
+        df = geo_mapper.add_geocode(df, "fips", geo, from_col="fips", new_col="geo_id")
+        df = geo_mapper.aggregate_by_weighted_sum(df, "geo_id", SIGNALS, "timestamp", "population")
+        df = df.rename(columns={f"weighted_{signal}": signal for signal in SIGNALS})
+    elif geo == "hhs":
+        df = df_pull[(df_pull["county"] == "All") & (df_pull["geography"] != "United States")]
+        df = df[["geography", "timestamp"] + SIGNALS]
+        df = geo_mapper.add_population_column(df, geocode_type="state_name", geocode_col="geography")
+        df = geo_mapper.add_geocode(df, "state_name", "state_code", from_col="state_name")
+        df = geo_mapper.add_geocode(df, "state_code", "hhs", from_col="state_code", new_col="geo_id")
+        df = geo_mapper.aggregate_by_weighted_sum(df, "geo_id", SIGNALS, "timestamp", "population")
+        df = df.rename(columns={f"weighted_{signal}": signal for signal in SIGNALS})
+    elif geo == "hsa_nci":
+        df = df_pull[df_pull["hsa_nci_id"] != "All"]
+        df = df.rename(columns={"hsa_nci_id": "geo_id"})
+    else:
+        df = df_pull[df_pull["county"] != "All"].copy()
+        df["geo_id"] = df["fips"]
+    return df[["geo_id", "timestamp"] + SIGNALS]
+
+
 def logging(start_time, run_stats, logger):
     """Boilerplate making logs."""
     elapsed_time_in_seconds = round(time.time() - start_time, 2)
@@ -97,65 +161,50 @@ def run_module(params, logger=None):
     ## build the base version of the signal at the most detailed geo level you can get.
     ## compute stuff here or farm out to another function or file
 
-    df_pull = pull_nssp_data(socrata_token, backup_dir, custom_run=custom_run, issue_date=issue_date, logger=logger)
+    df_pull = pull_nssp_data(
+        socrata_token,
+        backup_dir,
+        custom_run=custom_run,
+        issue_date=issue_date,
+        logger=logger,
+        snapshot_dir=params["indicator"].get("socrata_snapshot_dir"),
+    )
+    export_plan = ExportPlan(
+        df_pull,
+        get_export_plan_dir(params, logger),
+        "nssp",
+        ["geography", "county", "fips", "hsa_nci_id"],
+        output_config={"signals": SIGNALS, "geos": GEOS},
+        logger=logger,
+    )
 
     ## aggregate
     geo_mapper = GeoMapper()
-    for signal in SIGNALS:
+    for geo in GEOS:
         if df_pull is None and custom_run and logger.name == "delphi_nssp.patch":
             logger.warning("No primary source data pulled", issue_date=issue_date)
             break
-        for geo in GEOS:
-            df = df_pull.copy()
-            df["val"] = df[signal]
+        # Map the geo once, for all signals
+        with profile_stage("aggregate", geo=geo) as stage:
+            df_geo = aggregate_signals(df_pull, geo, geo_mapper)
+            stage.add_rows(len(df_geo))
+        for signal in SIGNALS:
             logger.info("Generating signal and exporting to CSV", geo_type=geo, signal=signal)
-            if geo == "nation":
-                df = df[df["geography"] == "United States"]
-                df["geo_id"] = "us"
-            elif geo == "state":
-                df = df[(df["county"] == "All") & (df["geography"] != "United States")]
-                df["geo_id"] = df["geography"].apply(
-                    lambda x: us.states.lookup(x).abbr.lower() if us.states.lookup(x) else "dc"
-                )
-            elif geo == "hrr":
-                df = df[["fips", "val", "timestamp"]]
-                df = geo_mapper.add_population_column(df, geocode_type="fips", geocode_col="fips")
-                df = geo_mapper.add_geocode(df, "fips", "hrr", from_col="fips", new_col="geo_id")
-                df = geo_mapper.aggregate_by_weighted_sum(df, "geo_id", "val", "timestamp", "population")
-                df = df.rename(columns={"weighted_val": "val"})
-            elif geo == "msa":
-                df = df[["fips", "val", "timestamp"]]
-                # fips -> msa doesn't have a weighted version, so we need to add columns and sum ourselves
-                df = geo_mapper.add_population_column(df, geocode_type="fips", geocode_col="fips")
-                df = geo_mapper.add_geocode(df, "fips", "msa", from_col="fips", new_col="geo_id")
-                df = geo_mapper.aggregate_by_weighted_sum(df, "geo_id", "val", "timestamp", "population")
-                df = df.rename(columns={"weighted_val": "val"})
-            elif geo == "hhs":
-                df = df[(df["county"] == "All") & (df["geography"] != "United States")]
-                df = df[["geography", "val", "timestamp"]]
-                df = geo_mapper.add_population_column(df, geocode_type="state_name", geocode_col="geography")
-                df = geo_mapper.add_geocode(df, "state_name", "state_code", from_col="state_name")
-                df = geo_mapper.add_geocode(df, "state_code", "hhs", from_col="state_code", new_col="geo_id")
-                df = geo_mapper.aggregate_by_weighted_sum(df, "geo_id", "val", "timestamp", "population")
-                df = df.rename(columns={"weighted_val": "val"})
-            elif geo == "hsa_nci":
-                df = df[["hsa_nci_id", "val", "timestamp"]]
-                df = df[df["hsa_nci_id"] != "All"]
-                # We use drop_duplicates below just to pick a representative value,
-                # since all the values in a given HSA-NCI level are the same
-                # (the data is reported at the HSA-NCI level).
-                df.drop_duplicates(["hsa_nci_id", "timestamp", "val"], inplace=True)
-                df = df.rename(columns={"hsa_nci_id": "geo_id"})
-            else:
-                df = df[df["county"] != "All"]
-                df["geo_id"] = df["fips"]
-            # add se, sample_size, and na codes
-            missing_cols = set(CSV_COLS) - set(df.columns)
-            df = add_needed_columns(df, col_names=list(missing_cols))
-            df_csv = df[CSV_COLS + ["timestamp"]]
-
-            # remove rows with missing values
-            df_csv = df_csv[df_csv["val"].notnull()]
+            with profile_stage("compute", geo=geo, signal=signal) as stage:
+                df = df_geo[["geo_id", "timestamp", signal]].rename(columns={signal: "val"})
+                if geo == "hsa_nci":
+                    # We use drop_duplicates below just to pick a representative value,
+                    # since all the values in a given HSA-NCI level are the same
+                    # (the data is reported at the HSA-NCI level).
+                    df = df.drop_duplicates(["geo_id", "timestamp", "val"])
+                # add se, sample_size, and na codes
+                missing_cols = set(CSV_COLS) - set(df.columns)
+                df = add_needed_columns(df, col_names=list(missing_cols))
+                df_csv = df[CSV_COLS + ["timestamp"]]
+
+                # remove rows with missing values
+                df_csv = df_csv[df_csv["val"].notnull()]
+                stage.add_rows(len(df_csv))
             if df_csv.empty:
                 logger.warning("No data for signal and geo combination", signal=signal, geo=geo)
                 continue
@@ -167,9 +216,12 @@ def run_module(params, logger=None):
                 export_dir=export_dir,
                 sensor=signal,
                 weekly_dates=True,
+                only_dates=export_plan.dates,
             )
             if len(dates) > 0:
                 run_stats.append((max(dates), len(dates)))
 
+    export_plan.save()
+
     ## log this indicator run
     logging(start_time, run_stats, logger)
@@ -10,7 +10,6 @@ required = [
     "pytest-cov",
     "pylint==2.8.3",
     "delphi-utils",
-    "sodapy",
     "epiweeks",
     "freezegun",
     "us",
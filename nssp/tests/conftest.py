@@ -3,6 +3,7 @@ import json
 import time
 from unittest.mock import patch, MagicMock
 
+import pandas as pd
 import pytest
 from pathlib import Path
 
@@ -68,14 +69,11 @@ def run_as_module(params):
     This fixture patches Socrara to return the predefined test data
     """
 
-    with patch('sodapy.Socrata.get') as mock_get:
+    with patch('delphi_nssp.pull.fetch_socrata') as mock_fetch:
         def side_effect(*args, **kwargs):
-            if kwargs['offset'] == 0:
-                if DATASET_ID in args[0]:
-                    return TEST_DATA
-            else:
-                return []
-        mock_get.side_effect = side_effect
+            if DATASET_ID in args[0]:
+                return pd.DataFrame(TEST_DATA)
+        mock_fetch.side_effect = side_effect
         run_module(params)
 
 
@@ -88,14 +86,11 @@ def run_as_module_hrr(params):
     This fixture patches socrara to return the predefined test data for HRR region.
     """
 
-    with patch('sodapy.Socrata.get') as mock_get, \
+    with patch('delphi_nssp.pull.fetch_socrata') as mock_fetch, \
          patch('delphi_nssp.run.GEOS', ["hrr"]):
         def side_effect(*args, **kwargs):
-            if kwargs['offset'] == 0:
-                if DATASET_ID in args[0]:
-                    return HRR_TEST_DATA
-            else:
-                return []
-        mock_get.side_effect = side_effect
+            if DATASET_ID in args[0]:
+                return pd.DataFrame(HRR_TEST_DATA)
+        mock_fetch.side_effect = side_effect
         run_module(params)
 
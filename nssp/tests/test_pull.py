@@ -9,6 +9,7 @@ import pdb
 
 import unittest.mock as mock
 import pandas as pd
+import pytest
 
 from delphi_nssp.pull import (
     get_source_data,
@@ -17,6 +18,7 @@ from delphi_nssp.pull import (
 
 from delphi_nssp.constants import (
     SIGNALS,
+    SOURCE_TYPE_DICT,
 )
 
 from delphi_utils import get_structured_logger
@@ -45,17 +47,15 @@ class TestPullNSSPData:
 
         for file in files:
             mock_sftp.get.has_calls(file, f"{dest_path}/{file}", mock.ANY)
-    @patch("delphi_nssp.pull.Socrata")
-    def test_normal_pull_nssp_data(self, mock_socrata, params, caplog):
+    @patch("delphi_nssp.pull.fetch_socrata")
+    def test_normal_pull_nssp_data(self, mock_fetch, params, caplog):
         today = pd.Timestamp.today().strftime("%Y%m%d")
         backup_dir = params["common"]["backup_dir"]
         custom_run = params["common"]["custom_run"]
         test_token = params["indicator"]["socrata_token"]
 
-        # Mock Socrata client and its get method
-        mock_client = MagicMock()
-        mock_client.get.side_effect = [TEST_DATA, []]  # Return test data on first call, empty list on second call
-        mock_socrata.return_value = mock_client
+        # Mock Socrata fetch
+        mock_fetch.return_value = pd.DataFrame(TEST_DATA)
 
         logger = get_structured_logger()
         # Call function with test token
@@ -64,24 +64,26 @@ class TestPullNSSPData:
         # Check logger used:
         assert "Backup file created" in caplog.text
 
-        # Check that backup file was created
+        # Check that backup file was created; the parquet backup is streamed by fetch_socrata
         backup_files = glob.glob(f"{backup_dir}/{today}.*")
-        assert len(backup_files) == 2, "Backup file was not created"
+        assert backup_files == [f"{backup_dir}/{today}.csv.gz"], "Backup file was not created"
 
         expected_data = pd.DataFrame(TEST_DATA)
-        for backup_file in backup_files:
-            if backup_file.endswith(".csv.gz"):
-                dtypes = expected_data.dtypes.to_dict()
-                actual_data = pd.read_csv(backup_file, dtype=dtypes)
-            else:
-                actual_data = pd.read_parquet(backup_file)
-            pd.testing.assert_frame_equal(expected_data, actual_data)
-
-        # Check that Socrata client was initialized with correct arguments
-        mock_socrata.assert_called_once_with("data.cdc.gov", test_token, timeout=50)
-
-        # Check that get method was called with correct arguments
-        mock_client.get.assert_any_call("rdmq-nq56", limit=50000, offset=0)
+        dtypes = expected_data.dtypes.to_dict()
+        actual_data = pd.read_csv(backup_files[0], dtype=dtypes)
+        pd.testing.assert_frame_equal(expected_data, actual_data)
+
+        # Check that the dataset was fetched with correct arguments
+        mock_fetch.assert_called_once_with(
+            "rdmq-nq56",
+            test_token,
+            type_dict=SOURCE_TYPE_DICT,
+            strict_types=False,
+            snapshot_dir=None,
+            parquet_file=f"{backup_dir}/{today}.parquet",
+            timeout=50,
+            logger=logger,
+        )
 
         # Check result
         assert result["timestamp"].notnull().all(), "timestamp has rogue NaN"
@@ -92,3 +94,16 @@ class TestPullNSSPData:
 
         for file in backup_files:
             os.remove(file)
+
+    @patch("delphi_nssp.pull.fetch_socrata")
+    def test_missing_column_pull_nssp_data(self, mock_fetch, params):
+        today = pd.Timestamp.today().strftime("%Y%m%d")
+        backup_dir = params["common"]["backup_dir"]
+        mock_fetch.return_value = pd.DataFrame(TEST_DATA).drop(columns="percent_visits_rsv")
+
+        logger = get_structured_logger()
+        with pytest.raises(ValueError, match="schema may"):
+            pull_nssp_data(params["indicator"]["socrata_token"], backup_dir, False, logger=logger)
+
+        for file in glob.glob(f"{backup_dir}/{today}.*"):
+            os.remove(file)
@@ -6,10 +6,13 @@ import json
 from unittest.mock import patch
 import numpy as np
 import pandas as pd
-from delphi_nssp.constants import GEOS, SIGNALS_MAP, DATASET_ID
-from delphi_nssp.run import add_needed_columns, run_module
+from delphi_nssp.constants import GEOS, SIGNALS, SIGNALS_MAP, DATASET_ID
+from delphi_nssp.run import add_needed_columns, aggregate_signals, run_module, state_ids
+from delphi_utils import GeoMapper, commit_export_plans
 from epiweeks import Week
 
+from conftest import TEST_DATA
+
 TEST_DIR = Path(__file__).parent
 
 def remove_backup_and_receiving(params):
@@ -38,6 +41,28 @@ class TestRun:
         assert df["se"].isnull().all()
         assert df["sample_size"].isnull().all()
 
+    def test_state_ids(self):
+        assert state_ids(["Pennsylvania", "Puerto Rico", "District of Columbia"]) == {
+            "Pennsylvania": "pa", "Puerto Rico": "pr", "District of Columbia": "dc"}
+
+    def test_aggregate_signals(self):
+        df_pull = pd.DataFrame({
+            "geography": ["Alabama", "Alabama", "Alabama", "Georgia", "United States"],
+            "county": ["All", "Autauga", "Baldwin", "All", "All"],
+            "fips": ["0", "01001", "01003", "0", "0"],
+            "hsa_nci_id": ["All", "1", "1", "All", "All"],
+            "timestamp": pd.to_datetime(["2022-10-01"] * 5),
+            **{signal: [1.0, 2.0, np.nan, 4.0, 5.0] for signal in SIGNALS},
+        })
+        geo_mapper = GeoMapper()
+        for geo in GEOS:
+            df = aggregate_signals(df_pull, geo, geo_mapper)
+            assert list(df.columns) == ["geo_id", "timestamp"] + SIGNALS
+            # Every signal is mapped the same way
+            assert (df[SIGNALS].nunique(axis=1, dropna=False) == 1).all()
+        state = aggregate_signals(df_pull, "state", geo_mapper)
+        assert state["geo_id"].tolist() == ["al", "ga"]
+
     def generate_week_file_prefix(self, dates):
         epiweeks_lst = [ Week.fromdate(pd.to_datetime(str(date))) for date in dates ]
         date_prefix = [
@@ -88,15 +113,15 @@ class TestRun:
 
         remove_backup_and_receiving(params)
 
-    @patch("sodapy.Socrata.get")
-    def test_empty_data(self, mock_get, params, caplog):
+    @patch("delphi_nssp.pull.fetch_socrata")
+    def test_empty_data(self, mock_fetch, params, caplog):
         """
         Tests correct handling when there is a geo and signal combination that has no data.
         """
 
         with open(f"{TEST_DIR}/test_data/page_no_data.json", "r") as f:
             EMPTY_TEST_DATA = json.load(f)
-        mock_get.side_effect = [EMPTY_TEST_DATA, []]
+        mock_fetch.return_value = pd.DataFrame(EMPTY_TEST_DATA)
         run_module(params)
 
         assert "No data for signal and geo combination" in caplog.text
@@ -111,3 +136,39 @@ class TestRun:
         assert all("nation" in f.name for f in csv_files)
 
         remove_backup_and_receiving(params)
+
+    @patch("delphi_nssp.pull.fetch_socrata")
+    def test_export_plan(self, mock_fetch, params, tmp_path):
+        """Only the weeks whose source rows changed since the previous run are exported."""
+        params["indicator"]["export_plan_dir"] = str(tmp_path)
+        params["validation"]["common"]["dry_run"] = True
+        export_dir = params["common"]["export_dir"]
+        mock_fetch.return_value = pd.DataFrame(TEST_DATA)
+        run_module(params)
+        assert len(list(Path(export_dir).glob("*.csv"))) > 0
+        remove_backup_and_receiving(params)
+
+        # Hashes are only compared with once the runner commits them
+        run_module(params)
+        assert len(list(Path(export_dir).glob("*.csv"))) > 0
+        remove_backup_and_receiving(params)
+        commit_export_plans(str(tmp_path))
+
+        run_module(params)
+        assert list(Path(export_dir).glob("*.csv")) == []
+
+        revised = pd.DataFrame(TEST_DATA)
+        revised.loc[revised["week_end"] == revised["week_end"].max(), "percent_visits_covid"] = "9.9"
+        mock_fetch.return_value = revised
+        run_module(params)
+        date_prefix = self.generate_week_file_prefix([revised["week_end"].max()])[0]
+        csv_files = {f.name for f in Path(export_dir).glob("*.csv")}
+        assert csv_files == {f"weekly_{date_prefix}_{geo}_{signal}.csv"
+                             for geo in GEOS for signal in SIGNALS_MAP.values()}
+        remove_backup_and_receiving(params)
+
+        # The static validator expects every date, so exports aren't planned outside of dry run
+        params["validation"]["common"]["dry_run"] = False
+        run_module(params)
+        assert len(list(Path(export_dir).glob("*.csv"))) > len(csv_files)
+        remove_backup_and_receiving(params)
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 """Functions for pulling NCHS mortality data API."""
 
+from typing import Optional
+
 import numpy as np
-import pandas as pd
-from sodapy import Socrata
+from delphi_utils import fetch_socrata
 
 from .constants import (
     SIGNALS,
@@ -74,7 +75,7 @@ def add_population(df, df_metric):
     return df
 
 
-def pull_nwss_data(socrata_token: str):
+def pull_nwss_data(socrata_token: str, snapshot_dir: Optional[str] = None):
     """Pull the latest NWSS Wastewater data, and conforms it into a dataset.
 
     The output dataset has:
@@ -87,6 +88,8 @@ def pull_nwss_data(socrata_token: str):
     ----------
     socrata_token: str
         My App Token for pulling the NWSS data (could be the same as the nchs data)
+    snapshot_dir: Optional[str]
+        Directory to keep a snapshot of the datasets in, so only rows updated since the last pull are pulled
     test_file: Optional[str]
         When not null, name of file from which to read test data
 
@@ -98,12 +101,12 @@ def pull_nwss_data(socrata_token: str):
     # concentration key types
     type_dict, type_dict_metric = construct_typedicts()
 
-    # Pull data from Socrata API
-    client = Socrata("data.cdc.gov", socrata_token)
-    results_concentration = client.get("g653-rqe2", limit=10**10)
-    results_metric = client.get("2ew6-ywp6", limit=10**10)
-    df_metric = pd.DataFrame.from_records(results_metric)
-    df_concentration = pd.DataFrame.from_records(results_concentration)
+    # Pull data from Socrata API, typing the rows as they are pulled; missing columns are reported below
+    source_type_dict = {("date" if key == "timestamp" else key): dtype for key, dtype in type_dict.items()}
+    df_concentration = fetch_socrata("g653-rqe2", socrata_token, type_dict=source_type_dict, strict_types=False,
+                                     snapshot_dir=snapshot_dir)
+    df_metric = fetch_socrata("2ew6-ywp6", socrata_token, type_dict=type_dict_metric, strict_types=False,
+                              snapshot_dir=snapshot_dir)
     df_concentration = df_concentration.rename(columns={"date": "timestamp"})
 
     try:
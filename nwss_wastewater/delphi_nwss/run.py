@@ -16,6 +16,11 @@ the following structure:
             `delphi_utils.add_prefix()`
         - "test_file" (optional): str, name of file from which to read test data
         - "socrata_token": str, authentication for upstream data pull
+        - "socrata_snapshot_dir" (optional): str, directory to keep a snapshot of the source
+            datasets in, so that only rows updated since the previous run are pulled
+        - "export_plan_dir" (optional): str, directory to keep hashes of the pulled rows in,
+            so that only dates whose rows changed since the previous run are exported. Ignored
+            when validation isn't a dry run; see `delphi_utils.export_plan`.
     - "archive" (optional): if provided, output will be archived with S3
         - "aws_credentials": Dict[str, str], AWS login credentials (see S3 documentation)
         - "bucket_name: str, name of S3 bucket to read/write
@@ -23,62 +28,58 @@ the following structure:
 """
 import time
 from datetime import datetime
+from typing import Dict, List
 
 import numpy as np
 import pandas as pd
-from delphi_utils import S3ArchiveDiffer, get_structured_logger, create_export_csv
+from delphi_utils import ExportPlan, S3ArchiveDiffer, get_export_plan_dir, get_structured_logger, create_export_csv
 from delphi_utils.nancodes import add_default_nancodes
+from delphi_utils.profiling import profile_stage
 
 from .constants import GEOS, SIGNALS
 from .pull import pull_nwss_data
 
 
-def sum_all_nan(x):
-    """Return a normal sum unless everything is NaN, then return that."""
-    all_nan = np.isnan(x).all()
-    if all_nan:
-        return np.nan
-    return np.nansum(x)
-
-
-def generate_weights(df, column_aggregating="pcr_conc_smoothed"):
+def weighted_sums(df: pd.DataFrame, sensors: List[str]) -> Dict[str, pd.DataFrame]:
     """
-    Weigh column_aggregating by population.
+    Average sensors over sites, weighted by population served, by state and nation.
 
-    generate the relevant population amounts, and create a weighted but
-    unnormalized column, derived from `column_aggregating`
+    Sites missing a sensor's value get no weight in its average, and the average is NaN when
+    no site has a value. Sites are summed once per (timestamp, state); the nation sums
+    those state totals, including sites whose state is unknown.
+
+    Returns
+    -------
+    Dict[str, pd.DataFrame]
+        For "state" and "nation", a frame with columns "timestamp", "geo_id" and one
+        column per sensor holding its weighted average
     """
+    values = df[sensors].to_numpy(dtype=float)
     # set the weight of places with na's to zero
-    df[f"relevant_pop_{column_aggregating}"] = (
-        df["population_served"] * df[column_aggregating].notna()
-    )
-    # generate the weighted version
-    df[f"weighted_{column_aggregating}"] = (
-        df[column_aggregating] * df[f"relevant_pop_{column_aggregating}"]
+    relevant_pop = df["population_served"].to_numpy(dtype=float)[:, None] * ~np.isnan(values)
+    weighted_columns = [f"weighted_{sensor}" for sensor in sensors]
+    weights = pd.DataFrame(
+        np.hstack([relevant_pop, values * relevant_pop]),
+        index=df.index,
+        columns=[f"relevant_pop_{sensor}" for sensor in sensors] + weighted_columns,
     )
-    return df
-
-
-def weighted_state_sum(df: pd.DataFrame, geo: str, sensor: str):
-    """Sum sensor, weighted by population for non NA's, grouped by state."""
-    agg_df = df.groupby(["timestamp", geo]).agg(
-        {f"relevant_pop_{sensor}": "sum", f"weighted_{sensor}": sum_all_nan}
+    grouped = weights.groupby([df["timestamp"], df["state"]], dropna=False)
+    state_sums = grouped.sum()
+    state_counts = grouped[weighted_columns].count()
+
+    def weighted_averages(sums, counts):
+        averages = pd.DataFrame(index=sums.index)
+        for sensor in sensors:
+            weighted = sums[f"weighted_{sensor}"].where(counts[f"weighted_{sensor}"] > 0)
+            averages[sensor] = weighted / sums[f"relevant_pop_{sensor}"]
+        return averages.reset_index()
+
+    state_df = weighted_averages(state_sums, state_counts).rename(columns={"state": "geo_id"})
+    nation_df = weighted_averages(
+        state_sums.groupby(level="timestamp").sum(), state_counts.groupby(level="timestamp").sum()
     )
-    agg_df["val"] = agg_df[f"weighted_{sensor}"] / agg_df[f"relevant_pop_{sensor}"]
-    agg_df = agg_df.reset_index()
-    agg_df = agg_df.rename(columns={"state": "geo_id"})
-    return agg_df
-
-
-def weighted_nation_sum(df: pd.DataFrame, sensor: str):
-    """Sum sensor, weighted by population for non NA's."""
-    agg_df = df.groupby("timestamp").agg(
-        {f"relevant_pop_{sensor}": "sum", f"weighted_{sensor}": sum_all_nan}
-    )
-    agg_df["val"] = agg_df[f"weighted_{sensor}"] / agg_df[f"relevant_pop_{sensor}"]
-    agg_df = agg_df.reset_index()
-    agg_df["geo_id"] = "us"
-    return agg_df
+    nation_df.insert(1, "geo_id", "us")
+    return {"state": state_df.dropna(subset=["geo_id"]).reset_index(drop=True), "nation": nation_df}
 
 
 def add_needed_columns(df, col_names=None):
@@ -138,26 +139,34 @@ def run_module(params):
     run_stats = []
     ## build the base version of the signal at the most detailed geo level you can get.
     ## compute stuff here or farm out to another function or file
-    df_pull = pull_nwss_data(socrata_token)
+    df_pull = pull_nwss_data(socrata_token, params["indicator"].get("socrata_snapshot_dir"))
+    export_plan = ExportPlan(
+        df_pull,
+        get_export_plan_dir(params, logger),
+        "nwss",
+        ["state"],
+        output_config={"signals": SIGNALS, "geos": GEOS},
+        logger=logger,
+    )
     ## aggregate
-    for sensor in SIGNALS:
-        df = df_pull.copy()
-        # add weighed column
-        df = generate_weights(df, sensor)
-
-        for geo in GEOS:
+    with profile_stage("aggregate") as stage:
+        agg_dfs = weighted_sums(df_pull, SIGNALS)
+        stage.add_rows(len(df_pull))
+    for geo in GEOS:
+        for sensor in SIGNALS:
             logger.info("Generating signal and exporting to CSV", geo_type=geo, signal=sensor)
-            if geo == "nation":
-                agg_df = weighted_nation_sum(df, sensor)
-            else:
-                agg_df = weighted_state_sum(df, geo, sensor)
-            # add se, sample_size, and na codes
-            agg_df = add_needed_columns(agg_df)
+            with profile_stage("compute", geo=geo, signal=sensor) as stage:
+                agg_df = agg_dfs[geo][["timestamp", "geo_id", sensor]].rename(columns={sensor: "val"})
+                # add se, sample_size, and na codes
+                agg_df = add_needed_columns(agg_df)
+                stage.add_rows(len(agg_df))
             # actual export
             dates = create_export_csv(
-                agg_df, geo_res=geo, export_dir=export_dir, sensor=sensor
+                agg_df, geo_res=geo, export_dir=export_dir, sensor=sensor, only_dates=export_plan.dates
             )
             if len(dates) > 0:
                 run_stats.append((max(dates), len(dates)))
+    export_plan.save()
+
     ## log this indicator run
     logging(start_time, run_stats, logger)
@@ -12,7 +12,6 @@ required = [
     "pylint==2.8.3",
     "pytest-cov",
     "pytest",
-    "sodapy",
 ]
 
 setup(
@@ -9,8 +9,11 @@ from datetime import datetime
 import pandas as pd
 import pandas.api.types as ptypes
 
+import pytest
+
 from delphi_nwss.pull import (
     construct_typedicts,
+    pull_nwss_data,
     sig_digit_round,
     add_population,
     warn_string,
@@ -135,3 +138,12 @@ def test_formatting():
             ]
         )
     )
+
+
+@patch("delphi_nwss.pull.fetch_socrata")
+def test_pull_nwss_data_missing_column(mock_fetch):
+    df_concentration = pd.read_csv("test_data/conc_data.csv", index_col=0)
+    df_metric = pd.read_csv("test_data/metric_data.csv", index_col=0)
+    mock_fetch.side_effect = [df_concentration.drop(columns="pcr_conc_smoothed"), df_metric]
+    with pytest.raises(ValueError, match="schema may"):
+        pull_nwss_data("test_token")
@@ -11,6 +11,12 @@ from delphi_utils import GeoMapper
 
 gmpr = GeoMapper()
 
+def backfill_start_date(_end_date):
+    """Get the first date of the one year of data stored in backfill files."""
+    if _end_date.day == 29 and _end_date.month == 2:
+        return datetime(_end_date.year-1, 2, 28)
+    return _end_date.replace(year=_end_date.year-1)
+
 def store_backfill_file(df, _end_date, backfill_dir):
     """
     Store county level backfill data into backfill_dir.
@@ -45,10 +51,7 @@ def store_backfill_file(df, _end_date, backfill_dir):
                         "totalTest_age_0_17": "den_age_0_17"},
                         axis=1, inplace=True)
     #Store one year's backfill data
-    if _end_date.day == 29 and _end_date.month == 2:
-        _start_date = datetime(_end_date.year-1, 2, 28)
-    else:
-        _start_date = _end_date.replace(year=_end_date.year-1)
+    _start_date = backfill_start_date(_end_date)
     selected_columns = ['time_value', 'fips', 'state_id',
                         'den_total', 'num_total',
                         'num_age_0_4', 'den_age_0_4',
@@ -49,3 +49,7 @@ AGE_GROUPS = [
     "age_65plus",
     "age_0_17",
 ]
+# Age groups pooling the tests of several others
+POOLED_AGE_GROUPS = {
+    "age_0_17": ["age_0_4", "age_5_17"],
+}
@@ -52,8 +52,8 @@ def _slide_window_sum(arr, k):
     Sliding window sum, with fixed window size k.
 
     For indices 0:k, we DO compute a sum, using whatever points are available.
-
-    Reference: https://stackoverflow.com/a/38507725
+    For 2-d arrays, the window slides along the first (date) axis, so each
+    column is summed independently.
 
     Args:
         arr: np.ndarray
@@ -63,12 +63,14 @@ def _slide_window_sum(arr, k):
 
     Returns:
         sarr: np.ndarray
-            Array of same length of arr, holding the sliding window sum.
+            Array of same shape of arr, holding the sliding window sum.
     """
     if not isinstance(k, int):
         raise ValueError('k must be int.')
-    temp = np.append(np.zeros(k - 1), arr)
-    sarr = np.convolve(temp, np.ones(k, dtype=int), 'valid')
+    temp = np.concatenate([np.zeros((k - 1,) + arr.shape[1:], dtype=arr.dtype), arr])
+    sarr = temp[k - 1:].copy()
+    for shift in range(1, k):
+        sarr += temp[k - 1 - shift:len(temp) - shift]
     return sarr
 
 def _geographical_pooling(tpooled_tests, tpooled_ptests, min_obs):
@@ -307,7 +309,7 @@ def raw_tests_per_device(devices, tests, min_obs):
         raise ValueError('min_obs should be positive')
     tests[tests < min_obs] = np.nan
     tests_per_device = tests / devices
-    se = np.repeat(np.nan, len(devices))
+    se = np.full(devices.shape, np.nan)
     sample_size = tests
 
     return tests_per_device, se, sample_size
@@ -393,3 +395,166 @@ def smoothed_tests_per_device(devices, tests, min_obs, pool_days,
         pooled_tests = tpooled_tests
     ## STEP 2: CALCULATE AS THOUGH THEY'RE RAW
     return raw_tests_per_device(pooled_devices, pooled_tests, min_obs)
+
+
+def _parent_panel(parent_values, parent_index, present=None):
+    """
+    Align parent observations with the locations of a panel.
+
+    Args:
+        parent_values: np.ndarray[float]
+            (date x parent) matrix of parent observations
+        parent_index: np.ndarray[int]
+            Column of each location's parent in parent_values, or -1 if it has none
+        present: np.ndarray[bool]
+            (date x location) mask of the days parent observations count for.
+            If this is None, they count for all days.
+    Returns:
+        np.ndarray[float]
+            (date x location) matrix of parent observations, 0 for locations
+            without a parent and for days outside of present.
+    """
+    values = np.where(parent_index >= 0, parent_values[:, parent_index], 0.)
+    if present is not None:
+        values = np.where(present, values, 0.)
+    return values
+
+def _pool_panel(counts, tests, min_obs, pool_days,
+                parent_counts, parent_tests, parent_index, present):
+    """
+    Do the temporal and geographical pooling of every location of a panel.
+
+    See smoothed_positive_prop_panel for the arguments. Returns the pooled
+    (date x location) counts and tests.
+    """
+    if min_obs <= 0:
+        raise ValueError('min_obs should be positive')
+    if (pool_days <= 0) or not isinstance(pool_days, int):
+        raise ValueError('pool_days should be a positive int')
+    tpooled_counts = _slide_window_sum(counts, pool_days)
+    tpooled_tests = _slide_window_sum(tests, pool_days)
+    if (parent_counts is None) or (parent_tests is None):
+        return tpooled_counts, tpooled_tests
+    if parent_index is None:
+        parent_index = np.arange(counts.shape[1])
+    tpooled_pcounts = _slide_window_sum(
+        _parent_panel(parent_counts, parent_index, present), pool_days)
+    tpooled_ptests = _slide_window_sum(
+        _parent_panel(parent_tests, parent_index, present), pool_days)
+    # Locations without a parent have no parent tests, so borrow nothing
+    borrow_prop = _geographical_pooling(tpooled_tests, tpooled_ptests, min_obs)
+    return (tpooled_counts + borrow_prop * tpooled_pcounts,
+            tpooled_tests + borrow_prop * tpooled_ptests)
+
+def smoothed_positive_prop_panel(positives, tests, min_obs, pool_days,
+                                 parent_positives=None, parent_tests=None,
+                                 parent_index=None, present=None):
+    """
+    Calculate the proportion of positive tests, with temporal smoothing, for many locations.
+
+    This is smoothed_positive_prop applied to each column of (date x location)
+    matrices at once. Each location borrows observations from its parent,
+    found through parent_index, as smoothed_positive_prop does.
+
+    Args:
+        positives: np.ndarray[float]
+            (date x location) matrix of positive tests, never np.nan.
+        tests: np.ndarray[float]
+            (date x location) matrix of tests performed, never np.nan.
+        min_obs: int
+            Minimum number of observations in order to compute a proportion.
+        pool_days: int
+            Number of days in the past (including today) over which to pool data.
+        parent_positives: np.ndarray
+            (date x parent) matrix of positive tests in the parent geographic
+            partitions (e.g., States). If this is None, no location has a parent.
+        parent_tests: np.ndarray
+            (date x parent) matrix of tests in the parent geographic partitions.
+            If this is None, no location has a parent.
+        parent_index: np.ndarray[int]
+            Column of each location's parent, or -1 if the location has none.
+            If this is None, the parent matrices are aligned with the locations.
+        present: np.ndarray[bool]
+            (date x location) mask of the days on which each location may
+            borrow from its parent. If this is None, it may borrow on all days.
+
+    Returns:
+        np.ndarray
+            (date x location) proportions of positive tests after pooling.
+        np.ndarray
+            Standard errors, calculated using the usual binomial variance.
+        np.ndarray
+            Effective sample size (after temporal and geographic pooling).
+    """
+    positives = positives.astype(float)
+    tests = tests.astype(float)
+    if np.any(np.isnan(positives)) or np.any(np.isnan(tests)):
+        raise ValueError('positives and tests '
+                         'should be non-negative with no np.nan')
+    if np.any(positives > tests):
+        raise ValueError('positives should not exceed tests')
+    if (parent_positives is not None) and (parent_tests is not None):
+        parent_positives = parent_positives.astype(float)
+        parent_tests = parent_tests.astype(float)
+        if np.any(np.isnan(parent_positives)) or np.any(np.isnan(parent_tests)):
+            raise ValueError('parent positives and parent tests '
+                             'should be non-negative with no np.nan')
+        if np.any(parent_positives > parent_tests):
+            raise ValueError('positives should not exceed tests')
+    pooled_positives, pooled_tests = _pool_panel(
+        positives, tests, min_obs, pool_days,
+        parent_positives, parent_tests, parent_index, present)
+    return raw_positive_prop(pooled_positives, pooled_tests, min_obs)
+
+def smoothed_tests_per_device_panel(devices, tests, min_obs, pool_days,
+                                    parent_devices=None, parent_tests=None,
+                                    parent_index=None, present=None):
+    """
+    Calculate the ratio of tests per device, with temporal smoothing, for many locations.
+
+    This is smoothed_tests_per_device applied to each column of (date x location)
+    matrices at once; see smoothed_positive_prop_panel for how parents are used.
+
+    Args:
+        devices: np.ndarray[float]
+            (date x location) matrix of devices, never np.nan.
+        tests: np.ndarray[float]
+            (date x location) matrix of tests performed, never np.nan.
+        min_obs: int
+            Minimum number of observations in order to compute a ratio
+        pool_days: int
+            Number of days in the past (including today) over which to pool data.
+        parent_devices: np.ndarray
+            (date x parent) matrix of devices in the parent geographic partitions.
+        parent_tests: np.ndarray
+            (date x parent) matrix of tests in the parent geographic partitions.
+        parent_index: np.ndarray[int]
+            Column of each location's parent, or -1 if the location has none.
+        present: np.ndarray[bool]
+            (date x location) mask of the days on which each location may
+            borrow from its parent.
+
+    Returns:
+        np.ndarray
+            (date x location) tests per device after pooling.
+        np.ndarray
+            Standard errors, currently uniformly np.nan (placeholder).
+        np.ndarray
+            Effective sample size (after temporal and geographic pooling).
+    """
+    devices = devices.astype(float)
+    tests = tests.astype(float)
+    if (np.any(np.isnan(devices)) or np.any(np.isnan(tests))):
+        raise ValueError('devices and tests '
+                         'should be non-negative with no np.nan')
+    if (parent_devices is not None) and (parent_tests is not None):
+        parent_devices = parent_devices.astype(float)
+        parent_tests = parent_tests.astype(float)
+        if (np.any(np.isnan(parent_devices))
+            or np.any(np.isnan(parent_tests))):
+            raise ValueError('parent devices and parent tests '
+                       'should be non-negative with no np.nan')
+    pooled_devices, pooled_tests = _pool_panel(
+        devices, tests, min_obs, pool_days,
+        parent_devices, parent_tests, parent_index, present)
+    return raw_tests_per_device(pooled_devices, pooled_tests, min_obs)
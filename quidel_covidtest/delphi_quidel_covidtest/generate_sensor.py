@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 """Functions to help generate sensor for different geographical levels."""
+import numpy as np
 import pandas as pd
-from .data_tools import (fill_dates, raw_positive_prop,
-                         smoothed_positive_prop,
-                         smoothed_tests_per_device,
+from .data_tools import (raw_positive_prop,
+                         smoothed_positive_prop_panel,
+                         smoothed_tests_per_device_panel,
                          raw_tests_per_device,
                          remove_null_samples)
 from .geo_maps import add_megacounties
+from .panel import GeoPanel
 
 from .constants import (MIN_OBS, POOL_DAYS)
 
@@ -27,51 +29,8 @@ def generate_sensor_for_nonparent_geo(state_groups, res_key, smooth, device,
     Returns:
         df: pd.DataFrame
     """
-    state_list = list(state_groups.groups.keys())
-    df_list = []
-    for state in state_list:
-        state_group = state_groups.get_group(state)
-        state_group = state_group.drop(columns=[res_key])
-        state_group.set_index("timestamp", inplace=True)
-        state_group = fill_dates(state_group, first_date, last_date)
-
-        # smoothed test per device
-        if device & smooth:
-            stat, se, sample_size = smoothed_tests_per_device(
-                devices=state_group[f"numUniqueDevices_{suffix}"].values,
-                tests=state_group[f'totalTest_{suffix}'].values,
-                min_obs=MIN_OBS, pool_days=POOL_DAYS)
-        # raw test per device
-        elif device & (not smooth):
-            stat, se, sample_size = raw_tests_per_device(
-                devices=state_group[f"numUniqueDevices_{suffix}"].values,
-                tests=state_group[f'totalTest_{suffix}'].values,
-                min_obs=MIN_OBS)
-        # smoothed pct positive
-        elif (not device) & smooth:
-            stat, se, sample_size = smoothed_positive_prop(
-                tests=state_group[f'totalTest_{suffix}'].values,
-                positives=state_group[f'positiveTest_{suffix}'].values,
-                min_obs=MIN_OBS, pool_days=POOL_DAYS)
-            stat = stat * 100
-        # raw pct positive
-        else:
-            stat, se, sample_size = raw_positive_prop(
-                tests=state_group[f'totalTest_{suffix}'].values,
-                positives=state_group[f'positiveTest_{suffix}'].values,
-                min_obs=MIN_OBS)
-            stat = stat * 100
-
-        se = se * 100
-        df_list.append(
-            pd.DataFrame({"geo_id": state,
-                         "timestamp": state_group.index,
-                         "val": stat,
-                         "se": se,
-                         "sample_size": sample_size})
-        )
-
-    return remove_null_samples(pd.concat(df_list))
+    panel = GeoPanel.from_frame(state_groups.obj, res_key, first_date, last_date)
+    return generate_sensor_for_nonparent_panel(panel, smooth, device, suffix)
 
 def generate_sensor_for_parent_geo(state_groups, data, res_key, smooth,
                                    device, first_date, last_date, suffix):
@@ -90,72 +49,100 @@ def generate_sensor_for_parent_geo(state_groups, data, res_key, smooth,
     Returns:
         df: pd.DataFrame
     """
-    has_parent = True
     if res_key == "fips": # Add rest-of-state report for county level
         data = add_megacounties(data, smooth)
-    df_list = []
-    for loc, res_group in data.groupby(res_key):
-        parent_state = res_group['state_id'].values[0]
-        try:
-            parent_group = state_groups.get_group(parent_state)
-            res_group = res_group.merge(parent_group, how="left",
-                                        on="timestamp", suffixes=('', '_parent'))
-            res_group = res_group.drop(columns=[res_key, "state_id", "state_id" + '_parent'])
-        except KeyError:
-            has_parent = False
-            res_group = res_group.drop(columns=[res_key, "state_id"])
-        res_group.set_index("timestamp", inplace=True)
-        res_group = fill_dates(res_group, first_date, last_date)
+    state_panel = GeoPanel.from_frame(state_groups.obj, "state_id", first_date, last_date)
+    panel = GeoPanel.from_frame(data, res_key, first_date, last_date, parent_key="state_id")
+    return generate_sensor_for_parent_panel(state_panel, panel, smooth, device, suffix)
+
+def generate_sensor_for_nonparent_panel(panel, smooth, device, suffix):
+    """
+    Fit over a panel of a geo resolution that doesn't use a parent state (nation/hhs/state).
+
+    Args:
+        panel: GeoPanel
+        smooth: bool
+            Consider raw or smooth
+        device: bool
+            Consider test_per_device or pct_positive
+        suffix: str
+            Indicate the age group
+    Returns:
+        df: pd.DataFrame
+    """
+    return _generate_sensor(panel, None, smooth, device, suffix)
+
+def generate_sensor_for_parent_panel(state_panel, panel, smooth, device, suffix):
+    """
+    Fit over a panel of a geo resolution that uses a parent state (county/hrr/msa).
+
+    Smoothed signals borrow observations from the location's parent state in
+    `state_panel`, if it has one.
+
+    Args:
+        state_panel: GeoPanel
+            Panel at the state level
+        panel: GeoPanel
+            Panel with parent states
+        smooth: bool
+            Consider raw or smooth
+        device: bool
+            Consider test_per_device or pct_positive
+        suffix: str
+            Indicate the age group
+    Returns:
+        df: pd.DataFrame
+    """
+    return _generate_sensor(panel, state_panel, smooth, device, suffix)
 
-        if smooth:
-            if has_parent:
-                if device:
-                    stat, se, sample_size = smoothed_tests_per_device(
-                        devices=res_group[f"numUniqueDevices_{suffix}"].values,
-                        tests=res_group[f'totalTest_{suffix}'].values,
-                        min_obs=MIN_OBS, pool_days=POOL_DAYS,
-                        parent_devices=res_group[f"numUniqueDevices_{suffix}_parent"].values,
-                        parent_tests=res_group[f"totalTest_{suffix}_parent"].values)
-                else:
-                    stat, se, sample_size = smoothed_positive_prop(
-                        tests=res_group[f'totalTest_{suffix}'].values,
-                        positives=res_group[f'positiveTest_{suffix}'].values,
-                        min_obs=MIN_OBS, pool_days=POOL_DAYS,
-                        parent_tests=res_group[f"totalTest_{suffix}_parent"].values,
-                        parent_positives=res_group[f'positiveTest_{suffix}_parent'].values)
-                    stat = stat * 100
-            else:
-                if device:
-                    stat, se, sample_size = smoothed_tests_per_device(
-                        devices=res_group[f"numUniqueDevices_{suffix}"].values,
-                        tests=res_group[f'totalTest_{suffix}'].values,
-                        min_obs=MIN_OBS, pool_days=POOL_DAYS)
-                else:
-                    stat, se, sample_size = smoothed_positive_prop(
-                        tests=res_group[f'totalTest_{suffix}'].values,
-                        positives=res_group[f'positiveTest_{suffix}'].values,
-                        min_obs=MIN_OBS, pool_days=POOL_DAYS)
-                    stat = stat * 100
-        else:
-            if device:
-                stat, se, sample_size = raw_tests_per_device(
-                    devices=res_group[f"numUniqueDevices_{suffix}"].values,
-                    tests=res_group[f'totalTest_{suffix}'].values,
-                    min_obs=MIN_OBS)
-            else:
-                stat, se, sample_size = raw_positive_prop(
-                    tests=res_group[f'totalTest_{suffix}'].values,
-                    positives=res_group[f'positiveTest_{suffix}'].values,
-                    min_obs=MIN_OBS)
-                stat = stat * 100
+def _generate_sensor(panel, state_panel, smooth, device, suffix):
+    """Compute the sensor for all locations of a panel at once, using parent states if provided."""
+    count_col = f"numUniqueDevices_{suffix}" if device else f"positiveTest_{suffix}"
+    # (date x location) matrices
+    tests = panel.column(f"totalTest_{suffix}").T
+    counts = panel.column(count_col).T
+    parent_args = {}
+    if state_panel is not None and smooth:
+        parent_idx = [state_panel.geo_index(state) for state in panel.parent_states]
+        parent_count_arg = "parent_devices" if device else "parent_positives"
+        parent_args = {
+            parent_count_arg: state_panel.column(count_col).T,
+            "parent_tests": state_panel.column(f"totalTest_{suffix}").T,
+            "parent_index": np.array([-1 if idx is None else idx for idx in parent_idx]),
+            # Parent observations only count on days the location itself reported
+            "present": panel.present.T,
+        }
 
-        se = se * 100
-        df_list.append(
-            pd.DataFrame({"geo_id": loc,
-                         "timestamp": res_group.index,
-                         "val": stat,
-                         "se": se,
-                         "sample_size": sample_size})
-        )
+    # smoothed test per device
+    if device & smooth:
+        stat, se, sample_size = smoothed_tests_per_device_panel(
+            devices=counts, tests=tests,
+            min_obs=MIN_OBS, pool_days=POOL_DAYS, **parent_args)
+    # raw test per device
+    elif device & (not smooth):
+        stat, se, sample_size = raw_tests_per_device(
+            devices=counts, tests=tests,
+            min_obs=MIN_OBS)
+    # smoothed pct positive
+    elif (not device) & smooth:
+        stat, se, sample_size = smoothed_positive_prop_panel(
+            tests=tests, positives=counts,
+            min_obs=MIN_OBS, pool_days=POOL_DAYS, **parent_args)
+        stat = stat * 100
+    # raw pct positive
+    else:
+        stat, se, sample_size = raw_positive_prop(
+            tests=tests, positives=counts,
+            min_obs=MIN_OBS)
+        stat = stat * 100
 
-    return remove_null_samples(pd.concat(df_list))
+    se = se * 100
+    n_dates, n_locs = len(panel.dates), len(panel.geo_ids)
+    df = pd.DataFrame({"geo_id": np.repeat(panel.geo_ids, n_dates),
+                       "timestamp": np.tile(panel.dates, n_locs),
+                       "val": stat.T.ravel(),
+                       "se": se.T.ravel(),
+                       "sample_size": sample_size.T.ravel()},
+                      # Same index as concatenating one frame per location
+                      index=np.tile(np.arange(n_dates), n_locs))
+    return remove_null_samples(df)
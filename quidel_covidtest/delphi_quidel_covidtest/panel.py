@@ -0,0 +1,116 @@
+"""Geo panels: (geo x date x column) arrays of geo-mapped counts."""
+import numpy as np
+import pandas as pd
+
+# Panel column marking the (geo, date) pairs that had a row in the source frame.
+PRESENT_COL = "_present"
+
+
+class GeoPanel:
+    """Counts for every location of one geo resolution on every date of a range.
+
+    Dates without data for a location are filled with 0, as `data_tools.fill_dates` does.
+    Values are stored column by column as (geo x date) blocks, so reading a few columns
+    only touches those. A panel written with `save` is backed by a memory-mapped file and
+    pickles as just its metadata, so pool workers can share it without copying the data.
+    """
+
+    def __init__(self, geo_ids, dates, columns, values, parent_states=None, filename=None):
+        """Create a panel.
+
+        Args:
+            geo_ids: np.ndarray
+                Location ids, in order of the geo axis
+            dates: pd.DatetimeIndex
+                Consecutive days, in order of the date axis
+            columns: List[str]
+                Column names, in order of the column axis
+            values: np.ndarray
+                Array of shape (len(columns), len(geo_ids), len(dates))
+            parent_states: Optional[np.ndarray]
+                Parent state_id of each location, if any
+            filename: Optional[str]
+                File backing `values`, if memory-mapped
+        """
+        self.geo_ids = geo_ids
+        self.dates = dates
+        self.columns = list(columns)
+        self.values = values
+        self.parent_states = parent_states
+        self.filename = filename
+
+    @classmethod
+    def from_frame(cls, data, res_key, first_date, last_date, parent_key=None):
+        """Build a panel from a long frame with one row per (location, timestamp).
+
+        Args:
+            data: pd.DataFrame
+                Frame with columns `res_key`, "timestamp", optionally `parent_key`,
+                and numeric count columns
+            res_key: str
+                Name of the location column
+            first_date, last_date: datetime.datetime
+                First and last dates of the panel
+            parent_key: Optional[str]
+                Name of the column holding each location's parent state
+        Returns:
+            GeoPanel
+        """
+        dates = pd.date_range(first_date, last_date)
+        columns = [col for col in data.select_dtypes(include="number").columns
+                   if col not in (res_key, "timestamp", parent_key)]
+        geo_ids, geo_idx = np.unique(data[res_key].values, return_inverse=True)
+        date_idx = dates.get_indexer(pd.to_datetime(data["timestamp"]))
+        in_range = date_idx >= 0
+
+        values = np.zeros((len(columns) + 1, len(geo_ids), len(dates)))
+        values[:-1, geo_idx[in_range], date_idx[in_range]] = \
+            data[columns].to_numpy(dtype=float)[in_range].T
+        values[-1, geo_idx[in_range], date_idx[in_range]] = 1
+
+        parent_states = None
+        if parent_key is not None:
+            # Each location's parent is taken from its first row
+            _, first_row = np.unique(geo_idx, return_index=True)
+            parent_states = data[parent_key].values[first_row]
+        return cls(geo_ids, dates, columns + [PRESENT_COL], values, parent_states)
+
+    def save(self, filename):
+        """Write the panel values to a memory-mapped file and return a panel backed by it."""
+        values = np.memmap(filename, dtype=float, mode="w+", shape=self.values.shape)
+        values[:] = self.values
+        values.flush()
+        return GeoPanel(self.geo_ids, self.dates, self.columns,
+                        np.memmap(filename, dtype=float, mode="r", shape=self.values.shape),
+                        self.parent_states, filename)
+
+    def __getstate__(self):
+        """Pickle file-backed panels without their values."""
+        state = self.__dict__.copy()
+        if self.filename is not None:
+            state["values"] = None
+            state["shape"] = self.values.shape
+        return state
+
+    def __setstate__(self, state):
+        """Reopen the memory-mapped values of file-backed panels."""
+        shape = state.pop("shape", None)
+        self.__dict__.update(state)
+        if self.values is None:
+            self.values = np.memmap(self.filename, dtype=float, mode="r", shape=shape)
+
+    def column(self, name):
+        """Get the (geo x date) values of a column."""
+        return np.asarray(self.values[self.columns.index(name)])
+
+    @property
+    def present(self):
+        """Get the (geo x date) mask of entries that had a row in the source frame."""
+        return self.column(PRESENT_COL) > 0
+
+    def geo_index(self, geo_id):
+        """Get the position of a location on the geo axis, or None if it is absent."""
+        idx = np.searchsorted(self.geo_ids, geo_id)
+        if idx < len(self.geo_ids) and self.geo_ids[idx] == geo_id:
+            return idx
+        return None
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """Collect and process Quidel export files."""
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join
+import json
 import os
 import time
 from datetime import datetime, timedelta
@@ -9,14 +11,140 @@ import boto3
 import pandas as pd
 import numpy as np
 
-from .constants import AGE_GROUPS
+from .backfill import backfill_start_date
+from .constants import AGE_GROUPS, POOLED_AGE_GROUPS, END_FROM_TODAY_MINUS, POOL_DAYS
+
+# Age group labels of tests, including tests without a patient age
+AGE_GROUP_CATEGORIES = AGE_GROUPS + ["NA"]
+
+# Columns read from the Quidel CSV files, besides the dates
+S3_DTYPES = {
+    "SofiaSerNum": str, "Facility": str, "City": str, "State": str, "Zip": str,
+    "PatientAge": str, "Result1": str, "Result2": str, "OverallResult": str,
+}
+SELECTED_COLUMNS = ['SofiaSerNum', 'TestDate', 'Facility', 'City',
+                    'State', 'Zip', 'PatientAge', 'Result1',
+                    'Result2', 'OverallResult', 'StorageDate',
+                    'fname']
+# Cache partitions in input_cache_dir, with the data pulled until a date, and in the current run
+CACHE_FILE = "pulled_until_%Y%m%d.parquet"
+PENDING_CACHE_FILE = "pulled_pending.parquet"
+# Files in input_cache_dir listing the S3 objects ingested so far, and in the current run
+MANIFEST_FILE = "s3_manifest.json"
+PENDING_MANIFEST_FILE = "s3_manifest_pending.json"
+
+def read_manifest(cache_dir, filename=MANIFEST_FILE):
+    """Read the S3 object keys ingested so far, mapped to their ETags."""
+    path = join(cache_dir, filename)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def write_manifest(manifest, cache_dir, filename=MANIFEST_FILE):
+    """Write S3 object keys mapped to their ETags."""
+    with open(join(cache_dir, filename), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+def commit_manifest(cache_dir):
+    """
+    Add the objects ingested by this run to the manifest.
+
+    The objects of a run are kept in a pending manifest until their data is
+    in the cache file, so that a failed run ingests them again next time.
+    """
+    pending = read_manifest(cache_dir, PENDING_MANIFEST_FILE)
+    if pending:
+        manifest = read_manifest(cache_dir)
+        manifest.update(pending)
+        write_manifest(manifest, cache_dir)
+    if os.path.exists(join(cache_dir, PENDING_MANIFEST_FILE)):
+        os.remove(join(cache_dir, PENDING_MANIFEST_FILE))
+
+def _parse_received_date(date_string):
+    """Parse a YYYY_MM_DD folder name, or return None if it is not one."""
+    try:
+        yy, mm, dd = (int(x) for x in date_string.split("_")[:3])
+        return datetime(yy, mm, dd)
+    except ValueError:
+        return None
+
+def read_cached_manifest(cache_dir):
+    """
+    Read the manifest entries of the S3 objects whose data is in the cache files.
+
+    Entries are only trusted for objects received on/before the latest date the
+    cache files were pulled until. If cache files are deleted to rebuild the
+    cache, the pull start date is rewound, and the objects received since are
+    ingested again rather than skipped.
+    """
+    latest_date = _latest_cache_date(cache_dir)
+    if latest_date is None:
+        return {}
+    manifest = {}
+    for key, etag in read_manifest(cache_dir).items():
+        folders = key.split("/")[:-1]
+        received_date = _parse_received_date(folders[-1]) if folders else None
+        if received_date is not None and received_date <= latest_date:
+            manifest[key] = etag
+    return manifest
+
+def list_received_objects(start_date, end_date, bucket):
+    """
+    List the Quidel CSV files in an S3 bucket by the date they were received.
 
+    Files are stored as <folder>/<YYYY_MM_DD>/<name>, so only the date folders
+    between the start and end date are listed, not the whole bucket.
+
+    Args:
+        start_date: datetime.datetime
+            list files received on/after the start date
+        end_date: datetime.datetime
+            list files received on/before the end date
+        bucket: s3.Bucket
+            the aws s3 bucket that stores quidel data
+    Returns:
+        Dict[datetime.datetime, List[Tuple[str, str]]]: (key, ETag) of the files
+        received on each date
+    """
+    paginator = bucket.meta.client.get_paginator("list_objects_v2")
 
+    def common_prefixes(prefix):
+        for page in paginator.paginate(Bucket=bucket.name, Prefix=prefix, Delimiter="/"):
+            for common_prefix in page.get("CommonPrefixes", []):
+                yield common_prefix["Prefix"]
 
-def get_from_s3(start_date, end_date, bucket, logger):
+    s3_files = {}
+    for folder in common_prefixes(""):
+        for date_prefix in common_prefixes(folder):
+            received_date = _parse_received_date(date_prefix[len(folder):].rstrip("/"))
+            if received_date is None or not start_date <= received_date <= end_date:
+                continue
+            for page in paginator.paginate(Bucket=bucket.name, Prefix=date_prefix):
+                for obj in page.get("Contents", []):
+                    # Skip non-CSV files, such as directories
+                    if "-sars" in obj["Key"] and ".csv" in obj["Key"]:
+                        s3_files.setdefault(received_date, []).append(
+                            (obj["Key"], obj["ETag"]))
+    return s3_files
+
+def read_s3_csv(bucket, key):
+    """Read the columns used from a Quidel CSV file in an S3 bucket."""
+    obj = bucket.meta.client.get_object(Bucket=bucket.name, Key=key)
+    df = pd.read_csv(obj["Body"],
+                     usecols=list(S3_DTYPES) + ["StorageDate", "TestDate"],
+                     dtype=S3_DTYPES,
+                     parse_dates=["StorageDate", "TestDate"])
+    df["fname"] = key
+    return df[SELECTED_COLUMNS]
+
+def get_from_s3(start_date, end_date, bucket, logger, manifest=None, max_workers=8):
     """
     Get raw data from aws s3 bucket.
 
+    Files already in the manifest are skipped. The other files are downloaded
+    concurrently.
+
     Args:
         start_date: datetime.datetime
             pull data from file tagged with date on/after the start date
@@ -26,71 +154,80 @@ def get_from_s3(start_date, end_date, bucket, logger):
             the aws s3 bucket that stores quidel data
         logger: logging.Logger
             The structured logger.
+        manifest: Dict[str, str]
+            keys of the files ingested in previous runs, mapped to their ETags
+        max_workers: int
+            maximum number of concurrent downloads
     output:
         df: pd.DataFrame
         time_flag: datetime.datetime
+        ingested: Dict[str, str]
+            keys of the files pulled, mapped to their ETags
     """
+    manifest = manifest or {}
     time_flag = None
-    selected_columns = ['SofiaSerNum', 'TestDate', 'Facility', 'City',
-                               'State', 'Zip', 'PatientAge', 'Result1',
-                               'Result2', 'OverallResult', 'StorageDate',
-                               'fname']
-    s3_files = {}
-    for obj in bucket.objects.all():
-        if "-sars" in obj.key:
-            date_string = obj.key.split("/")[1]
-            try:
-                yy = int(date_string.split("_")[0])
-                mm = int(date_string.split("_")[1])
-                dd = int(date_string.split("_")[2])
-                received_date = datetime(yy, mm, dd)
-            except ValueError:
+    s3_files = list_received_objects(start_date, end_date, bucket)
+
+    ingested = {}
+    for received_date in sorted(s3_files):
+        num_files = 0
+        for key, etag in s3_files[received_date]:
+            if key in manifest:
+                if manifest[key] != etag:
+                    logger.warning("Skipping file that changed since it was ingested",
+                                   key=key)
                 continue
-            if received_date not in s3_files.keys():
-                s3_files[received_date] = [obj.key]
-            else:
-                s3_files[received_date].append(obj.key)
+            ingested[key] = etag
+            time_flag = received_date
+            num_files += 1
+        if num_files > 0:
+            logger.info("Pulling data received on date", search_date=received_date.date(),
+                        num_files=num_files)
 
-    n_days = (end_date - start_date).days + 1
-    df_list = []
-    seen_files = set()
-    for search_date in [start_date + timedelta(days=x) for x in range(n_days)]:
-        if search_date in s3_files.keys():
-            logger.info("Pulling data received on date", search_date=search_date.date())
-
-            # Fetch data received on the same day
-            for fn in s3_files[search_date]:
-                # Skip non-CSV files, such as directories
-                if ".csv" not in fn:
-                    continue
-                # Avoid appending duplicate datasets
-                if fn in seen_files:
-                    continue
-                obj = bucket.Object(key=fn)
-                newdf = pd.read_csv(obj.get()["Body"],
-                                    parse_dates=["StorageDate", "TestDate"],
-                                    low_memory=False)
-                seen_files.add(fn)
-                newdf["fname"] = fn
-                df_list.append(newdf[selected_columns])
-                time_flag = search_date
-
-    return pd.concat(df_list), time_flag
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map returns the files in the order they were received
+        df_list = list(executor.map(lambda key: read_s3_csv(bucket, key), ingested))
+
+    if not df_list:
+        return pd.DataFrame(columns=SELECTED_COLUMNS), time_flag, ingested
+    return pd.concat(df_list), time_flag, ingested
 
 def fix_zipcode(df):
     """Fix zipcode that is 9 digit instead of 5 digit."""
-    zipcode5 = []
-    fixnum = 0
-    for zipcode in df['Zip'].values:
-        if isinstance(zipcode, str) and '-' in zipcode:
-            zipcode5.append(int(zipcode.split('-')[0]))
-            fixnum += 1
-        else:
-            zipcode = int(float(zipcode))
-            zipcode5.append(zipcode)
-    df['zip'] = zipcode5
+    # Zipcodes repeat a lot, so only parse each distinct one
+    codes, zipcodes = pd.factorize(df["Zip"])
+    zipcodes = pd.Series(zipcodes)
+    if not pd.api.types.is_numeric_dtype(zipcodes):
+        # Keep the 5 digits before the "-" of 9 digit zipcodes
+        zipcodes = zipcodes.astype(str).str.split("-", n=1).str[0]
+    # Missing zipcodes have code -1, and fail the conversion to int
+    zipcodes = np.append(zipcodes.astype(float).values, np.nan)
+    df["zip"] = pd.Series(zipcodes[codes], index=df.index).astype(int)
     return df
 
+def age_group_categorical(agegroup, length):
+    """Get a categorical of `length` copies of an age group label."""
+    return pd.Categorical.from_codes(
+        np.full(length, AGE_GROUP_CATEGORIES.index(agegroup)), AGE_GROUP_CATEGORIES)
+
+def age_labels(age):
+    """
+    Label each patient age with its age group.
+
+    Ages of -1 (missing) are labeled "NA". The other labels match the
+    suffixes of signal names.
+
+    Args:
+        age: pd.Series[float]
+    Returns:
+        pd.Categorical
+    """
+    labels = np.select(
+        [age == -1, age < 5, age < 18, age < 50, age < 65],
+        ["NA", "age_0_4", "age_5_17", "age_18_49", "age_50_64"],
+        default="age_65plus")
+    return pd.Categorical(labels, categories=AGE_GROUP_CATEGORIES)
+
 def fix_date(df, logger):
     """
     Remove invalid dates and select correct test date to use.
@@ -158,7 +295,13 @@ def preprocess_new_data(start_date, end_date, params, test_mode, logger):
                             aws_secret_access_key=aws_secret_access_key)
         bucket = s3.Bucket(bucket_name)
         # Get new data from s3
-        df, time_flag = get_from_s3(start_date, end_date, bucket, logger)
+        cache_dir = params["input_cache_dir"]
+        df, time_flag, ingested = get_from_s3(
+            start_date, end_date, bucket, logger,
+            manifest=read_cached_manifest(cache_dir),
+            max_workers=params.get("s3_max_workers", 8))
+        # Only committed to the manifest once the data is in the cache file
+        write_manifest(ingested, cache_dir, PENDING_MANIFEST_FILE)
 
     # No new data can be pulled
     if time_flag is None:
@@ -170,100 +313,128 @@ def preprocess_new_data(start_date, end_date, params, test_mode, logger):
     # Create a column CanonicalDate according to StarageDate and TestDate
     df = fix_date(df, logger)
 
-    # Compute overallPositive
-    overall_pos = df[df["OverallResult"] == "positive"].groupby(
-        by=["timestamp", "zip"],
-        as_index=False)['OverallResult'].count()
-    overall_pos["positiveTest_total"] = overall_pos["OverallResult"]
-    overall_pos.drop(labels="OverallResult", axis="columns", inplace=True)
-
-    # Compute overallTotal
-    overall_total = df.groupby(
-        by=["timestamp", "zip"],
-        as_index=False)['OverallResult'].count()
-    overall_total["totalTest_total"] = overall_total["OverallResult"]
-    overall_total.drop(labels="OverallResult", axis="columns", inplace=True)
-
-    # Compute numUniqueDevices
-    numUniqueDevices = df.groupby(
-        by=["timestamp", "zip"],
-        as_index=False)["SofiaSerNum"].agg({"SofiaSerNum": "nunique"}).rename(
-            columns={"SofiaSerNum": "numUniqueDevices_total"}
-        )
-
-    df_merged = overall_total.merge(
-        numUniqueDevices, on=["timestamp", "zip"], how="left"
-        ).merge(
-        overall_pos, on=["timestamp", "zip"], how="left"
-        ).fillna(0).drop_duplicates()
-
     # Compute Summary info for age groups
     df["PatientAge"] = df["PatientAge"].fillna(-1)
     df.loc[df["PatientAge"] == "<1", "PatientAge"] = 0.5
     df.loc[df["PatientAge"] == ">85", "PatientAge"] = 100
     df["PatientAge"] = df["PatientAge"] .astype(float)
+    label = age_labels(df["PatientAge"])
+
+    tests = pd.DataFrame({
+        "timestamp": df["timestamp"].values,
+        "zip": df["zip"].values,
+        "totalTest": df["OverallResult"].notna().values,
+        "positiveTest": (df["OverallResult"] == "positive").values,
+        "numUniqueDevices": df["SofiaSerNum"].values,
+    })
+    # Each test counts towards its own age group, the total, and any age group pooling
+    # its age group, so all of them are aggregated in one pass
+    age_group_tests = [tests.assign(agegroup=label),
+                       tests.assign(agegroup=age_group_categorical("total", len(tests)))]
+    for agegroup, labels in POOLED_AGE_GROUPS.items():
+        pooled_tests = tests[label.isin(labels)]
+        age_group_tests.append(pooled_tests.assign(
+            agegroup=age_group_categorical(agegroup, len(pooled_tests))))
+    age_group_tests = pd.concat(age_group_tests, ignore_index=True)
+
+    counts = age_group_tests.groupby(
+        by=["timestamp", "zip", "agegroup"], observed=True
+        ).agg({"totalTest": "sum", "positiveTest": "sum", "numUniqueDevices": "nunique"}
+        ).unstack("agegroup", fill_value=0)
+    columns = []
+    for agegroup in AGE_GROUPS:
+        for col in ["totalTest", "numUniqueDevices", "positiveTest"]:
+            columns.append((col, agegroup))
+    df_merged = counts.reindex(columns=columns, fill_value=0)
+    df_merged.columns = [f"{col}_{agegroup}" for col, agegroup in columns]
+    df_merged = df_merged.reset_index()
+
+    return df_merged, time_flag
 
-    # Should match the suffixes of signal names
-    df["label"] = None
-    df.loc[df["PatientAge"] < 5, "label"] = "age_0_4"
-    df.loc[((df["PatientAge"] >= 5)) & (df["PatientAge"] < 18), "label"] = "age_5_17"
-    df.loc[((df["PatientAge"] >= 18)) & (df["PatientAge"] < 50), "label"] = "age_18_49"
-    df.loc[((df["PatientAge"] >= 50)) & (df["PatientAge"] < 65), "label"] = "age_50_64"
-    df.loc[(df["PatientAge"] >= 65), "label"] = "age_65plus"
-    df.loc[df["PatientAge"] == -1, "label"] = "NA"
-
-    for agegroup in AGE_GROUPS[1:]: # Exclude total
-        if agegroup == "age_0_17":
-            ages = ["age_0_4", "age_5_17"]
+def _cache_file_date(filename):
+    """Get the date a cache file was pulled until, or None if it is not a cache file."""
+    if not filename.startswith("pulled_until_") or \
+            not filename.endswith((".parquet", ".csv")):
+        return None
+    return datetime.strptime(filename.split("_")[2].split(".")[0], '%Y%m%d')
+
+def _latest_cache_date(cache_dir):
+    """Get the latest date cache files were pulled until, or None if there are none."""
+    dates = [_cache_file_date(filename) for filename in os.listdir(cache_dir)]
+    return max((date for date in dates if date is not None), default=None)
+
+def check_intermediate_file(cache_dir, pull_start_date, read_start_date=None):
+    """
+    Check whether there are cache files containing historical data already.
+
+    The cache holds one parquet partition per run, with the data pulled in
+    that run, named by the date it was pulled until. A single CSV file of all
+    the data, as written by earlier versions, is read as a partition too.
+
+    Args:
+        cache_dir: str
+            directory of the cache files
+        pull_start_date: datetime.datetime
+            date to pull data from if there is no cache file
+        read_start_date: Optional[datetime.datetime]
+            only read data on/after this date; read all data if None
+    Returns:
+        previous_df: pd.DataFrame, or None if there is no cache file
+        pull_start_date: datetime.datetime
+            the day after the latest date pulled until
+    """
+    latest_date = _latest_cache_date(cache_dir)
+    if latest_date is not None:
+        pull_start_date = latest_date + timedelta(days=1)
+    df_list = []
+    for filename in sorted(os.listdir(cache_dir)):
+        if _cache_file_date(filename) is None:
+            continue
+        if filename.endswith(".parquet"):
+            filters = None
+            if read_start_date is not None:
+                filters = [("timestamp", ">=", pd.Timestamp(read_start_date))]
+            df = pd.read_parquet(join(cache_dir, filename), filters=filters)
         else:
-            ages = [agegroup]
-        # Compute overallPositive
-        group_pos = df.loc[(df["OverallResult"] == "positive")
-                             & (df["label"].isin(ages))].groupby(
-            by=["timestamp", "zip"],
-            as_index=False)['OverallResult'].count()
-        group_pos[f"positiveTest_{agegroup}"] = group_pos["OverallResult"]
-        group_pos.drop(labels="OverallResult", axis="columns", inplace=True)
-
-        # Compute overallTotal
-        group_total = df.loc[df["label"].isin(ages)].groupby(
-            by=["timestamp", "zip"],
-            as_index=False)['OverallResult'].count()
-        group_total[f"totalTest_{agegroup}"] = group_total["OverallResult"]
-        group_total.drop(labels="OverallResult", axis="columns", inplace=True)
-
-        # Compute numUniqueDevices
-        group_numUniqueDevices = df.loc[df["label"].isin(ages)].groupby(
-            by=["timestamp", "zip"],
-            as_index=False)["SofiaSerNum"].agg({"SofiaSerNum": "nunique"}).rename(
-                columns={"SofiaSerNum": f"numUniqueDevices_{agegroup}"}
-            )
-
-        df_merged = df_merged.merge(
-            group_numUniqueDevices, on=["timestamp", "zip"], how="left"
-            ).merge(
-            group_pos, on=["timestamp", "zip"], how="left"
-            ).merge(
-            group_total, on=["timestamp", "zip"], how="left"
-            ).fillna(0).drop_duplicates()
+            df = pd.read_csv(join(cache_dir, filename), sep=",", parse_dates=["timestamp"])
+            if read_start_date is not None:
+                df = df[df["timestamp"] >= read_start_date]
+        df_list.append(df)
+    if not df_list:
+        return None, pull_start_date
+    return pd.concat(df_list, ignore_index=True), pull_start_date
+
+def cache_read_start_date(params, _end_date):
+    """
+    Get the first date of cached data needed by a run.
 
-    return df_merged, time_flag
+    That is the first export date, less the days it pools over, or the first
+    date stored in backfill files, if those are generated.
 
-def check_intermediate_file(cache_dir, pull_start_date):
-    """Check whether there is a cache file containing historical data already."""
-    for filename in os.listdir(cache_dir):
-        if ".csv" in filename:
-            pull_start_date = datetime.strptime(filename.split("_")[2].split(".")[0],
-                                            '%Y%m%d') + timedelta(days=1)
-            previous_df = pd.read_csv(os.path.join(cache_dir, filename),
-                                      sep=",", parse_dates=["timestamp"])
-            return previous_df, pull_start_date
-    return None, pull_start_date
+    Args:
+        params: dict
+            including all the information read from params.json
+        _end_date: datetime.datetime
+            The most recent date when the raw data is received
+    Returns:
+        datetime.datetime, or None if all the data is needed
+    """
+    if _end_date is None or "export_day_range" not in params:
+        return None
+    export_end_date = check_export_end_date(
+        params["export_end_date"], _end_date, END_FROM_TODAY_MINUS)
+    export_start_date = check_export_start_date(
+        params["export_start_date"], export_end_date, params["export_day_range"])
+    read_start_date = export_start_date - timedelta(days=POOL_DAYS - 1)
+    if params.get("generate_backfill_files", True):
+        read_start_date = min(read_start_date, backfill_start_date(_end_date))
+    return read_start_date
 
 def pull_quidel_covidtest(params, logger):
     """Pull the quidel covid test data.
 
-    Conditionally merge new data with historical data from ./cache.
+    Conditionally merge new data with historical data from ./cache. The new
+    data is staged to be added to the cache by `update_cache_file`.
 
     Parameters:
         params: dict
@@ -286,9 +457,11 @@ def pull_quidel_covidtest(params, logger):
     test_mode = params["test_mode"]
 
     # pull new data only that has not been ingested
-    previous_df, pull_start_date = check_intermediate_file(
-        cache_dir,
-        datetime.strptime(params["pull_start_date"], '%Y-%m-%d'))
+    latest_date = _latest_cache_date(cache_dir)
+    if latest_date is None:
+        pull_start_date = datetime.strptime(params["pull_start_date"], '%Y-%m-%d')
+    else:
+        pull_start_date = latest_date + timedelta(days=1)
 
     if params["pull_end_date"] == "":
         pull_end_date = datetime.today()
@@ -299,6 +472,12 @@ def pull_quidel_covidtest(params, logger):
     # Use _end_date to check the most recent date that we received data
     df, _end_date = preprocess_new_data(
             pull_start_date, pull_end_date, params, test_mode, logger)
+    if _end_date is not None:
+        # Only added to the cache once the run succeeds
+        df.to_parquet(join(cache_dir, PENDING_CACHE_FILE), index=False)
+
+    read_start_date = cache_read_start_date(params, _end_date)
+    previous_df, _ = check_intermediate_file(cache_dir, pull_start_date, read_start_date)
 
     # Utilize previously stored data
     if previous_df is not None:
@@ -310,6 +489,8 @@ def pull_quidel_covidtest(params, logger):
             numeric_only=True
         ).reset_index(
         )
+    if read_start_date is not None:
+        df = df[df["timestamp"] >= read_start_date]
     return df, _end_date
 
 def check_export_end_date(input_export_end_date, _end_date,
@@ -370,25 +551,28 @@ def check_export_start_date(export_start_date, export_end_date,
         return datetime(2020, 5, 26)
     return export_start_date
 
-def update_cache_file(df, _end_date, cache_dir, logger):
+def update_cache_file(_end_date, cache_dir, logger):
     """
-    Update cache file. Remove the old one, export the new one.
+    Update cache files. Add the data pulled in this run as a new partition.
 
     Parameter:
-        df: pd.DataFrame
-            Pre-process file at ZipCode level
         _end_date:
             The most recent date when the raw data is received
         cache_dir:
-            ./cache where the cache file is stored
+            ./cache where the cache files are stored
         logger: logging.Logger
             Structured logger.
     """
     start_time = time.time()
+    # Convert a CSV cache file written by earlier versions to a partition
     for fn in os.listdir(cache_dir):
-        if ".csv" in fn:
+        if _cache_file_date(fn) is not None and fn.endswith(".csv"):
+            pd.read_csv(join(cache_dir, fn), sep=",", parse_dates=["timestamp"]).to_parquet(
+                join(cache_dir, fn.replace(".csv", ".parquet")), index=False)
             os.remove(join(cache_dir, fn))
-    df.to_csv(join(cache_dir, "pulled_until_%s.csv") % _end_date.strftime("%Y%m%d"), index=False)
+    os.replace(join(cache_dir, PENDING_CACHE_FILE),
+               join(cache_dir, _end_date.strftime(CACHE_FILE)))
+    commit_manifest(cache_dir)
     logger.info("Completed cache file update",
                 end_date = _end_date.strftime('%Y-%m-%d'),
                 elapsed_time_in_seconds = round(time.time() - start_time, 2))
@@ -7,6 +7,8 @@ when the module is run with `python -m MODULE_NAME`.
 import atexit
 from datetime import datetime
 from multiprocessing import cpu_count
+from os.path import join
+from tempfile import TemporaryDirectory
 import time
 from typing import Dict, Any
 
@@ -16,14 +18,17 @@ from delphi_utils import (
     get_structured_logger
 )
 from delphi_utils.logger import pool_and_threadedlogger
+from delphi_utils.profiling import RunProfile, add_stage, profile_stage
 
 from .constants import (END_FROM_TODAY_MINUS,
                         SMOOTHED_POSITIVE, RAW_POSITIVE,
                         SMOOTHED_TEST_PER_DEVICE, RAW_TEST_PER_DEVICE,
                         PARENT_GEO_RESOLUTIONS, SENSORS, SMOOTHERS, NONPARENT_GEO_RESOLUTIONS,
                         AGE_GROUPS)
-from .generate_sensor import generate_sensor_for_parent_geo, generate_sensor_for_nonparent_geo
-from .geo_maps import geo_map
+from .generate_sensor import (generate_sensor_for_parent_panel,
+                              generate_sensor_for_nonparent_panel)
+from .geo_maps import add_megacounties, geo_map
+from .panel import GeoPanel
 from .pull import (pull_quidel_covidtest,
                    check_export_start_date,
                    check_export_end_date,
@@ -57,40 +62,41 @@ def get_smooth_info(sensors, _SMOOTHERS):
             smoothers[sensor] = smoothers.pop(RAW_TEST_PER_DEVICE)
     return smoothers
 
-def generate_and_export_for_nonparent_geo(geo_groups, res_key, smooth, device,
-                                          first_date, last_date, suffix, # generate args
+def generate_and_export_for_nonparent_geo(panel, smooth, device, suffix, # generate args
                                           geo_res, sensor_name, export_dir,
                                           export_start_date, export_end_date, # export args
                                           threaded_logger): # logger args
-    """Generate sensors, create export CSV then return stats."""
+    """Generate sensors, create export CSV then return stats and the profile of the generation."""
     threaded_logger.info("Generating signal and exporting to CSV",
                          geo_res=geo_res,
                          sensor=sensor_name)
-    res_df = generate_sensor_for_nonparent_geo(geo_groups, res_key, smooth, device,
-                                               first_date, last_date, suffix)
+    # Run in a worker process, so the stage is returned to be recorded in the run's profile
+    with RunProfile().stage("compute", geo=geo_res, signal=sensor_name) as stage:
+        res_df = generate_sensor_for_nonparent_panel(panel, smooth, device, suffix)
+        stage.add_rows(len(res_df))
     dates = create_export_csv(res_df, geo_res=geo_res,
                               sensor=sensor_name, export_dir=export_dir,
                               start_date=export_start_date,
                               end_date=export_end_date)
-    return dates
+    return dates, stage
 
-def generate_and_export_for_parent_geo(geo_groups, geo_data, res_key, smooth, device,
-                                       first_date, last_date, suffix, # generate args
+def generate_and_export_for_parent_geo(state_panel, panel, smooth, device, suffix, # generate args
                                        geo_res, sensor_name, export_dir,
                                        export_start_date, export_end_date, # export args
                                        threaded_logger): # logger args
-    """Generate sensors, create export CSV then return stats."""
+    """Generate sensors, create export CSV then return stats and the profile of the generation."""
     threaded_logger.info("Generating signal and exporting to CSV",
                          geo_res=geo_res,
                          sensor=sensor_name)
-    res_df = generate_sensor_for_parent_geo(geo_groups, geo_data, res_key, smooth, device,
-                                            first_date, last_date, suffix)
+    with RunProfile().stage("compute", geo=geo_res, signal=sensor_name) as stage:
+        res_df = generate_sensor_for_parent_panel(state_panel, panel, smooth, device, suffix)
+        stage.add_rows(len(res_df))
     dates = create_export_csv(res_df, geo_res=geo_res,
                               sensor=sensor_name, export_dir=export_dir,
                               start_date=export_start_date,
                               end_date=export_end_date,
                               remove_null_samples=True) # for parent geo, remove null sample size
-    return dates
+    return dates, stage
 
 def run_module(params: Dict[str, Any]):
     """Run the quidel_covidtest indicator.
@@ -113,6 +119,8 @@ def run_module(params: Dict[str, Any]):
         - "aws_credentials": Dict[str, str], authentication parameters for AWS S3; see S3
                              documentation
         - "bucket_name": str, name of AWS bucket in which to find data
+        - "s3_max_workers" (optional): int, maximum number of files to download from the
+                                       bucket concurrently
         - "wip_signal": List[str], list of signal names that are works in progress
         - "test_mode": bool, whether we are running in test mode
     """
@@ -162,13 +170,19 @@ def run_module(params: Dict[str, Any]):
                          prefix="wip_")
     smoothers = get_smooth_info(sensors, SMOOTHERS)
     n_cpu = min(8, cpu_count()) # for parallelization
-    with pool_and_threadedlogger(logger, n_cpu) as (pool, threaded_logger):
+    # Panels are built once per geo resolution and memory-mapped, so tasks are only handed
+    # a file name and read just the columns of their age group and sensor.
+    with TemporaryDirectory() as panel_dir, \
+            pool_and_threadedlogger(logger, n_cpu) as (pool, threaded_logger):
         # for using loggers in multiple threads
         logger.info("Parallelizing sensor generation", n_workers=n_cpu)
         pool_results = []
         for geo_res in NONPARENT_GEO_RESOLUTIONS:
-            geo_data, res_key = geo_map(geo_res, data)
-            geo_groups = geo_data.groupby(res_key)
+            with profile_stage("aggregate", geo=geo_res) as stage:
+                geo_data, res_key = geo_map(geo_res, data)
+                panel = GeoPanel.from_frame(geo_data, res_key, first_date, last_date).save(
+                    join(panel_dir, geo_res))
+                stage.add_rows(len(geo_data))
             for agegroup in AGE_GROUPS:
                 for sensor in sensors:
                     if agegroup == "total":
@@ -180,9 +194,8 @@ def run_module(params: Dict[str, Any]):
                             generate_and_export_for_nonparent_geo,
                             args=(
                                 # generate_sensors_for_parent_geo
-                                geo_groups, res_key,
-                                smoothers[sensor][1], smoothers[sensor][0],
-                                first_date, last_date, agegroup,
+                                panel,
+                                smoothers[sensor][1], smoothers[sensor][0], agegroup,
                                 # create_export_csv
                                 geo_res, sensor_name, export_dir,
                                 export_start_date, export_end_date,
@@ -191,10 +204,27 @@ def run_module(params: Dict[str, Any]):
                             )
                         )
                     )
-        assert geo_res == "state" # Make sure geo_groups is for state level
+        assert geo_res == "state" # Make sure panel is for state level
+        state_panel = panel
         # County/HRR/MSA level
         for geo_res in PARENT_GEO_RESOLUTIONS:
-            geo_data, res_key = geo_map(geo_res, data) # using the last geo_groups
+            with profile_stage("aggregate", geo=geo_res) as stage:
+                geo_data, res_key = geo_map(geo_res, data)
+                if geo_res == "county":
+                    # Megacounties depend on the smoother's threshold, so the county panel is
+                    # built once with megacounties for raw signals and once for smoothed ones
+                    panels = {
+                        smooth: GeoPanel.from_frame(
+                            add_megacounties(geo_data, smooth), res_key, first_date, last_date,
+                            parent_key="state_id").save(
+                                join(panel_dir, f"{geo_res}_{'smoothed' if smooth else 'raw'}"))
+                        for smooth in (False, True)
+                    }
+                else:
+                    panel = GeoPanel.from_frame(geo_data, res_key, first_date, last_date,
+                                                parent_key="state_id").save(join(panel_dir, geo_res))
+                    panels = {False: panel, True: panel}
+                stage.add_rows(len(geo_data))
             for agegroup in AGE_GROUPS:
                 for sensor in sensors:
                     if agegroup == "total":
@@ -206,9 +236,8 @@ def run_module(params: Dict[str, Any]):
                             generate_and_export_for_parent_geo,
                             args=(
                                 # generate_sensors_for_parent_geo
-                                geo_groups, geo_data, res_key,
-                                smoothers[sensor][1], smoothers[sensor][0],
-                                first_date, last_date, agegroup,
+                                state_panel, panels[smoothers[sensor][1]],
+                                smoothers[sensor][1], smoothers[sensor][0], agegroup,
                                 # create_export_csv
                                 geo_res, sensor_name, export_dir,
                                 export_start_date, export_end_date,
@@ -218,13 +247,14 @@ def run_module(params: Dict[str, Any]):
                         )
                     )
         pool_results = [proc.get() for proc in pool_results]
-        for dates in pool_results:
+        for dates, stage in pool_results:
+            add_stage(stage)
             if len(dates) > 0:
                 stats.append((max(dates), len(dates)))
 
-    # Export the cache file if the pipeline runs successfully.
-    # Otherwise, don't update the cache file
-    update_cache_file(df, _end_date, cache_dir, logger)
+    # Add the pulled data to the cache if the pipeline runs successfully.
+    # Otherwise, don't update the cache
+    update_cache_file(_end_date, cache_dir, logger)
     # Log stats now instead of at program exit
     atexit.unregister(log_exit)
     log_exit(start_time, stats, logger)
@@ -7,6 +7,7 @@ required = [
     "darker[isort]~=2.1.1",
     "delphi-utils",
     "imap-tools",
+    "moto~=4.2.14",
     "numpy",
     "openpyxl",
     "osqp==1.1.0",
@@ -12,5 +12,5 @@ def clean_receiving_dir():
         if ".csv" in fname:
             os.remove(join("receiving", fname))
     for fname in os.listdir("cache"):
-        if ".csv" in fname:
+        if ".csv" in fname or ".parquet" in fname:
             os.remove(join("cache", fname))
@@ -250,3 +250,46 @@ class TestDataTools:
         # pool_days non int case
         with pytest.raises(ValueError):
             data_tools.smoothed_tests_per_device(np.array([1]), np.array([1]), 1, 1.5)
+
+    def test__slide_window_sum_panel(self):
+        arr = np.array([[1, 10], [2, 20], [3, 30], [4, 40]])
+        assert np.array_equal(data_tools._slide_window_sum(arr, 2),
+                              np.array([[1, 10], [3, 30], [5, 50], [7, 70]]))
+
+    @pytest.mark.parametrize("func, single_func", [
+        (data_tools.smoothed_positive_prop_panel, data_tools.smoothed_positive_prop),
+        (data_tools.smoothed_tests_per_device_panel, data_tools.smoothed_tests_per_device),
+    ])
+    def test_smoothed_panel(self, func, single_func):
+        counts = np.array([[1, 0, 2], [2, 1, 0], [3, 0, 1], [4, 2, 2]])
+        tests = np.array([[2, 1, 2], [4, 1, 0], [6, 0, 3], [10, 4, 2]])
+        parent_counts = np.array([[3, 9], [7, 9], [9, 9], [11, 9]])
+        parent_tests = np.array([[5, 20], [10, 20], [15, 20], [20, 20]])
+        parent_index = np.array([1, 0, -1])
+        present = tests > 0
+        output = func(counts, tests, 3, 2, parent_counts, parent_tests,
+                      parent_index, present)
+
+        for loc, parent in enumerate(parent_index):
+            if parent < 0:
+                expected = single_func(counts[:, loc], tests[:, loc], 3, 2)
+            else:
+                expected = single_func(counts[:, loc], tests[:, loc], 3, 2,
+                                       np.where(present[:, loc], parent_counts[:, parent], 0),
+                                       np.where(present[:, loc], parent_tests[:, parent], 0))
+            for out, exp in zip(output, expected):
+                assert np.allclose(out[:, loc], exp, equal_nan=True)
+
+        # no parents case
+        output = func(counts, tests, 3, 2)
+        for loc in range(counts.shape[1]):
+            expected = single_func(counts[:, loc], tests[:, loc], 3, 2)
+            for out, exp in zip(output, expected):
+                assert np.allclose(out[:, loc], exp, equal_nan=True)
+
+        # nan case
+        with pytest.raises(ValueError):
+            func(np.array([[np.nan]]), np.array([[1]]), 1, 1)
+        # pool_days non int case
+        with pytest.raises(ValueError):
+            func(np.array([[1]]), np.array([[1]]), 1, 1.5)
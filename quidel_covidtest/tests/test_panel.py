@@ -0,0 +1,45 @@
+import pickle
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from delphi_quidel_covidtest.panel import GeoPanel
+
+
+class TestGeoPanel:
+    DATA = pd.DataFrame({
+        "timestamp": pd.to_datetime(["2020-06-14", "2020-06-16", "2020-06-15", "2020-06-16"]),
+        "cbsa_id": ["11100", "11100", "10580", "10580"],
+        "state_id": ["tx", "tx", "ny", "ny"],
+        "totalTest_total": [5, 7, 1, 2],
+        "positiveTest_total": [1., 0., 0., 1.],
+    })
+
+    def test_from_frame(self):
+        panel = GeoPanel.from_frame(self.DATA, "cbsa_id", datetime(2020, 6, 14),
+                                    datetime(2020, 6, 17), parent_key="state_id")
+
+        assert list(panel.geo_ids) == ["10580", "11100"]
+        assert list(panel.parent_states) == ["ny", "tx"]
+        assert list(panel.dates) == list(pd.date_range("2020-06-14", "2020-06-17"))
+        assert np.array_equal(panel.column("totalTest_total"),
+                              [[0, 1, 2, 0], [5, 0, 7, 0]])
+        assert np.array_equal(panel.present,
+                              [[False, True, True, False], [True, False, True, False]])
+        assert panel.geo_index("11100") == 1
+        assert panel.geo_index("99999") is None
+
+    def test_save_and_pickle(self, tmp_path):
+        panel = GeoPanel.from_frame(self.DATA, "cbsa_id", datetime(2020, 6, 14),
+                                    datetime(2020, 6, 17), parent_key="state_id")
+        saved = panel.save(str(tmp_path / "msa"))
+        pickled = pickle.dumps(saved)
+
+        # Only metadata is pickled for file-backed panels
+        assert saved.__getstate__()["values"] is None
+        unpickled = pickle.loads(pickled)
+        assert isinstance(unpickled.values, np.memmap)
+        assert np.array_equal(unpickled.column("positiveTest_total"),
+                              panel.column("positiveTest_total"))
+        assert list(unpickled.parent_states) == ["ny", "tx"]
@@ -1,13 +1,25 @@
 import logging
 from datetime import datetime
+from os import listdir
+from os.path import exists, join
 
+from boto3 import Session
+from moto import mock_s3
 import pandas as pd
 
 from delphi_quidel_covidtest.pull import (
+    age_labels,
+    commit_manifest,
+    get_from_s3,
+    read_cached_manifest,
+    read_manifest,
+    write_manifest,
+    PENDING_MANIFEST_FILE,
     fix_zipcode,
     fix_date,
     pull_quidel_covidtest,
     check_intermediate_file,
+    update_cache_file,
     check_export_end_date,
     check_export_start_date
 )
@@ -18,6 +30,64 @@ EXPORT_DAY_RANGE = 40
 
 TEST_LOGGER = logging.getLogger()
 
+class TestGetFromS3:
+    @mock_s3
+    def test_get_from_s3(self):
+        s3 = Session(aws_access_key_id="", aws_secret_access_key="",
+                     region_name="us-east-1").resource("s3")
+        bucket = s3.Bucket("test-bucket")
+        bucket.create()
+        test_data = pd.read_csv("./test_data/test_data.csv")
+        for key, rows in [("quidel/2020_08_16/a-sars.csv", test_data[:10]),
+                          ("quidel/2020_08_17/b-sars.csv", test_data[10:20]),
+                          ("quidel/2020_08_17/c-sars.csv", test_data[20:30]),
+                          ("quidel/2020_08_17/d-flu.csv", test_data[30:40]),
+                          ("quidel/2020_08_18/e-sars.csv", test_data[40:50])]:
+            bucket.put_object(Key=key, Body=rows.to_csv(index=False).encode())
+        ingested_etag = bucket.Object("quidel/2020_08_16/a-sars.csv").e_tag
+
+        df, time_flag, ingested = get_from_s3(
+            datetime(2020, 8, 16), datetime(2020, 8, 17), bucket, TEST_LOGGER,
+            manifest={"quidel/2020_08_16/a-sars.csv": ingested_etag})
+
+        assert time_flag == datetime(2020, 8, 17)
+        assert list(ingested) == ["quidel/2020_08_17/b-sars.csv",
+                                  "quidel/2020_08_17/c-sars.csv"]
+        assert list(df["fname"].unique()) == list(ingested)
+        assert len(df) == 20
+        assert df["Zip"].dtype == object
+        assert df["TestDate"].dtype == "datetime64[ns]"
+
+        # Nothing new
+        df, time_flag, ingested = get_from_s3(
+            datetime(2020, 8, 16), datetime(2020, 8, 16), bucket, TEST_LOGGER,
+            manifest={"quidel/2020_08_16/a-sars.csv": ingested_etag})
+        assert time_flag is None
+        assert df.empty
+        assert not ingested
+
+    def test_commit_manifest(self, tmp_path):
+        write_manifest({"a-sars.csv": "etag_a"}, tmp_path)
+        write_manifest({"b-sars.csv": "etag_b"}, tmp_path, PENDING_MANIFEST_FILE)
+
+        commit_manifest(tmp_path)
+
+        assert read_manifest(tmp_path) == {"a-sars.csv": "etag_a", "b-sars.csv": "etag_b"}
+        assert not exists(join(tmp_path, PENDING_MANIFEST_FILE))
+
+    def test_read_cached_manifest(self, tmp_path):
+        """Entries are only trusted for files received until the latest cache file."""
+        manifest = {"quidel/2020_08_16/a-sars.csv": "etag_a",
+                    "quidel/2020_08_17/b-sars.csv": "etag_b",
+                    "quidel/2020_08_18/c-sars.csv": "etag_c"}
+        write_manifest(manifest, tmp_path)
+        # The cache files were deleted to rebuild the cache
+        assert read_cached_manifest(tmp_path) == {}
+
+        pd.DataFrame({"timestamp": []}).to_parquet(join(tmp_path, "pulled_until_20200817.parquet"))
+        assert read_cached_manifest(tmp_path) == {"quidel/2020_08_16/a-sars.csv": "etag_a",
+                                                  "quidel/2020_08_17/b-sars.csv": "etag_b"}
+
 class TestFixData:
     def test_fix_zipcode(self):
 
@@ -26,6 +96,19 @@ class TestFixData:
 
         assert set(df["zip"]) == set([2837, 29570, 15213, 2134])
 
+        df = pd.DataFrame({"Zip":[2837.0, 29570.0]})
+        df = fix_zipcode(df)
+
+        assert list(df["zip"]) == [2837, 29570]
+
+    def test_age_labels(self):
+
+        labels = age_labels(pd.Series([-1, 0.5, 4.9, 5, 17, 18, 49, 50, 64, 65, 100]))
+
+        assert list(labels) == ["NA", "age_0_4", "age_0_4", "age_5_17", "age_5_17",
+                                "age_18_49", "age_18_49", "age_50_64", "age_50_64",
+                                "age_65plus", "age_65plus"]
+
     def test_fix_date(self):
 
         df = pd.DataFrame({"StorageDate":[datetime(2020, 5, 19), datetime(2020, 6, 9),
@@ -65,6 +148,10 @@ class TestingPullData:
         for agegroup in AGE_GROUPS:
             set([f'totalTest_{agegroup}', f'numUniqueDevices_{agegroup}',
              f'positiveTest_{agegroup}']).issubset(set(df.columns))
+        # age_0_17 pools the tests of age_0_4 and age_5_17
+        assert (df["totalTest_age_0_17"]
+                == df["totalTest_age_0_4"] + df["totalTest_age_5_17"]).all()
+        assert (df["totalTest_total"] >= df["totalTest_age_0_17"]).all()
 
 
     def test_check_intermediate_file(self):
@@ -80,6 +167,25 @@ class TestingPullData:
         assert previous_df is None
         assert pull_start_date is None
 
+    def test_cache_partitions(self, tmp_path):
+        cache_dir = str(tmp_path)
+        first = pd.DataFrame({"timestamp": pd.to_datetime(["2020-07-01", "2020-07-05"]),
+                              "zip": [1, 2], "totalTest_total": [3, 4]})
+        first.to_csv(join(cache_dir, "pulled_until_20200710.csv"), index=False)
+        second = pd.DataFrame({"timestamp": pd.to_datetime(["2020-07-06", "2020-07-12"]),
+                               "zip": [1, 2], "totalTest_total": [5, 6]})
+        second.to_parquet(join(cache_dir, "pulled_pending.parquet"), index=False)
+
+        update_cache_file(datetime(2020, 7, 15), cache_dir, TEST_LOGGER)
+
+        assert sorted(listdir(cache_dir)) == ["pulled_until_20200710.parquet",
+                                              "pulled_until_20200715.parquet"]
+        previous_df, pull_start_date = check_intermediate_file(cache_dir, None)
+        assert pull_start_date == datetime(2020, 7, 16)
+        assert list(previous_df["totalTest_total"]) == [3, 4, 5, 6]
+        previous_df, _ = check_intermediate_file(cache_dir, None, datetime(2020, 7, 5))
+        assert list(previous_df["totalTest_total"]) == [4, 5, 6]
+
     def test_check_export_end_date(self):
 
         _end_date = datetime(2020, 7, 7)
@@ -100,8 +100,5 @@ class TestRun:
                             (32+0.5)/(64+1)*100], equal_nan=True)
 
         # test_intermediate_file
-        flag = None
-        for fname in listdir("./cache"):
-            if ".csv" in fname:
-                flag = 1
-        assert flag is not None
+        assert "pulled_until_20200817.parquet" in listdir("./cache")
+        assert "pulled_pending.parquet" not in listdir("./cache")